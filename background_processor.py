@@ -5,7 +5,12 @@ import time
 import requests
 import numpy as np
 from src.recognize_faces import FaceRecognizer
-from src.utils import load_config
+from src.inference_scheduler import create_scheduler
+from src.face_tracker import create_tracked_recognizer
+from src.motion_gate import create_motion_gate
+from src.capture import create_capture_reader
+from src.utils import load_config, parse_rois
+from src.detector_scrfd import get_backend_stats
 
 # --- Configuration ---
 DB_PATH = "attendance_system.db"
@@ -17,6 +22,10 @@ RECOGNITION_COOLDOWN = 60 * 5  # 5 minutes cooldown per person per camera
 active_threads = {}  # {camera_id: thread_object}
 stop_flags = {}  # {camera_id: stop_flag}
 face_recognizer = None
+inference_scheduler = None  # Batches frames across cameras when SCHEDULER.ENABLED
+motion_gates = {}  # {camera_id: MotionGate}, for per-camera gate hit rates
+capture_readers = {}  # {camera_id: LatestFrameReader}, for per-camera dropped frames
+applied_rois = {}  # {camera_id: roi column value}, to push ROI edits to running cameras
 
 # --- Database & API Functions ---
 
@@ -25,8 +34,12 @@ def get_active_cameras():
     try:
         conn = sqlite3.connect(DB_PATH)
         c = conn.cursor()
-        c.execute("SELECT camera_id, name, ip_address FROM cameras WHERE is_active = 1")
-        cameras = [{'camera_id': row[0], 'name': row[1], 'ip_address': row[2]} for row in c.fetchall()]
+        try:
+            c.execute("SELECT camera_id, name, ip_address, roi FROM cameras WHERE is_active = 1")
+        except sqlite3.OperationalError:
+            # Database created before the roi column existed
+            c.execute("SELECT camera_id, name, ip_address, NULL FROM cameras WHERE is_active = 1")
+        cameras = [{'camera_id': row[0], 'name': row[1], 'ip_address': row[2], 'roi': row[3]} for row in c.fetchall()]
         conn.close()
         return cameras
     except Exception as e:
@@ -48,6 +61,29 @@ def mark_attendance(roll_no, camera_id):
         print(f"❌ [API Error] Could not connect to backend: {e}")
         return False
 
+def config_camera_roi(camera_name):
+    """The ROI config.yaml CAMERA_SOURCES gives this camera, or None."""
+    for cam in (CONFIG or {}).get('CAMERA_SOURCES', []) or []:
+        if str(cam.get('name', cam.get('source'))) == camera_name:
+            return cam.get('roi')
+    return None
+
+def apply_camera_roi(camera_info):
+    """Restrict detection to the camera's regions of interest.
+
+    A NULL roi column means the ROI was never set through the API, so the
+    config.yaml ROI of the camera applies; '[]' (PUT with null) clears it.
+    """
+    camera_name = camera_info['name']
+    applied_rois[camera_info['camera_id']] = camera_info.get('roi')
+    roi = camera_info.get('roi')
+    if roi is None:
+        roi = config_camera_roi(camera_name)
+    try:
+        face_recognizer.set_camera_options(camera_name, rois=parse_rois(roi))
+    except ValueError as e:
+        print(f"⚠️ [Config Warning] Ignoring invalid ROI for camera {camera_name}: {e}")
+
 # --- Camera Processing Thread ---
 
 def process_camera_feed(camera_info, stop_event):
@@ -55,64 +91,93 @@ def process_camera_feed(camera_info, stop_event):
     Processes a single camera feed in a dedicated thread.
     Detects and recognizes faces, then marks attendance.
     """
-    global face_recognizer
+    global face_recognizer, inference_scheduler
     camera_id = camera_info['camera_id']
     camera_name = camera_info['name']
     camera_source = camera_info['ip_address']
     
     # Cooldown management for recognized faces
     recognition_timestamps = {}
+    # Tracks that already produced an attendance mark
+    marked_tracks = set()
+
+    # Per-camera tracker: detect every N frames, embed once per track (TRACKING.ENABLED)
+    tracked_recognizer = create_tracked_recognizer(face_recognizer, CONFIG, scheduler=inference_scheduler,
+                                                   camera=camera_name)
+
+    # Skip detection on frames without motion (MOTION_GATE.ENABLED)
+    motion_gate = create_motion_gate(CONFIG)
+    if motion_gate is not None:
+        motion_gates[camera_id] = motion_gate
 
     print(f"🚀 [Thread Start] Starting processor for camera: {camera_name} ({camera_source})")
 
+    # Restrict detection to the camera's regions of interest, if any
+    apply_camera_roi(camera_info)
+
+    # Decodes on its own thread and keeps only the newest frame, reconnecting as needed
+    reader = create_capture_reader(camera_source, camera_name, CONFIG)
+    capture_readers[camera_id] = reader
+    connected = False
+
     while not stop_event.is_set():
-        cap = cv2.VideoCapture(camera_source)
-        if not cap.isOpened():
-            print(f"❌ [Capture Error] Cannot open camera: {camera_name}. Retrying in 30 seconds...")
-            time.sleep(30)
+        captured = reader.read(timeout=1.0)
+        if captured is None:
+            if connected and not reader.connected:
+                print(f"⚠️ [Capture Warning] Lost connection to camera: {camera_name}. Reconnecting...")
+                connected = False
             continue
+        if not connected:
+            print(f"🟢 [Capture] Camera feed opened successfully for: {camera_name}")
+            connected = True
+        frame = captured.image
 
-        print(f"🟢 [Capture] Camera feed opened successfully for: {camera_name}")
+        if motion_gate is not None and not motion_gate.has_motion(frame):
+            # Idle scene: nothing to detect
+            continue
 
-        while not stop_event.is_set():
-            ret, frame = cap.read()
-            if not ret:
-                print(f"⚠️ [Capture Warning] Lost connection to camera: {camera_name}. Reconnecting...")
-                break  # Break inner loop to reconnect
+        try:
+            # Perform face detection and recognition
+            if tracked_recognizer is not None:
+                recognition_results = tracked_recognizer.recognize_face(frame)
+            elif inference_scheduler is not None:
+                recognition_results = inference_scheduler.recognize_face(frame, camera=camera_name)
+            else:
+                recognition_results = face_recognizer.recognize_face(frame, camera=camera_name)
 
-            try:
-                # Perform face detection and recognition
-                recognition_results = face_recognizer.recognize_face(frame)
+            if tracked_recognizer is not None and marked_tracks:
+                # Dropped tracks never come back; forget them so the set stays small
+                marked_tracks &= tracked_recognizer.active_track_ids()
 
-                for result in recognition_results:
-                    name = result['label']
-                    score = result['score']
-                    
-                    if name != "Unknown":
-                        current_time = time.time()
-                        last_seen = recognition_timestamps.get(name, 0)
-
-                        # Check if cooldown has passed
-                        if current_time - last_seen > RECOGNITION_COOLDOWN:
-                            print(f"🎯 [Recognition] Recognized {name} on camera {camera_name} with score {score:.2f}")
-                            if mark_attendance(name, camera_id):
-                                # Update timestamp only on successful marking
-                                recognition_timestamps[name] = current_time
-                        else:
-                            # Optional: log that the user is on cooldown
-                            # print(f"⏳ [Cooldown] {name} was recently recognized. Skipping attendance marking.")
-                            pass
-
-            except Exception as e:
-                print(f"❌ [Processing Error] An error occurred in camera {camera_name}: {e}")
-            
-            # Give other threads a chance to run
-            time.sleep(0.05)
+            for result in recognition_results:
+                name = result['label']
+                score = result['score']
+                track_id = result.get('track_id')
+                
+                if name != "Unknown" and (track_id is None or track_id not in marked_tracks):
+                    current_time = time.time()
+                    last_seen = recognition_timestamps.get(name, 0)
+
+                    # Check if cooldown has passed
+                    if current_time - last_seen > RECOGNITION_COOLDOWN:
+                        print(f"🎯 [Recognition] Recognized {name} on camera {camera_name} with score {score:.2f}")
+                        if mark_attendance(name, camera_id):
+                            # Update timestamp only on successful marking
+                            recognition_timestamps[name] = current_time
+                            if track_id is not None:
+                                marked_tracks.add(track_id)
+                    else:
+                        # Optional: log that the user is on cooldown
+                        # print(f"⏳ [Cooldown] {name} was recently recognized. Skipping attendance marking.")
+                        pass
 
-        cap.release()
-        if not stop_event.is_set():
-            time.sleep(5) # Wait before attempting to reconnect
+        except Exception as e:
+            print(f"❌ [Processing Error] An error occurred in camera {camera_name}: {e}")
 
+    reader.stop()
+    capture_readers.pop(camera_id, None)
+    motion_gates.pop(camera_id, None)
+    applied_rois.pop(camera_id, None)
     print(f"🛑 [Thread Stop] Stopping processor for camera: {camera_name}")
 
 # --- Main Control Loop ---
@@ -122,7 +187,7 @@ def main():
     Main function to manage camera processing threads.
     Periodically checks for changes in active cameras.
     """
-    global face_recognizer, active_threads, stop_flags
+    global face_recognizer, inference_scheduler, active_threads, stop_flags
     
     print("Initializing Face Recognition System...")
     while face_recognizer is None:
@@ -133,6 +198,10 @@ def main():
         except Exception as e:
             print(f"⏳ [Waiting] Face recognizer not ready yet: {e}. Retrying in 30 seconds...")
             time.sleep(30)
+
+    inference_scheduler = create_scheduler(face_recognizer, CONFIG)
+    if inference_scheduler is not None:
+        print("✅ Cross-camera inference scheduler started.")
             
     print("Starting Background Processor...")
     
@@ -158,6 +227,13 @@ def main():
                     active_threads[camera_id] = thread
                     stop_flags[camera_id] = stop_event
 
+            # --- Push ROI edits (PUT /cameras/<id>/roi) to cameras already running ---
+            for camera_info in active_cameras:
+                camera_id = camera_info['camera_id']
+                if camera_id in active_threads and camera_id in applied_rois and applied_rois[camera_id] != camera_info['roi']:
+                    print(f"🔧 [Config] ROI changed for camera {camera_info['name']}; applying it now.")
+                    apply_camera_roi(camera_info)
+
             # --- Stop threads for deactivated cameras ---
             cameras_to_stop = running_camera_ids - active_camera_ids
             for camera_id in cameras_to_stop:
@@ -171,6 +247,25 @@ def main():
                     del stop_flags[camera_id]
 
             print(f"ℹ️ [Status] System running. Active cameras being processed: {len(active_threads)}")
+            for camera_id, gate in list(motion_gates.items()):
+                stats = gate.get_stats()
+                print(f"   [Motion Gate] Camera {camera_id}: skipped {stats['skipped']}/{stats['frames']} frames "
+                      f"({stats['hit_rate']:.0%})")
+            for camera_id, reader in list(capture_readers.items()):
+                stats = reader.get_stats()
+                print(f"   [Capture] Camera {camera_id}: dropped {stats['dropped']}/{stats['decoded']} frames "
+                      f"({stats['drop_rate']:.0%}), newest frame {stats['last_age_ms']:.0f} ms old when read")
+            for camera, stats in face_recognizer.get_hot_set_stats().items():
+                print(f"   [Hot Set] Camera {camera}: {stats['hits']}/{stats['hits'] + stats['misses']} matches "
+                      f"without a gallery search ({stats['hit_rate']:.0%}), {stats['size']} people hot")
+            if inference_scheduler is not None:
+                for camera, stats in inference_scheduler.get_stats()['cameras'].items():
+                    print(f"   [Scheduler] Camera {camera}: {stats['requests']} requests, "
+                          f"avg batch {stats['avg_batch']:.1f}, waited {stats['avg_wait_ms']:.1f} ms on average")
+            for backend, stats in get_backend_stats().items():
+                if stats['calls'] or stats['errors']:
+                    print(f"   [Detector] {backend}: {stats['calls']} calls, {stats['images']} images, "
+                          f"{stats['avg_ms_per_image']:.1f} ms/image, {stats['errors']} errors")
             time.sleep(30) # Check for camera changes every 30 seconds
 
     except KeyboardInterrupt:
@@ -178,6 +273,8 @@ def main():
         for camera_id in list(active_threads.keys()):
             stop_flags[camera_id].set()
             active_threads[camera_id].join(timeout=10)
+        if inference_scheduler is not None:
+            inference_scheduler.stop()
         print("✅ All threads stopped. Exiting.")
     except Exception as e:
         print(f"❌ [Fatal] An unexpected error occurred in the main loop: {e}")
@@ -20,6 +20,11 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from utils import load_config, load_faiss_data
 from recognize_faces import FaceRecognizer
+from inference_scheduler import create_scheduler
+from face_tracker import create_tracked_recognizer
+from motion_gate import create_motion_gate
+from capture import create_capture_reader
+from detector_scrfd import get_backend_stats
 
 # Configure logging
 logging.basicConfig(
@@ -42,10 +47,17 @@ class CameraService:
         # Initialize face recognizer
         self.recognizer = FaceRecognizer()
         logger.info("Face recognizer initialized")
+
+        # Optional cross-camera batching; None means call the recognizer directly
+        self.scheduler = create_scheduler(self.recognizer, self.config)
+        if self.scheduler is not None:
+            logger.info("Inference scheduler started")
         
         # Camera threads
         self.camera_threads: Dict[str, threading.Thread] = {}
         self.camera_running: Dict[str, bool] = {}
+        self.motion_gates: Dict[str, object] = {}
+        self.capture_readers: Dict[str, object] = {}
         
         # API endpoint for sending recognition results
         self.api_base_url = "http://localhost:5000"
@@ -81,37 +93,49 @@ class CameraService:
         
         logger.info(f"Processing camera {camera_id} ({camera_name}) from source {camera_source}")
         
-        # Initialize camera
-        cap = cv2.VideoCapture(camera_source)
-        if not cap.isOpened():
-            logger.error(f"Failed to open camera {camera_id} from source {camera_source}")
-            return
-        
-        # Set camera properties
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cap.set(cv2.CAP_PROP_FPS, 30)
+        # Initialize camera; the reader decodes on its own thread and keeps only the newest frame
+        reader = create_capture_reader(camera_source, camera_name, self.config, open_capture=self._open_capture,
+                                       camera_config=camera_config)
+        self.capture_readers[camera_id] = reader
         
         frame_count = 0
         last_recognition_time = 0
         recognition_cooldown = 2  # seconds between recognitions
+
+        # Per-camera tracker (TRACKING.ENABLED). It only sees the throttled frames below,
+        # so every frame it gets is a detection frame; it saves re-embedding known tracks
+        tracked_recognizer = create_tracked_recognizer(self.recognizer, self.config, scheduler=self.scheduler,
+                                                       camera=camera_name, detect_every=1)
+
+        # Skip detection on frames without motion (MOTION_GATE.ENABLED)
+        motion_gate = create_motion_gate(self.config)
+        if motion_gate is not None:
+            self.motion_gates[camera_id] = motion_gate
         
         try:
             while self.camera_running.get(camera_id, False):
-                ret, frame = cap.read()
-                if not ret:
-                    logger.warning(f"Failed to read frame from camera {camera_id}")
-                    time.sleep(0.1)
+                captured = reader.read(timeout=1.0)
+                if captured is None:
+                    if not reader.connected:
+                        logger.warning(f"Failed to read frame from camera {camera_id}")
                     continue
+                frame = captured.image
                 
                 frame_count += 1
                 current_time = time.time()
                 
                 # Process every 30th frame (1 second at 30fps)
                 if frame_count % 30 == 0 and (current_time - last_recognition_time) > recognition_cooldown:
+                    if motion_gate is not None and not motion_gate.has_motion(frame):
+                        continue
                     try:
                         # Perform face recognition
-                        results = self.recognizer.recognize_faces(frame)
+                        if tracked_recognizer is not None:
+                            results = tracked_recognizer.recognize_face(frame)
+                        elif self.scheduler is not None:
+                            results = self.scheduler.recognize_face(frame, camera=camera_name)
+                        else:
+                            results = self.recognizer.recognize_face(frame, camera=camera_name)
                         
                         if results:
                             for result in results:
@@ -122,17 +146,25 @@ class CameraService:
                     
                     except Exception as e:
                         logger.error(f"Error processing frame from camera {camera_id}: {e}")
-                
-                # Small delay to prevent excessive CPU usage
-                time.sleep(0.033)  # ~30 FPS
         
         except Exception as e:
             logger.error(f"Error in camera {camera_id} processing: {e}")
         
         finally:
-            cap.release()
+            reader.stop()
+            self.capture_readers.pop(camera_id, None)
             logger.info(f"Camera {camera_id} processing stopped")
 
+    @staticmethod
+    def _open_capture(source):
+        cap = cv2.VideoCapture(source)
+        if cap.isOpened():
+            # Set camera properties
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            cap.set(cv2.CAP_PROP_FPS, 30)
+        return cap
+
     def _send_recognition_result(self, camera_id: str, camera_name: str, result: dict):
         """Send recognition result to the API"""
         try:
@@ -163,13 +195,27 @@ class CameraService:
     def get_camera_status(self) -> Dict[str, dict]:
         """Get status of all cameras"""
         status = {}
+        hot_set_stats = self.recognizer.get_hot_set_stats()
+        scheduler_stats = self.scheduler.get_stats()['cameras'] if self.scheduler is not None else {}
         for camera_id in self.camera_running:
             status[camera_id] = {
                 'running': self.camera_running.get(camera_id, False),
                 'thread_alive': self.camera_threads.get(camera_id, {}).is_alive() if camera_id in self.camera_threads else False
             }
+            if camera_id in self.motion_gates:
+                status[camera_id]['motion_gate'] = self.motion_gates[camera_id].get_stats()
+            if camera_id in self.capture_readers:
+                status[camera_id]['capture'] = self.capture_readers[camera_id].get_stats()
+            if camera_id in hot_set_stats:
+                status[camera_id]['hot_set'] = hot_set_stats[camera_id]
+            if camera_id in scheduler_stats:
+                status[camera_id]['scheduler'] = scheduler_stats[camera_id]
         return status
 
+    def get_detector_stats(self) -> Dict[str, dict]:
+        """Per-backend detector call counts and timings"""
+        return get_backend_stats()
+
     def start_all_cameras(self):
         """Start all configured cameras"""
         cameras = self.config.get('CAMERA_SOURCES', [])
@@ -188,6 +234,9 @@ class CameraService:
         for thread in self.camera_threads.values():
             if thread.is_alive():
                 thread.join(timeout=5)
+
+        if self.scheduler is not None:
+            self.scheduler.stop()
         
         logger.info("Stopped all cameras")
 
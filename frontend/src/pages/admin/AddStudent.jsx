@@ -77,6 +77,8 @@ const AddStudent = () => {
         
         if (response.data.training_completed) {
           toast.success('Training completed automatically!');
+        } else if (response.data.training_queued) {
+          toast.success('Training started in the background');
         } else if (response.data.training_error) {
           toast.error(`Training failed: ${response.data.training_error}`);
         }
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Compact a multi-embedding gallery to a few representatives per person.
+
+Re-selects up to GALLERY.MULTI.MAX_PER_PERSON representative embeddings per
+person (farthest-point sampling or k-medoids, near-duplicates dropped) and
+publishes the result as a new gallery version. The report shows how well
+the kept vectors still cover the dropped ones.
+
+Usage:
+  python scripts\\compact_gallery.py                    # use config.yaml settings
+  python scripts\\compact_gallery.py --k 5 --dry-run    # report only, change nothing
+  python scripts\\compact_gallery.py --method kmedoids --dedupe 0.95
+
+Compaction only removes vectors; to grow K again rebuild the gallery with
+precompute_embeddings.py (cached embeddings are not recomputed).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'src'))
+
+from utils import load_config
+import precompute_embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Select representative embeddings per person.")
+    parser.add_argument('--k', type=int, default=None, help="representatives per person (GALLERY.MULTI.MAX_PER_PERSON)")
+    parser.add_argument('--method', choices=('fps', 'kmedoids'), default=None, help="GALLERY.MULTI.COMPACTION")
+    parser.add_argument('--dedupe', type=float, default=None, help="near-duplicate similarity (GALLERY.MULTI.DEDUPE_SIMILARITY)")
+    parser.add_argument('--dry-run', action='store_true', help="print the coverage report without publishing")
+    args = parser.parse_args()
+
+    config = load_config()
+    if not config:
+        return 1
+    multi = config.setdefault('GALLERY', {}).setdefault('MULTI', {})
+    for key, value in (('MAX_PER_PERSON', args.k), ('COMPACTION', args.method), ('DEDUPE_SIMILARITY', args.dedupe)):
+        if value is not None:
+            multi[key] = value
+
+    report = precompute_embeddings.compact_gallery(config, dry_run=args.dry_run)
+    return 0 if report is not None else 1
+
+
+if __name__ == '__main__':
+    exit(main())
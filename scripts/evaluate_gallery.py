@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Compare gallery storage options: memory, search speed and accuracy.
+
+Builds the gallery vectors as float32, float16 and int8 indexes (with and
+without exact reranking) and reports, for each, the index size, ms/query,
+recall@1 / recall@k against an exact float32 scan and the largest error of
+the top-1 similarity.
+
+Usage:
+  python scripts\evaluate_gallery.py                       # current gallery
+  python scripts\evaluate_gallery.py --synthetic 50000 512 # random unit vectors
+  python scripts\evaluate_gallery.py --type hnsw --queries 2000
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.utils import load_config, load_faiss_data, read_gallery_manifest, GALLERY_VECTORS_FILE
+from src.gallery_index import build_index, index_settings, index_bytes, measure_recall
+
+
+def _gallery_vectors(config):
+    manifest = read_gallery_manifest(config)
+    if manifest is not None:
+        vectors_path = os.path.join(manifest['dir'], GALLERY_VECTORS_FILE)
+        if os.path.exists(vectors_path):
+            return np.load(vectors_path, allow_pickle=False)
+    index, _ = load_faiss_data(config, manifest['dir'] if manifest else None)
+    if index is None:
+        return None
+    # Exact for flat indexes; other index types cannot be evaluated from their codes
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate compressed gallery storage against exact search.")
+    parser.add_argument('--synthetic', nargs=2, type=int, metavar=('N', 'DIM'),
+                        help="use N random unit vectors of size DIM instead of the gallery")
+    parser.add_argument('--type', default='flat', help="index type to evaluate (flat, ivf_flat, hnsw)")
+    parser.add_argument('--queries', type=int, default=1000, help="number of noisy gallery vectors used as queries")
+    parser.add_argument('--k', type=int, default=10, help="k for recall@k")
+    parser.add_argument('--rerank-k', type=int, default=10, help="candidates re-scored exactly when reranking")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        n, dim = args.synthetic
+        vectors = np.random.default_rng(0).standard_normal((n, dim)).astype(np.float32)
+    else:
+        config = load_config()
+        vectors = _gallery_vectors(config) if config else None
+        if vectors is None:
+            print("No gallery found. Run precompute_embeddings.py first or pass --synthetic N DIM.")
+            return 1
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    print(f"Evaluating {vectors.shape[0]} vectors of dimension {vectors.shape[1]} ({args.type} index)\n")
+
+    rows = []
+    baseline_bytes = None
+    for storage in ('float32', 'float16', 'int8'):
+        settings = index_settings({'GALLERY': {'INDEX': {
+            'TYPE': args.type, 'STORAGE': storage, 'AUTO_THRESHOLD': 0,
+            'RECALL_SAMPLE': 0, 'RERANK': False}}})
+        index, info = build_index(vectors, settings)
+        size = index_bytes(index)
+        baseline_bytes = baseline_bytes or size
+        for rerank_k in ((None, args.rerank_k) if storage != 'float32' else (None,)):
+            report = measure_recall(index, vectors, k=args.k, sample=args.queries, rerank_k=rerank_k)
+            rows.append((storage + (f" +rerank{rerank_k}" if rerank_k else ''), size, baseline_bytes / size, report))
+
+    k = min(args.k, vectors.shape[0])
+    print(f"\n{'storage':<20}{'index MB':>10}{'smaller':>9}{'ms/query':>10}{'recall@1':>10}"
+          f"{f'recall@{k}':>11}{'max top-1 err':>15}")
+    for name, size, ratio, report in rows:
+        print(f"{name:<20}{size / 1e6:>10.2f}{ratio:>8.1f}x{report['index_ms_per_query']:>10.4f}"
+              f"{report['recall_at_1']:>10.4f}{report[f'recall_at_{k}']:>11.4f}{report['max_top1_error']:>15.6f}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""List gallery versions or roll back to an older one.
+
+Usage:
+  python scripts\gallery_versions.py                 # list versions
+  python scripts\gallery_versions.py --rollback      # switch to the previous version
+  python scripts\gallery_versions.py --rollback 12   # switch to version 12
+
+Running recognizers pick up the switch on their next gallery poll.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.utils import (load_config, list_gallery_versions, gallery_version_dir, read_gallery_manifest,
+                       rollback_gallery, verify_gallery)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or roll back FAISS gallery versions.")
+    parser.add_argument('--rollback', nargs='?', const='previous', default=None, metavar='VERSION',
+                        help="make VERSION (default: the previous one) current")
+    args = parser.parse_args()
+
+    config = load_config()
+    if not config:
+        return 1
+
+    if args.rollback is not None:
+        try:
+            rollback_gallery(config, None if args.rollback == 'previous' else int(args.rollback))
+        except ValueError as e:
+            print(f"Rollback failed: {e}")
+            return 1
+
+    current = read_gallery_manifest(config)
+    current_version = current.get('version') if current else None
+    versions = list_gallery_versions(config)
+    if not versions:
+        print("No versioned gallery found. Run precompute_embeddings.py first.")
+        return 0
+    for version in versions:
+        version_dir = gallery_version_dir(config, version)
+        manifest = read_gallery_manifest(config, version_dir) or {}
+        problems = verify_gallery(version_dir)
+        print(f"{'*' if version == current_version else ' '} v{version:<6} {manifest.get('built_at', '?'):<28} "
+              f"{manifest.get('persons', '?'):>6} persons  dim {manifest.get('dimension', '?'):<5} "
+              f"{manifest.get('model', '?')}  {'OK' if not problems else 'DAMAGED: ' + '; '.join(problems)}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
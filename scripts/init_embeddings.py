@@ -20,13 +20,13 @@ def main(auto_yes=False):
         create_sample_dataset = None
 
     try:
-        from src.utils import load_config
+        from src.utils import load_config, read_gallery_manifest
         from src import precompute_embeddings
     except Exception:
         # Try alternative imports when running from different CWD
         sys.path.insert(0, str(ROOT / 'src'))
         try:
-            from utils import load_config
+            from utils import load_config, read_gallery_manifest
             import precompute_embeddings
         except Exception as e:
             print("Could not import project modules. Run this from the project root and ensure packages are available.")
@@ -65,7 +65,9 @@ def main(auto_yes=False):
         print(f"precompute_embeddings failed: {e}")
         return 1
 
-    emb_dir = Path(config['PATHS'].get('EMBEDDINGS_DIR', 'embeddings'))
+    # Builds are published into a versioned directory under embeddings/gallery/
+    manifest = read_gallery_manifest(config)
+    emb_dir = Path(manifest['dir'] if manifest else config['PATHS'].get('EMBEDDINGS_DIR', 'embeddings'))
     index_path = emb_dir / config['PATHS'].get('FAISS_INDEX_FILE', 'faiss_index.bin')
     labels_path = emb_dir / config['PATHS'].get('LABELS_FILE', 'labels.pkl')
 
@@ -8,8 +8,9 @@ import datetime
 from functools import wraps
 from werkzeug.utils import secure_filename
 import threading
-from utils import load_config
-import precompute_embeddings
+import json
+from utils import load_config, parse_rois
+from training_jobs import TrainingQueue
 from dotenv import load_dotenv
 import yaml
 
@@ -24,6 +25,9 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'PLACEHOLDER_SECRET_KEY')
 
 DB_PATH = "attendance_system.db"
 
+# Uploads, deletions and retrains are trained in the background, one job at a time
+training_queue = TrainingQueue(DB_PATH)
+
 # ---------------- Database Initialization ----------------
 def init_db():
     conn = sqlite3.connect(DB_PATH)
@@ -49,6 +53,12 @@ def init_db():
     except sqlite3.OperationalError:
         pass  # Column already exists
 
+    # Optional detection regions of interest, stored as JSON
+    try:
+        c.execute("ALTER TABLE cameras ADD COLUMN roi TEXT")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
     # Attendance table
     c.execute('''CREATE TABLE IF NOT EXISTS attendance (
                     attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -87,6 +97,13 @@ def init_db():
                     model_path TEXT
                 )''')
 
+    # Job tracking columns for the background training queue
+    for column in ("progress REAL", "requests INTEGER", "details TEXT", "error TEXT", "lease_until REAL"):
+        try:
+            c.execute(f"ALTER TABLE training_sessions ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
     # Preload users from environment variables and a default admin
     users = [
         ("admin", "admin"),  # Default admin user
@@ -191,8 +208,9 @@ def add_student(current_user):
 def get_cameras(current_user):
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute("SELECT camera_id, ip_address, name, is_active FROM cameras")
-    cameras = [{'camera_id': row[0], 'ip_address': row[1], 'name': row[2] or f'Camera-{row[0]}', 'is_active': bool(row[3])} for row in c.fetchall()]
+    c.execute("SELECT camera_id, ip_address, name, is_active, roi FROM cameras")
+    cameras = [{'camera_id': row[0], 'ip_address': row[1], 'name': row[2] or f'Camera-{row[0]}', 'is_active': bool(row[3]),
+                'roi': json.loads(row[4]) if row[4] else None} for row in c.fetchall()]
     conn.close()
     return jsonify(cameras)
 
@@ -206,26 +224,32 @@ def add_camera(current_user):
     
     if not name or not ip_address:
         return jsonify({'error': 'Missing name or IP address'}), 400
+
+    try:
+        rois = parse_rois(data.get('roi'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid roi: {e}'}), 400
     
     # Add to database
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute("INSERT INTO cameras (ip_address, name) VALUES (?, ?)", (ip_address, name))
+    c.execute("INSERT INTO cameras (ip_address, name, roi) VALUES (?, ?, ?)",
+              (ip_address, name, json.dumps(rois) if rois else None))
     camera_id = c.lastrowid
     conn.commit()
     conn.close()
     
     # Update config.yaml
     try:
-        update_config_yaml(name, ip_address)
+        update_config_yaml(name, ip_address, rois)
     except Exception as e:
         print(f"Warning: Could not update config.yaml: {e}")
     
     return jsonify({'message': f'Camera {name} added successfully', 'camera_id': camera_id})
 
 
-def update_config_yaml(camera_name, camera_source):
-    """Add a new camera to config.yaml"""
+def update_config_yaml(camera_name, camera_source, rois=None):
+    """Add a new camera (and its optional ROIs) to config.yaml"""
     config_path = "config.yaml"
     
     try:
@@ -244,10 +268,13 @@ def update_config_yaml(camera_name, camera_source):
         
         if not exists:
             # Add new camera
-            camera_sources.append({
+            camera_entry = {
                 'name': camera_name,
                 'source': camera_source
-            })
+            }
+            if rois:
+                camera_entry['roi'] = rois
+            camera_sources.append(camera_entry)
             config['CAMERA_SOURCES'] = camera_sources
             
             # Write back to file
@@ -481,12 +508,10 @@ def dataset_upload(current_user):
     conn.commit()
     conn.close()
 
-    # Attempt to run training (precompute embeddings).
-    try:
-        precompute_embeddings.precompute_embeddings()
-        return jsonify({'message': f'Uploaded {len(saved_files)} files for {label} and retrained model.', 'training_completed': True})
-    except Exception as e:
-        return jsonify({'message': f'Uploaded {len(saved_files)} files for {label}, but training failed.', 'training_completed': False, 'training_error': str(e)}), 500
+    # Embed only the new files in the background; poll GET /dataset/train/<job_id>
+    job_id = training_queue.enroll(label, saved_files)
+    return jsonify({'message': f'Uploaded {len(saved_files)} files for {label}; training queued.',
+                    'job_id': job_id, 'training_completed': False, 'training_queued': True}), 202
 
 
 
@@ -525,12 +550,10 @@ def dataset_delete(current_user, person_name):
         conn.commit()
         conn.close()
 
-        # Retrain
-        try:
-            precompute_embeddings.precompute_embeddings()
-            return jsonify({'message': f'Deleted {person_name} and retrained', 'training_completed': True})
-        except Exception as e:
-            return jsonify({'message': f'Deleted {person_name} but retraining failed', 'training_completed': False, 'training_error': str(e)}), 500
+        # Drop this person's vectors from the index in the background
+        job_id = training_queue.remove(person_name)
+        return jsonify({'message': f'Deleted {person_name}; retraining queued', 'job_id': job_id,
+                        'training_completed': False, 'training_queued': True}), 202
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -539,11 +562,19 @@ def dataset_delete(current_user, person_name):
 @app.route('/dataset/train', methods=['POST'])
 @token_required
 def dataset_train(current_user):
-    try:
-        precompute_embeddings.precompute_embeddings()
-        return jsonify({'message': 'Training completed', 'training_completed': True})
-    except Exception as e:
-        return jsonify({'message': 'Training failed', 'training_completed': False, 'training_error': str(e)}), 500
+    job_id = training_queue.full()
+    return jsonify({'message': 'Training queued', 'job_id': job_id, 'training_completed': False,
+                    'training_queued': True}), 202
+
+
+@app.route('/dataset/train/<int:job_id>', methods=['GET'])
+@token_required
+def dataset_train_status(current_user, job_id):
+    """Status of a training job: queued, running, completed, failed or interrupted."""
+    job = training_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Training job not found'}), 404
+    return jsonify(job)
 
 
 @app.route('/cameras/<int:camera_id>/toggle', methods=['POST'])
@@ -570,7 +601,40 @@ def toggle_camera_status(current_user, camera_id):
     return jsonify({'message': f'Camera {camera_id} status updated to {"active" if new_status else "inactive"}'})
 
 
+
+@app.route('/cameras/<int:camera_id>/roi', methods=['PUT'])
+@token_required
+def update_camera_roi(current_user, camera_id):
+    """Set (or clear, with null or an empty list) the detection ROIs of a camera.
+
+    Body: {"roi": [[x1, y1, x2, y2], [[x, y], [x, y], [x, y]], ...]}, in pixels
+    or as 0-1 fractions of the frame. A cleared ROI is stored as '[]', so it
+    also overrides the camera's config.yaml ROI, which only applies while the
+    column is NULL. The background processor applies it to the running camera
+    on its next camera poll (within 30 seconds); the camera service reads ROIs
+    from config.yaml and needs a restart.
+    """
+    data = request.get_json() or {}
+    try:
+        rois = parse_rois(data.get('roi'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid roi: {e}'}), 400
+
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("UPDATE cameras SET roi=? WHERE camera_id=?", (json.dumps(rois), camera_id))
+    updated = c.rowcount
+    conn.commit()
+    conn.close()
+
+    if not updated:
+        return jsonify({'error': 'Camera not found'}), 404
+    return jsonify({'message': f'Camera {camera_id} ROI updated', 'roi': rois})
+
+
 if __name__ == '__main__':
     init_db()
+    # Only jobs whose process died are interrupted, so the reloader's second process is safe
+    training_queue.recover()
     app.run(host='0.0.0.0', port=5000, debug=True)
 
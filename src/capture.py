@@ -0,0 +1,322 @@
+"""Latest-frame-only camera capture.
+
+`cap.read()` in the recognition loop returns the *oldest* frame buffered by
+the decoder, so on RTSP / MJPEG streams a loop slower than the camera falls
+further and further behind real time. `LatestFrameReader` instead drains
+the stream on its own thread and keeps only the newest decoded frame; the
+recognition loop calls `read()` and always gets the newest frame (waiting
+only if it already has that one). Frames that were decoded but never read
+are counted as dropped, so recognition latency stays bounded by one
+processing step and `get_stats()` shows how far each camera lags.
+
+The reader thread reopens the source after a failure, every
+CAPTURE.RECONNECT_SECONDS.
+
+Frames are decoded by cv2.VideoCapture (`decoder: opencv`, the default) or
+by an ffmpeg subprocess (`decoder: ffmpeg` on a CAMERA_SOURCES entry, or
+CAPTURE.DECODER for all cameras). `FFmpegCapture` lets ffmpeg downscale
+(`decode_width` / `decode_height`), drop frames (`decode_fps`) and skip
+every non-keyframe (`keyframes_only`, `-skip_frame nokey`) inside the
+decoder, and reads raw BGR frames from its stdout into reused buffers.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from functools import partial
+from typing import Callable, Dict, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+_LOG = logging.getLogger("capture")
+
+
+class Frame(NamedTuple):
+    image: np.ndarray
+    timestamp: float  # time.time() when the frame was decoded
+    seq: int          # 1 for the first frame, +1 per decoded frame
+
+
+class FFmpegCapture:
+    """cv2.VideoCapture-like reader of raw BGR frames from an ffmpeg subprocess.
+
+    The output size is fixed when the process starts: `width` / `height`
+    (either one keeps the aspect ratio; frames are never upscaled), probed
+    with ffprobe if one of them is missing. `fps` caps the frame rate by
+    dropping frames closer than 1/fps to the last one kept (never duplicating
+    any, so slow or variable-rate input, e.g. `keyframes_only`, is passed
+    through as is) and `keyframes_only` makes the decoder skip all other
+    frames.
+    """
+
+    def __init__(self, source, width: Optional[int] = None, height: Optional[int] = None,
+                 fps: Optional[float] = None, keyframes_only: bool = False,
+                 ffmpeg_path: str = 'ffmpeg', ffprobe_path: str = 'ffprobe'):
+        self.source = str(source)
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.fps = float(fps) if fps else None
+        self._process: Optional[subprocess.Popen] = None
+        self.width, self.height = self._output_size(width, height)
+        if self.width and self.height:
+            self._process = subprocess.Popen(self._command(keyframes_only), stdin=subprocess.DEVNULL,
+                                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+
+    def _probe_size(self):
+        try:
+            output = subprocess.run([self.ffprobe_path, '-v', 'error', '-select_streams', 'v:0',
+                                     '-show_entries', 'stream=width,height', '-of', 'csv=p=0:s=x', self.source],
+                                    capture_output=True, text=True, timeout=15).stdout
+            width, height = output.strip().splitlines()[0].split('x')[:2]
+            return int(width), int(height)
+        except (OSError, subprocess.SubprocessError, ValueError, IndexError) as e:
+            _LOG.warning("ffprobe could not read the frame size of %s: %s", self.source, e)
+            return None
+
+    def _output_size(self, width, height):
+        if width and height:
+            return int(width), int(height)
+        probed = self._probe_size()
+        if probed is None:
+            return 0, 0
+        source_width, source_height = probed
+        if width:
+            scale = min(1.0, int(width) / source_width)
+        elif height:
+            scale = min(1.0, int(height) / source_height)
+        else:
+            scale = 1.0
+        # Even sizes keep every scaler / pixel format happy
+        return max(2, int(round(source_width * scale / 2)) * 2), max(2, int(round(source_height * scale / 2)) * 2)
+
+    def _command(self, keyframes_only):
+        command = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin']
+        if self.source.lower().startswith('rtsp://'):
+            command += ['-rtsp_transport', 'tcp']
+        if '://' in self.source:
+            # Live streams: do not buffer ahead of the newest frame
+            command += ['-fflags', 'nobuffer', '-flags', 'low_delay']
+        if keyframes_only:
+            command += ['-skip_frame', 'nokey']
+        command += ['-i', self.source, '-an', '-sn', '-dn']
+        filters = []
+        if self.fps:
+            # The fps filter would duplicate frames to fill gaps; select only drops them.
+            # A 2% tolerance keeps timestamp jitter from skipping a frame that is due
+            gap = 0.98 / self.fps
+            filters.append(f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{gap:.6g})'")
+        filters.append(f'scale={self.width}:{self.height}:flags=fast_bilinear')
+        # Passthrough: emit exactly the frames the filters kept, no duplicates to a constant rate
+        command += ['-vf', ','.join(filters), '-vsync', 'passthrough',
+                    '-pix_fmt', 'bgr24', '-f', 'rawvideo', 'pipe:1']
+        return command
+
+    def isOpened(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def read(self, image: Optional[np.ndarray] = None):
+        """Read the next frame into `image` if it has the right shape, else into a new array."""
+        if self._process is None:
+            return False, None
+        shape = (self.height, self.width, 3)
+        if image is None or image.shape != shape or image.dtype != np.uint8 or not image.flags.c_contiguous:
+            image = np.empty(shape, dtype=np.uint8)
+        view = memoryview(image).cast('B')
+        filled = 0
+        while filled < len(view):
+            count = self._process.stdout.readinto(view[filled:])
+            if not count:
+                return False, None
+            filled += count
+        return True, image
+
+    def get(self, prop_id):
+        return {cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+                cv2.CAP_PROP_FPS: self.fps or 0.0}.get(prop_id, 0.0)
+
+    def set(self, prop_id, value) -> bool:
+        # Everything is fixed on the ffmpeg command line
+        return False
+
+    def release(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        if process.stdout is not None:
+            process.stdout.close()
+
+
+class LatestFrameReader:
+    """Keeps the newest frame of one camera; see the module docstring.
+
+    With `reuse_buffers` the decoder writes into the arrays of frames that
+    were dropped or already handled, so a frame returned by read() is only
+    valid until the next read() (copy it to keep it longer).
+    """
+
+    def __init__(self, source, name: Optional[str] = None, open_capture: Optional[Callable] = None,
+                 reconnect_seconds: float = 5.0, reuse_buffers: bool = False):
+        self.source = source
+        self.name = str(name if name is not None else source)
+        # Returns an object with isOpened() / read() / release(), like cv2.VideoCapture
+        self.open_capture = open_capture or cv2.VideoCapture
+        self.reconnect_seconds = max(0.1, float(reconnect_seconds))
+        self.reuse_buffers = bool(reuse_buffers)
+        self.connected = False
+        self._latest: Optional[Frame] = None
+        self._last_read_seq = 0
+        self._delivered: Optional[np.ndarray] = None
+        self._free = []
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'decoded': 0, 'delivered': 0, 'dropped': 0, 'reconnects': 0, 'last_age_ms': 0.0}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=f"capture-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def read(self, timeout: Optional[float] = None) -> Optional[Frame]:
+        """Newest frame not returned before; waits up to `timeout` seconds for one.
+
+        Returns None on timeout or after stop().
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._stop_event.is_set() and (self._latest is None or self._latest.seq <= self._last_read_seq):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if self._stop_event.is_set():
+                return None
+            frame = self._latest
+            if self.reuse_buffers:
+                # The caller is done with the previous frame now
+                self._recycle(self._delivered)
+                self._delivered = frame.image
+            self._stats['dropped'] += frame.seq - self._last_read_seq - 1
+            self._stats['delivered'] += 1
+            self._stats['last_age_ms'] = (time.time() - frame.timestamp) * 1000.0
+            self._last_read_seq = frame.seq
+        return frame
+
+    def _recycle(self, image):
+        if image is not None and len(self._free) < 2:
+            self._free.append(image)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._condition:
+            stats = dict(self._stats)
+        stats['connected'] = self.connected
+        stats['drop_rate'] = stats['dropped'] / stats['decoded'] if stats['decoded'] else 0.0
+        return stats
+
+    def _run(self):
+        seq = 0
+        first = True
+        while not self._stop_event.is_set():
+            if not first:
+                with self._condition:
+                    self._stats['reconnects'] += 1
+                if self._stop_event.wait(self.reconnect_seconds):
+                    break
+            first = False
+            try:
+                cap = self.open_capture(self.source)
+            except Exception as e:
+                _LOG.warning("Cannot open camera %s: %s", self.name, e)
+                continue
+            if not cap.isOpened():
+                _LOG.warning("Cannot open camera %s; retrying in %.0f s", self.name, self.reconnect_seconds)
+                cap.release()
+                continue
+            try:
+                # Ask the backend not to queue frames of its own (ignored where unsupported)
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            except Exception:
+                pass
+            self.connected = True
+            _LOG.info("Camera %s opened", self.name)
+            try:
+                while not self._stop_event.is_set():
+                    with self._condition:
+                        buffer = self._free.pop() if self._free else None
+                    ret, image = cap.read(buffer) if buffer is not None else cap.read()
+                    if not ret:
+                        _LOG.warning("Lost connection to camera %s; reconnecting", self.name)
+                        break
+                    seq += 1
+                    with self._condition:
+                        if self.reuse_buffers and self._latest is not None and self._latest.seq > self._last_read_seq:
+                            # Nobody will read the frame being replaced
+                            self._recycle(self._latest.image)
+                        self._latest = Frame(image, time.time(), seq)
+                        self._stats['decoded'] += 1
+                        self._condition.notify_all()
+            except Exception as e:
+                _LOG.warning("Capture from camera %s failed: %s", self.name, e)
+            finally:
+                self.connected = False
+                cap.release()
+
+
+def _camera_config(config, name):
+    """The CAMERA_SOURCES entry of camera `name`, or {}."""
+    for cam in (config or {}).get('CAMERA_SOURCES', []) or []:
+        if str(cam.get('name', cam.get('source'))) == str(name):
+            return cam
+    return {}
+
+
+def create_capture_reader(source, name=None, config=None, open_capture=None, camera_config=None) -> LatestFrameReader:
+    """Start a LatestFrameReader with the CAPTURE settings of config.yaml.
+
+    The decoder and its options come from `camera_config` (default: the
+    CAMERA_SOURCES entry named `name`), then CAPTURE. `open_capture` is the
+    OpenCV opener used with `decoder: opencv`.
+    """
+    capture_cfg = (config or {}).get('CAPTURE', {}) or {}
+    cam = camera_config if camera_config is not None else _camera_config(config, name)
+    decoder = str(cam.get('decoder', capture_cfg.get('DECODER', 'opencv'))).lower()
+    reuse_buffers = False
+    if decoder == 'ffmpeg':
+        ffmpeg_path = capture_cfg.get('FFMPEG_PATH', 'ffmpeg')
+        if isinstance(source, int) or str(source).isdigit():
+            _LOG.warning("Camera %s: ffmpeg cannot open device index %s; using OpenCV", name, source)
+        elif shutil.which(ffmpeg_path) is None and not os.path.isfile(ffmpeg_path):
+            _LOG.warning("Camera %s: %s not found; using OpenCV", name, ffmpeg_path)
+        else:
+            open_capture = partial(FFmpegCapture,
+                                   width=cam.get('decode_width', capture_cfg.get('DECODE_WIDTH')),
+                                   height=cam.get('decode_height', capture_cfg.get('DECODE_HEIGHT')),
+                                   fps=cam.get('decode_fps', capture_cfg.get('DECODE_FPS')),
+                                   keyframes_only=cam.get('keyframes_only', capture_cfg.get('KEYFRAMES_ONLY', False)),
+                                   ffmpeg_path=ffmpeg_path,
+                                   ffprobe_path=capture_cfg.get('FFPROBE_PATH', 'ffprobe'))
+            reuse_buffers = True
+    elif decoder != 'opencv':
+        _LOG.warning("Camera %s: unknown decoder %r; using OpenCV", name, decoder)
+    return LatestFrameReader(source, name=name, open_capture=open_capture, reuse_buffers=reuse_buffers,
+                             reconnect_seconds=capture_cfg.get('RECONNECT_SECONDS', 5)).start()
@@ -0,0 +1,109 @@
+"""In-memory DeepFace embeddings for the fallback path.
+
+`DeepFaceEmbedder(model_name)` builds the DeepFace model once and embeds
+NumPy BGR images directly, without writing temp JPEGs:
+  - `embed(crops)` takes already detected face crops and runs the whole
+    batch through the underlying Keras model in one call;
+  - `embed_image(image)` lets DeepFace find the face itself (used on full
+    frames and dataset photos).
+
+TensorFlow is only imported by `warmup()` (or the first call), so modules
+importing this one stay light. Call `warmup()` at startup so the first
+fallback does not stall a camera thread while the model loads.
+"""
+
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+class DeepFaceEmbedder:
+
+    def __init__(self, model_name: str = 'VGG-Face', detector_backend: str = 'opencv'):
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self._deepface = None
+        self._preprocessing = None
+        self._client = None
+        self._ready = False
+        self._error: Optional[Exception] = None
+        self._load_lock = threading.Lock()
+        # Keras models are not safe to call from several threads at once
+        self._forward_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self._ready
+
+    def warmup(self) -> bool:
+        """Import DeepFace, build the model and run one dummy forward pass.
+
+        Returns False (and keeps the error) if DeepFace cannot be loaded.
+        """
+        if self._ready or self._error is not None:
+            return self._ready
+        with self._load_lock:
+            if self._ready or self._error is not None:
+                return self._ready
+            try:
+                from deepface import DeepFace
+                from deepface.modules import preprocessing
+                self._deepface = DeepFace
+                self._preprocessing = preprocessing
+                self._client = DeepFace.build_model(self.model_name)
+                h, w = self._target_size()
+                self._forward(np.zeros((1, h, w, 3), dtype=np.float32))
+                self._ready = True
+            except Exception as e:
+                self._error = e
+                print(f"DeepFace embedder unavailable ({self.model_name}): {e}")
+        return self._ready
+
+    def _target_size(self):
+        # DeepFace models report input_shape as (width, height)
+        w, h = self._client.input_shape
+        return int(h), int(w)
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        keras_model = getattr(self._client, 'model', None)
+        with self._forward_lock:
+            if callable(keras_model):
+                embeddings = np.asarray(keras_model(batch, training=False), dtype=np.float32)
+            else:
+                embeddings = np.stack([np.asarray(self._client.forward(img[None]), dtype=np.float32) for img in batch])
+        embeddings = embeddings.reshape(len(batch), -1)
+        if self.model_name == 'VGG-Face':
+            # DeepFace L2-normalizes VGG-Face outputs in its own forward()
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        return embeddings
+
+    def embed(self, crops: Sequence[np.ndarray]) -> np.ndarray:
+        """Embed already detected BGR face crops in one batch; returns (N, D) float32."""
+        if not self.warmup():
+            raise RuntimeError(f"DeepFace is not available: {self._error}")
+        if not crops:
+            return np.zeros((0, 0), dtype=np.float32)
+        h, w = self._target_size()
+        batch: List[np.ndarray] = []
+        for crop in crops:
+            # Same preprocessing as DeepFace.represent: BGR scaled to 0-1, resized with padding
+            img = self._preprocessing.resize_image(img=crop.astype(np.float32) / 255.0, target_size=(h, w))
+            batch.append(img[0])
+        return self._forward(np.stack(batch).astype(np.float32, copy=False))
+
+    def embed_image(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """Let DeepFace detect the face in a BGR image and return its embedding, or None."""
+        if not self.warmup():
+            return None
+        with self._forward_lock:
+            representations = self._deepface.represent(
+                img_path=image,
+                model_name=self.model_name,
+                enforce_detection=False,
+                detector_backend=self.detector_backend,
+            )
+        if representations:
+            return np.array(representations[0]['embedding'], dtype=np.float32)
+        return None
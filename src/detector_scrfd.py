@@ -1,39 +1,60 @@
 
 """Face detector wrapper with multiple backends.
 
-This module exposes `detect_faces(image, device='cpu')` and will try the
-following in order:
- 1. InsightFace / SCRFD (if available and model file provided)
- 2. YOLOv8 face model (if `ultralytics` is installed and model file present)
- 3. OpenCV Haar Cascade fallback (fast but less accurate)
+This module exposes `detect_faces(image)` on top of a small registry of
+detector backends:
+ 1. `scrfd`: InsightFace / SCRFD (if available and model file provided)
+ 2. `yolo`: YOLOv8 face model (if `ultralytics` is installed and model file present)
+ 3. `yunet`: OpenCV YuNet (cv2.FaceDetectorYN), CPU-only, with landmarks
+ 4. `haar`: OpenCV Haar Cascade (fast but less accurate)
+ 5. `dnn`: OpenCV Caffe SSD face detector
+
+Every backend is initialized once, on first use; fallbacks are only loaded
+once the backends before them have failed. Each call runs a single
+primary backend (DETECTION.BACKEND, 'auto' picks the first one available in
+the order above, or per call via `backend=`); the DETECTION.FALLBACK
+backends are only tried if the primary raises, never because a frame simply
+has no faces. `get_backend_stats()` reports per-backend call counts and
+timings.
 
 The function accepts a BGR numpy image (as returned by OpenCV) or a path to
 an image file and returns a list of bounding boxes in (x1, y1, x2, y2) format.
+
+`detect_faces_with_landmarks(image)` runs the same detector but also returns
+the 5-point landmarks for each box (None for backends that do not provide
+them), so callers can align faces without a second detection.
+
+The backends are shared, so their device is set once with
+`configure_detection(config, device=...)`. The `device` argument of the
+detect functions is deprecated and ignored; it is kept so old callers work.
+
+Both accept `rois=` to search only parts of the frame and `tiles=` to split
+high-resolution frames into overlapping detector-sized tiles run as a batch.
 """
 
-from typing import List, Tuple, Union
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import abc
 import cv2
 import numpy as np
 import os
 import logging
+import threading
+import time
 
 logging.basicConfig(level=logging.INFO)
 _LOG = logging.getLogger("detector")
 
+_REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+_REPO_MODELS = os.path.join(_REPO_ROOT, 'models')
 
-def _load_haar_detector():
-	haar_path = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
-	if os.path.exists(haar_path):
-		return cv2.CascadeClassifier(haar_path)
-	return None
 
-
-_HAAR_DETECTOR = _load_haar_detector()
+def _repo_path(path: str) -> str:
+	"""Resolve a config path relative to the repository root."""
+	return path if os.path.isabs(path) else os.path.join(_REPO_ROOT, path)
 
 
 # Try to import Ultralytics YOLO (for yolov8n-face.pt)
 _YOLO_AVAILABLE = False
-_YOLO_MODEL = None
 try:
 	from ultralytics import YOLO
 	_YOLO_AVAILABLE = True
@@ -41,168 +62,757 @@ except Exception:
 	_YOLO_AVAILABLE = False
 
 
-def _try_load_yolo_model(model_path: str):
-	global _YOLO_MODEL
-	if not _YOLO_AVAILABLE:
-		return False
-	try:
-		if os.path.exists(model_path):
-			_LOG.info(f"Loading YOLO model from: {model_path}")
-			_YOLO_MODEL = YOLO(model_path)
-			return True
-	except Exception as e:
-		_LOG.warning(f"Failed to load YOLO model: {e}")
-	return False
-
-
 # Try to import insightface detector (optional)
 _INSIGHT_AVAILABLE = False
-_INSIGHT_DET = None
+_SCRFD_INPUT_SIZE = (640, 640)
 try:
 	import insightface
 	from insightface import model_zoo
+	from insightface.model_zoo.scrfd import distance2bbox, distance2kps
 	_INSIGHT_AVAILABLE = True
 except Exception:
 	_INSIGHT_AVAILABLE = False
 
 
-def _try_load_scrfd(model_path: str, device: str = 'cpu'):
-	global _INSIGHT_DET
-	if not _INSIGHT_AVAILABLE:
-		return False
-	try:
-		# If an onnx model path is provided, insightface can load it via model_zoo
-		if os.path.exists(model_path):
-			_LOG.info(f"Loading SCRFD from: {model_path}")
-			# insightface model_zoo can load by path
-			_INSIGHT_DET = model_zoo.get_model(model_path)
-			# prepare may be required depending on the model type
-			try:
-				ctx_id = 0 if device.startswith('cuda') else -1
-				_INSIGHT_DET.prepare(ctx_id=ctx_id)
-			except Exception:
-				pass
-			return True
-	except Exception as e:
-		_LOG.warning(f"Failed to load SCRFD via insightface: {e}")
-	return False
+class DetectorBackend(abc.ABC):
+	"""A face detector behind the common registry interface.
 
+	`load()` initializes the backend once and reports whether it is usable.
+	`detect_many(images)` returns one (boxes, landmarks, scores) triple per
+	image and raises on failure; an image without faces is not a failure.
+	"""
 
-def _ensure_models_loaded():
-	"""Attempt to find and load available detector models in the repo models/ folder."""
-	repo_models = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models')
-	yolo_path = os.path.join(repo_models, 'yolov8n-face.pt')
-	scrfd_path = os.path.join(repo_models, 'scrfd_500m.onnx')
+	name = 'base'
+	input_size = _SCRFD_INPUT_SIZE  # native input size, used for tiling
 
-	# Prefer SCRFD if insightface available and model present
-	if scrfd_path and os.path.exists(scrfd_path) and _INSIGHT_AVAILABLE and _INSIGHT_DET is None:
-		_try_load_scrfd(scrfd_path)
+	def __init__(self):
+		self._loaded: Optional[bool] = None
+		self._load_lock = threading.Lock()
 
-	# Try YOLO if available and model present
-	if yolo_path and os.path.exists(yolo_path) and _YOLO_MODEL is None:
-		_try_load_yolo_model(yolo_path)
+	def load(self) -> bool:
+		if self._loaded is None:
+			with self._load_lock:
+				if self._loaded is None:
+					try:
+						self._loaded = bool(self._load())
+					except Exception as e:
+						_LOG.warning(f"Failed to load {self.name} detector: {e}")
+						self._loaded = False
+		return self._loaded
 
+	def _load(self) -> bool:
+		return True
 
-def detect_faces(image: Union[np.ndarray, str], device: str = 'cpu') -> List[Tuple[int, int, int, int]]:
-	"""Detect faces in an image and return bounding boxes.
+	@abc.abstractmethod
+	def detect_many(self, images: Sequence[np.ndarray]):
+		"""One (boxes, landmarks, scores) triple per image."""
 
-	Returns a list of (x1, y1, x2, y2).
-	"""
-	# Load image if a path was provided
-	if isinstance(image, str):
-		img = cv2.imread(image)
-		if img is None:
-			_LOG.error(f"Could not load image from path: {image}")
-			return []
-	else:
-		img = image
 
-	if img is None or not hasattr(img, 'shape'):
-		_LOG.error("Input image is invalid or not a numpy array.")
-		return []
+class ScrfdBackend(DetectorBackend):
 
-	_ensure_models_loaded()
+	name = 'scrfd'
 
-	h, w = img.shape[:2]
+	def __init__(self, model_path: str = os.path.join(_REPO_MODELS, 'scrfd_500m.onnx'), device: str = 'cpu'):
+		super().__init__()
+		self.model_path = model_path
+		self.device = device
+		self.model = None
+
+	@property
+	def input_size(self):
+		if self.model is not None and getattr(self.model, 'input_size', None):
+			return tuple(self.model.input_size)
+		return _SCRFD_INPUT_SIZE
 
-	# 1) Try insightface SCRFD if loaded
-	if _INSIGHT_AVAILABLE and _INSIGHT_DET is not None:
+	def _load(self) -> bool:
+		if self.model is not None:
+			return True
+		if not _INSIGHT_AVAILABLE or not os.path.exists(self.model_path):
+			return False
+		# insightface model_zoo can load by path
+		_LOG.info(f"Loading SCRFD from: {self.model_path}")
+		model = model_zoo.get_model(self.model_path)
+		# prepare may be required depending on the model type
 		try:
-			rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-			dets = _INSIGHT_DET.detect(rgb)
+			ctx_id = 0 if self.device.startswith('cuda') else -1
+			model.prepare(ctx_id=ctx_id, input_size=_SCRFD_INPUT_SIZE)
+		except Exception:
+			pass
+		self.model = model
+		return True
+
+	def use_model(self, model) -> bool:
+		"""Install an already prepared SCRFD model if none could be loaded from disk."""
+		if model is None or self.load():
+			return False
+		with self._load_lock:
+			self.model = model
+			self._loaded = True
+		return True
+
+	def _input_size(self, img: np.ndarray) -> Tuple[int, int]:
+		"""Detection input (w, h) for one image: its own size rounded up to a
+		multiple of 32 and capped at the model input size, so small ROI crops
+		are not letterboxed up to the full 640x640. Models exported with a
+		fixed input shape always get that shape."""
+		model = self.model
+		max_size = tuple(model.input_size or _SCRFD_INPUT_SIZE)
+		input_shape = getattr(model, 'input_shape', None)
+		if not input_shape or isinstance(input_shape[2], int):
+			return max_size
+		h, w = img.shape[:2]
+		return (min(max_size[0], max(32, -(-w // 32) * 32)), min(max_size[1], max(32, -(-h // 32) * 32)))
+
+	def _forward(self, images: Sequence[np.ndarray]):
+		"""One (dets, kpss) pair per image; images with the same input size run as one batch when the model allows it."""
+		model = self.model
+		sizes = [self._input_size(img) for img in images]
+		batch_dim = model.input_shape[0] if getattr(model, 'input_shape', None) else 1
+		if len(images) == 1 or not getattr(model, 'batched', False) or isinstance(batch_dim, int):
+			return [model.detect(img, input_size=size) for img, size in zip(images, sizes)]
+
+		groups: Dict[Tuple[int, int], List[int]] = {}
+		for i, size in enumerate(sizes):
+			groups.setdefault(size, []).append(i)
+		results = [None] * len(images)
+		for input_size, indices in groups.items():
+			if len(indices) == 1:
+				results[indices[0]] = model.detect(images[indices[0]], input_size=input_size)
+				continue
+			letterboxed = [_letterbox(images[i], input_size) for i in indices]
+			blob = cv2.dnn.blobFromImages([det_img for det_img, _ in letterboxed], 1.0 / model.input_std, input_size,
+										  (model.input_mean, model.input_mean, model.input_mean), swapRB=True)
+			net_outs = model.session.run(model.output_names, {model.input_name: blob})
+			for b, (i, (_, det_scale)) in enumerate(zip(indices, letterboxed)):
+				results[i] = _scrfd_decode(model, net_outs, b, blob.shape[2], blob.shape[3], det_scale)
+		return results
+
+	def detect_many(self, images):
+		outputs = []
+		# SCRFD swaps channels itself, so it takes the BGR frames as-is
+		for img, (dets, kpss) in zip(images, self._forward(images)):
+			h, w = img.shape[:2]
 			boxes = []
-			for det in dets:
-				if isinstance(det, (list, tuple)) and len(det) >= 4:
-					x1, y1, x2, y2 = map(int, det[:4])
-				elif hasattr(det, 'bbox'):
-					x1, y1, x2, y2 = map(int, det.bbox)
-				else:
-					continue
+			landmarks = []
+			for j in range(dets.shape[0]):
+				x1, y1, x2, y2 = map(int, dets[j, :4])
 				boxes.append((max(0, x1), max(0, y1), min(w, x2), min(h, y2)))
+				landmarks.append(kpss[j].astype(np.float32) if kpss is not None else None)
 			if boxes:
 				_LOG.info(f"SCRFD detected {len(boxes)} face(s)")
-				return boxes
-		except Exception as e:
-			_LOG.warning(f"SCRFD detection failed: {e}")
+			outputs.append((boxes, landmarks, [float(s) for s in dets[:, 4]]))
+		return outputs
 
-	# 2) Try YOLOv8 if loaded
-	if _YOLO_AVAILABLE and _YOLO_MODEL is not None:
-		try:
-			results = _YOLO_MODEL(img)
+
+class YoloBackend(DetectorBackend):
+
+	name = 'yolo'
+
+	def __init__(self, model_path: str = os.path.join(_REPO_MODELS, 'yolov8n-face.pt')):
+		super().__init__()
+		self.model_path = model_path
+		self.model = None
+
+	def _load(self) -> bool:
+		if not _YOLO_AVAILABLE or not os.path.exists(self.model_path):
+			return False
+		_LOG.info(f"Loading YOLO model from: {self.model_path}")
+		self.model = YOLO(self.model_path)
+		return True
+
+	def detect_many(self, images):
+		outputs = []
+		for img, r in zip(images, self.model(list(images))):
+			h, w = img.shape[:2]
 			boxes = []
-			for r in results:
-				xyxy = r.boxes.xyxy.cpu().numpy() if hasattr(r, 'boxes') else None
-				if xyxy is None:
-					continue
-				for box in xyxy:
+			scores = []
+			xyxy = r.boxes.xyxy.cpu().numpy() if hasattr(r, 'boxes') else None
+			if xyxy is not None:
+				conf = r.boxes.conf.cpu().numpy() if hasattr(r.boxes, 'conf') else np.ones(len(xyxy))
+				for box, score in zip(xyxy, conf):
 					x1, y1, x2, y2 = map(int, box[:4])
 					boxes.append((max(0, x1), max(0, y1), min(w, x2), min(h, y2)))
+					scores.append(float(score))
 			if boxes:
 				_LOG.info(f"YOLOv8 detected {len(boxes)} face(s)")
-				return boxes
-		except Exception as e:
-			_LOG.warning(f"YOLO detection failed: {e}")
-
-	# 3) Fallback: Haar Cascade (less accurate)
-	gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-	boxes = []
-	if _HAAR_DETECTOR is not None:
-		faces = _HAAR_DETECTOR.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=4, minSize=(40, 40))
-		for (x, y, bw, bh) in faces:
-			boxes.append((int(x), int(y), int(x + bw), int(y + bh)))
-		if boxes:
-			_LOG.info(f"Haar Cascade detected {len(boxes)} face(s)")
-		else:
-			_LOG.warning("Haar Cascade did not detect any faces.")
+			outputs.append((boxes, [None] * len(boxes), scores))
+		return outputs
+
+
+class YunetBackend(DetectorBackend):
+	"""OpenCV YuNet (`cv2.FaceDetectorYN`): a small CPU detector with 5-point
+	landmarks that needs nothing beyond opencv-python.
+
+	Boxes and landmarks come back in the same format as SCRFD. By default each
+	image is detected at its own resolution; `input_size=(w, h)` (per camera
+	or DETECTION.YUNET.INPUT_SIZE) first downscales it to fit that size.
+
+	The model file is not part of the repository; download
+	face_detection_yunet_2023mar.onnx from the opencv_zoo repository
+	(models/face_detection_yunet) into models/ (see SCRFD_IMPLEMENTATION.md).
+	"""
+
+	name = 'yunet'
+
+	def __init__(self, model_path: str = os.path.join(_REPO_MODELS, 'face_detection_yunet_2023mar.onnx'),
+				 score_threshold: float = 0.6, nms_threshold: float = 0.3, top_k: int = 5000,
+				 input_size: Optional[Tuple[int, int]] = None):
+		super().__init__()
+		self.model_path = model_path
+		self.score_threshold = score_threshold
+		self.nms_threshold = nms_threshold
+		self.top_k = top_k
+		self.default_input_size = input_size
+		self.detector = None
+		self._detector_lock = threading.Lock()
+
+	@property
+	def input_size(self):
+		return tuple(self.default_input_size) if self.default_input_size else _SCRFD_INPUT_SIZE
+
+	def _load(self) -> bool:
+		if not hasattr(cv2, 'FaceDetectorYN') or not os.path.exists(self.model_path):
+			return False
+		_LOG.info(f"Loading YuNet from: {self.model_path}")
+		self.detector = cv2.FaceDetectorYN.create(self.model_path, "", (320, 320), self.score_threshold,
+												  self.nms_threshold, self.top_k)
+		return True
+
+	def detect_many(self, images, input_size: Optional[Tuple[int, int]] = None):
+		input_size = input_size or self.default_input_size
+		outputs = []
+		for img in images:
+			h, w = img.shape[:2]
+			scale = 1.0
+			if input_size:
+				scale = min(1.0, float(input_size[0]) / w, float(input_size[1]) / h)
+			det_img = img if scale == 1.0 else cv2.resize(img, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))))
+			with self._detector_lock:
+				self.detector.setInputSize((det_img.shape[1], det_img.shape[0]))
+				_, faces = self.detector.detect(det_img)
+
+			boxes = []
+			landmarks = []
+			scores = []
+			# Rows of [x, y, w, h, 5 x (x, y) landmarks, score]; landmark order matches SCRFD
+			for face in (faces if faces is not None else []):
+				x1, y1, bw, bh = face[:4] / scale
+				boxes.append((max(0, int(x1)), max(0, int(y1)), min(w, int(x1 + bw)), min(h, int(y1 + bh))))
+				landmarks.append((face[4:14].reshape(5, 2) / scale).astype(np.float32))
+				scores.append(float(face[14]))
+			if boxes:
+				_LOG.info(f"YuNet detected {len(boxes)} face(s)")
+			outputs.append((boxes, landmarks, scores))
+		return outputs
+
+
+class HaarBackend(DetectorBackend):
+
+	name = 'haar'
+
+	def __init__(self):
+		super().__init__()
+		self.detector = None
+
+	def _load(self) -> bool:
+		haar_path = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+		if not os.path.exists(haar_path):
+			return False
+		self.detector = cv2.CascadeClassifier(haar_path)
+		return not self.detector.empty()
+
+	def detect_many(self, images):
+		outputs = []
+		for img in images:
+			gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+			faces = self.detector.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=4, minSize=(40, 40))
+			boxes = [(int(x), int(y), int(x + bw), int(y + bh)) for (x, y, bw, bh) in faces]
+			if boxes:
+				_LOG.info(f"Haar Cascade detected {len(boxes)} face(s)")
+			outputs.append((boxes, [None] * len(boxes), [1.0] * len(boxes)))
+		return outputs
+
+
+class DnnBackend(DetectorBackend):
+	"""OpenCV's res10 SSD (Caffe) face detector.
+
+	The network is parsed once and reused; all images of a call go through a
+	single `blobFromImages` forward pass. cv2.dnn nets are not thread-safe, so
+	forward passes are serialized.
+	"""
+
+	name = 'dnn'
+	input_size = (300, 300)
+	mean = (104.0, 177.0, 123.0)
+
+	def __init__(self, confidence: float = 0.5, proto: Optional[str] = None, weights: Optional[str] = None):
+		super().__init__()
+		self.confidence = confidence
+		self.proto = proto
+		self.weights = weights
+		self.net = None
+		self._net_lock = threading.Lock()
+
+	def _find(self, configured: Optional[str], filename: str) -> Optional[str]:
+		candidates = [configured] if configured else [os.path.join(_REPO_MODELS, filename),
+													   os.path.join(cv2.data.haarcascades, '..', filename)]
+		return next((path for path in candidates if path and os.path.exists(path)), None)
+
+	def _load(self) -> bool:
+		proto = self._find(self.proto, 'deploy.prototxt')
+		weights = self._find(self.weights, 'res10_300x300_ssd_iter_140000.caffemodel')
+		if proto is None or weights is None:
+			return False
+		_LOG.info(f"Loading OpenCV DNN face detector from: {weights}")
+		self.net = cv2.dnn.readNetFromCaffe(proto, weights)
+		return True
+
+	def release(self):
+		"""Drop the cached network; the next call loads it again."""
+		with self._load_lock:
+			self.net = None
+			self._loaded = None
+
+	def detect_many(self, images):
+		w, h = self.input_size
+		blob = cv2.dnn.blobFromImages([cv2.resize(img, (w, h)) for img in images], 1.0, (w, h), self.mean)
+		with self._net_lock:
+			self.net.setInput(blob)
+			detections = self.net.forward()
+
+		# (1, 1, K, 7) rows of [image_id, label, confidence, x1, y1, x2, y2] for the whole batch
+		detections = detections.reshape(-1, 7)
+		detections = detections[detections[:, 2] > self.confidence]
+		outputs = []
+		for i, img in enumerate(images):
+			ih, iw = img.shape[:2]
+			rows = detections[detections[:, 0] == i]
+			rects = (rows[:, 3:7] * np.array([iw, ih, iw, ih], dtype=np.float32)).astype(int)
+			boxes = [(max(0, int(x1)), max(0, int(y1)), min(iw, int(x2)), min(ih, int(y2))) for x1, y1, x2, y2 in rects]
+			if boxes:
+				_LOG.info(f"DNN face detector found {len(boxes)} face(s)")
+			outputs.append((boxes, [None] * len(boxes), [float(c) for c in rows[:, 2]]))
+		return outputs
+
+
+# ---------------- Backend registry ----------------
+_BACKENDS: Dict[str, DetectorBackend] = {}
+_AUTO_ORDER: List[str] = []
+_PRIMARY = 'auto'
+_FALLBACKS: Optional[List[str]] = None   # None: the rest of the auto order
+_STATS: Dict[str, Dict[str, float]] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def register_backend(backend: DetectorBackend, auto: bool = True):
+	"""Add a backend to the registry; `auto` also makes it a candidate for BACKEND: auto."""
+	_BACKENDS[backend.name] = backend
+	if auto and backend.name not in _AUTO_ORDER:
+		_AUTO_ORDER.append(backend.name)
+	with _STATS_LOCK:
+		_STATS.setdefault(backend.name, {'calls': 0, 'images': 0, 'faces': 0, 'errors': 0, 'seconds': 0.0})
+
+
+def get_backend(name: str) -> Optional[DetectorBackend]:
+	return _BACKENDS.get(str(name).lower())
+
+
+register_backend(ScrfdBackend())
+register_backend(YoloBackend())
+register_backend(YunetBackend())
+register_backend(HaarBackend())
+register_backend(DnnBackend())
+
+
+def configure_detection(config: Optional[dict] = None, device: str = 'cpu'):
+	"""Apply the DETECTION section of config.yaml: BACKEND (a registered name
+	or 'auto'), FALLBACK (backends to try, in order, when the primary raises)
+	SCRFD_MODEL / YOLO_MODEL paths, the YUNET section (MODEL,
+	SCORE_THRESHOLD, NMS_THRESHOLD, TOP_K, INPUT_SIZE) and the DNN section
+	(CONFIDENCE, PROTOTXT, CAFFEMODEL) of the OpenCV backends."""
+	global _PRIMARY, _FALLBACKS
+	config = config or {}
+	_PRIMARY = str(config.get('BACKEND', 'auto') or 'auto').lower()
+	fallback = config.get('FALLBACK')
+	_FALLBACKS = None if fallback is None else [str(name).lower() for name in fallback]
+	scrfd = _BACKENDS['scrfd']
+	scrfd.device = device
+	if config.get('SCRFD_MODEL') and scrfd._loaded is None:
+		scrfd.model_path = _repo_path(config['SCRFD_MODEL'])
+	yolo = _BACKENDS['yolo']
+	if config.get('YOLO_MODEL') and yolo._loaded is None:
+		yolo.model_path = _repo_path(config['YOLO_MODEL'])
+	yunet_cfg = config.get('YUNET', {}) or {}
+	yunet = _BACKENDS['yunet']
+	if yunet._loaded is None:
+		yunet.model_path = _repo_path(yunet_cfg['MODEL']) if yunet_cfg.get('MODEL') else yunet.model_path
+		yunet.score_threshold = float(yunet_cfg.get('SCORE_THRESHOLD', yunet.score_threshold))
+		yunet.nms_threshold = float(yunet_cfg.get('NMS_THRESHOLD', yunet.nms_threshold))
+		yunet.top_k = int(yunet_cfg.get('TOP_K', yunet.top_k))
+	if yunet_cfg.get('INPUT_SIZE'):
+		yunet.default_input_size = tuple(int(v) for v in yunet_cfg['INPUT_SIZE'])
+	dnn_cfg = config.get('DNN', {}) or {}
+	dnn = _BACKENDS['dnn']
+	dnn.confidence = float(dnn_cfg.get('CONFIDENCE', dnn.confidence))
+	if (dnn_cfg.get('PROTOTXT') or dnn_cfg.get('CAFFEMODEL')) and dnn._loaded is None:
+		dnn.proto = _repo_path(dnn_cfg['PROTOTXT']) if dnn_cfg.get('PROTOTXT') else dnn.proto
+		dnn.weights = _repo_path(dnn_cfg['CAFFEMODEL']) if dnn_cfg.get('CAFFEMODEL') else dnn.weights
+	unknown = [name for name in [_PRIMARY] + (_FALLBACKS or []) if name != 'auto' and name not in _BACKENDS]
+	if unknown:
+		_LOG.warning(f"Unknown detector backend(s) in config: {unknown}")
+
+
+def use_scrfd_model(model) -> bool:
+	"""Use an already prepared SCRFD model (e.g. the one loaded by
+	FaceAnalysis) when no standalone SCRFD model file could be loaded.
+
+	Returns True if the model was installed.
+	"""
+	installed = _BACKENDS['scrfd'].use_model(model)
+	if installed:
+		_LOG.info("Using shared SCRFD model for detection")
+	return installed
+
+
+def _backend_chain(backend: Optional[str] = None) -> Iterator[DetectorBackend]:
+	"""Yield the primary backend followed by its fallbacks, skipping unusable ones.
+
+	Backends are loaded as the caller reaches them, so fallbacks are never
+	initialized while the primary works.
+	"""
+	primary = str(backend or _PRIMARY).lower()
+	if primary == 'auto':
+		# Load in auto order only until one is usable
+		primary = next((name for name in _AUTO_ORDER if _BACKENDS[name].load()), None)
+	fallbacks = _FALLBACKS if _FALLBACKS is not None else _AUTO_ORDER
+	tried = set()
+	for name in [primary] + list(fallbacks):
+		candidate = _BACKENDS.get(name) if name else None
+		if candidate is None or name in tried:
+			continue
+		tried.add(name)
+		if candidate.load():
+			yield candidate
+
+
+def get_backend_stats() -> Dict[str, Dict[str, float]]:
+	"""Per-backend calls, images, faces, errors, total seconds and mean ms per image."""
+	with _STATS_LOCK:
+		stats = {name: dict(values) for name, values in _STATS.items()}
+	for name, values in stats.items():
+		values['loaded'] = bool(_BACKENDS[name]._loaded)
+		values['avg_ms_per_image'] = values['seconds'] * 1000.0 / values['images'] if values['images'] else 0.0
+	return stats
+
+
+def _letterbox(img: np.ndarray, input_size: Tuple[int, int]):
+	"""Resize keeping aspect ratio into a zero-padded input_size canvas (as SCRFD.detect does)."""
+	im_ratio = float(img.shape[0]) / img.shape[1]
+	model_ratio = float(input_size[1]) / input_size[0]
+	if im_ratio > model_ratio:
+		new_height = input_size[1]
+		new_width = int(new_height / im_ratio)
 	else:
+		new_width = input_size[0]
+		new_height = int(new_width * im_ratio)
+	det_scale = float(new_height) / img.shape[0]
+	det_img = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+	det_img[:new_height, :new_width, :] = cv2.resize(img, (new_width, new_height))
+	return det_img, det_scale
+
+
+def _scrfd_anchor_centers(model, height: int, width: int, stride: int) -> np.ndarray:
+	key = (height, width, stride)
+	if key in model.center_cache:
+		return model.center_cache[key]
+	anchor_centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+	anchor_centers = (anchor_centers * stride).reshape((-1, 2))
+	if model._num_anchors > 1:
+		anchor_centers = np.stack([anchor_centers] * model._num_anchors, axis=1).reshape((-1, 2))
+	if len(model.center_cache) < 100:
+		model.center_cache[key] = anchor_centers
+	return anchor_centers
+
+
+def _scrfd_decode(model, net_outs, b: int, input_height: int, input_width: int, det_scale: float):
+	"""Decode image `b` of a batched SCRFD forward pass into (dets, kpss)."""
+	fmc = model.fmc
+	scores_list, bboxes_list, kpss_list = [], [], []
+	for idx, stride in enumerate(model._feat_stride_fpn):
+		scores = net_outs[idx][b]
+		bbox_preds = net_outs[idx + fmc][b] * stride
+		anchor_centers = _scrfd_anchor_centers(model, input_height // stride, input_width // stride, stride)
+		pos_inds = np.where(scores >= model.det_thresh)[0]
+		scores_list.append(scores[pos_inds])
+		bboxes_list.append(distance2bbox(anchor_centers, bbox_preds)[pos_inds])
+		if model.use_kps:
+			kps_preds = net_outs[idx + fmc * 2][b] * stride
+			kpss = distance2kps(anchor_centers, kps_preds)
+			kpss_list.append(kpss.reshape((kpss.shape[0], -1, 2))[pos_inds])
+
+	scores = np.vstack(scores_list)
+	order = scores.ravel().argsort()[::-1]
+	bboxes = np.vstack(bboxes_list) / det_scale
+	pre_det = np.hstack((bboxes, scores)).astype(np.float32, copy=False)[order, :]
+	keep = model.nms(pre_det)
+	det = pre_det[keep, :]
+	kpss = None
+	if model.use_kps:
+		kpss = (np.vstack(kpss_list) / det_scale)[order, :, :][keep, :, :]
+	return det, kpss
+
+def _nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.4) -> np.ndarray:
+	"""Greedy non-maximum suppression; returns the indices of kept boxes.
+
+	The pairwise IoU matrix is computed once; the greedy sweep then only
+	flips boolean masks, which keeps merging hundreds of tile boxes cheap.
+	"""
+	boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+	scores = np.asarray(scores, dtype=np.float32).ravel()
+	order = scores.argsort()[::-1]
+	b = boxes[order]
+	areas = np.maximum(b[:, 2] - b[:, 0], 0) * np.maximum(b[:, 3] - b[:, 1], 0)
+	iw = np.minimum(b[:, None, 2], b[None, :, 2]) - np.maximum(b[:, None, 0], b[None, :, 0])
+	ih = np.minimum(b[:, None, 3], b[None, :, 3]) - np.maximum(b[:, None, 1], b[None, :, 1])
+	inter = np.maximum(iw, 0) * np.maximum(ih, 0)
+	overlaps = inter / np.maximum(areas[:, None] + areas[None, :] - inter, 1e-6) > iou_threshold
+	suppressed = np.zeros(len(order), dtype=bool)
+	keep = []
+	for i in range(len(order)):
+		if suppressed[i]:
+			continue
+		keep.append(order[i])
+		suppressed |= overlaps[i]
+	return np.array(keep, dtype=np.intp)
+
+
+def _roi_regions(rois, w: int, h: int):
+	"""Turn ROIs (rectangles [x1, y1, x2, y2] or polygons [[x, y], ...], in
+	pixels or as 0-1 fractions of the frame) into (x1, y1, x2, y2, polygon)
+	crop regions clipped to the frame. `polygon` is None for rectangles."""
+	regions = []
+	for roi in rois:
+		pts = np.asarray(roi, dtype=np.float32)
+		if pts.size and pts.max() <= 1.0:
+			pts = pts * (np.array([w, h, w, h], dtype=np.float32) if pts.ndim == 1 else np.array([w, h], dtype=np.float32))
+		if pts.ndim == 1 and pts.size == 4:
+			polygon = None
+			x1, y1, x2, y2 = pts
+		elif pts.ndim == 2 and pts.shape[1] == 2 and pts.shape[0] >= 3:
+			polygon = pts
+			(x1, y1), (x2, y2) = pts.min(axis=0), pts.max(axis=0)
+		else:
+			_LOG.warning(f"Ignoring invalid ROI: {roi}")
+			continue
+		x1, y1 = max(0, int(x1)), max(0, int(y1))
+		x2, y2 = min(w, int(np.ceil(x2))), min(h, int(np.ceil(y2)))
+		if x2 - x1 < 8 or y2 - y1 < 8:
+			continue
+		regions.append((x1, y1, x2, y2, polygon))
+	return regions
+
+
+def _tile_layout(tiles, native_size: Tuple[int, int] = _SCRFD_INPUT_SIZE):
+	"""Normalize a tile layout into (tile_w, tile_h, overlap_px, full_frame).
+
+	`tiles` is True (`native_size` tiles), a tile size (int or (w, h)), or a
+	dict with optional `size`, `overlap` (0-1 fraction of the tile or pixels)
+	and `full_frame` (also run one downscaled pass over the whole region, so
+	faces larger than the overlap are still found). Returns None if falsy.
+	"""
+	if not tiles:
+		return None
+	layout = {'size': None, 'overlap': 0.25, 'full_frame': True}
+	if isinstance(tiles, dict):
+		layout.update({str(key).lower(): value for key, value in tiles.items()})
+	elif not isinstance(tiles, bool):
+		layout['size'] = tiles
+	size = layout['size']
+	if not size:
+		size = native_size
+	if isinstance(size, (int, float)):
+		size = (size, size)
+	tile_w, tile_h = int(size[0]), int(size[1])
+	overlap = float(layout['overlap'] or 0)
+	if overlap < 1:
+		overlap *= min(tile_w, tile_h)
+	overlap = int(min(overlap, min(tile_w, tile_h) - 1))
+	return tile_w, tile_h, max(0, overlap), bool(layout['full_frame'])
+
+
+def _tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+	"""Evenly spaced tile offsets covering [0, length) with at least `overlap` px shared."""
+	if length <= tile:
+		return [0]
+	stride = max(1, tile - overlap)
+	count = int(np.ceil((length - tile) / float(stride))) + 1
+	return np.linspace(0, length - tile, count).round().astype(int).tolist()
+
+
+_NO_INNER_EDGES = (False, False, False, False)
+
+
+def _tile_crops(region, layout):
+	"""Split one (x1, y1, x2, y2, polygon) region into detector-native tiles.
+
+	Each crop carries (left, top, right, bottom) flags marking the edges that
+	lie inside the region, where a face may be cut off by the tile border.
+	"""
+	x1, y1, x2, y2, polygon = region
+	if layout is None:
+		return [(x1, y1, x2, y2, polygon, _NO_INNER_EDGES)]
+	tile_w, tile_h, overlap, full_frame = layout
+	xs = _tile_starts(x2 - x1, tile_w, overlap)
+	ys = _tile_starts(y2 - y1, tile_h, overlap)
+	if len(xs) == 1 and len(ys) == 1:
+		return [(x1, y1, x2, y2, polygon, _NO_INNER_EDGES)]
+
+	crops = []
+	for ty in ys:
+		for tx in xs:
+			cx1, cy1 = x1 + tx, y1 + ty
+			cx2, cy2 = min(x2, cx1 + tile_w), min(y2, cy1 + tile_h)
+			crops.append((cx1, cy1, cx2, cy2, polygon, (cx1 > x1, cy1 > y1, cx2 < x2, cy2 < y2)))
+	if full_frame:
+		crops.append((x1, y1, x2, y2, polygon, _NO_INNER_EDGES))
+	return crops
+
+def _detect_images(images: List[np.ndarray], backend: Optional[str] = None,
+				   input_size: Optional[Tuple[int, int]] = None):
+	"""Run one detector backend on several images at once.
+
+	Returns one (boxes, landmarks, scores) triple per image. The next backend
+	in the chain is only tried if the current one raises.
+	"""
+	tried = False
+	for detector in _backend_chain(backend):
+		tried = True
+		started = time.perf_counter()
 		try:
-			proto = os.path.join(cv2.data.haarcascades, '..', 'deploy.prototxt')
-			model = os.path.join(cv2.data.haarcascades, '..', 'res10_300x300_ssd_iter_140000.caffemodel')
-			if os.path.exists(proto) and os.path.exists(model):
-				net = cv2.dnn.readNetFromCaffe(proto, model)
-				blob = cv2.dnn.blobFromImage(cv2.resize(img, (300, 300)), 1.0,
-											 (300, 300), (104.0, 177.0, 123.0))
-				net.setInput(blob)
-				detections = net.forward()
-				for i in range(0, detections.shape[2]):
-					confidence = detections[0, 0, i, 2]
-					if confidence > 0.5:
-						box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-						(startX, startY, endX, endY) = box.astype("int")
-						boxes.append((int(startX), int(startY), int(endX), int(endY)))
-				if boxes:
-					_LOG.info(f"DNN face detector found {len(boxes)} face(s)")
-				else:
-					_LOG.warning("DNN face detector did not detect any faces.")
+			if input_size and isinstance(detector, YunetBackend):
+				outputs = detector.detect_many(images, input_size=input_size)
+			else:
+				outputs = detector.detect_many(images)
 		except Exception as e:
-			_LOG.error(f"OpenCV DNN face detector failed: {e}")
+			with _STATS_LOCK:
+				_STATS[detector.name]['errors'] += 1
+			_LOG.warning(f"{detector.name} detection failed: {e}")
+			continue
+		elapsed = time.perf_counter() - started
+		with _STATS_LOCK:
+			stats = _STATS[detector.name]
+			stats['calls'] += 1
+			stats['images'] += len(images)
+			stats['faces'] += sum(len(boxes) for boxes, _, _ in outputs)
+			stats['seconds'] += elapsed
+		return outputs
+
+	if not tried:
+		_LOG.error("No face detector backend is available. Please check model files.")
+	return [([], [], []) for _ in images]
+
+
+def detect_faces_batch(images: List[np.ndarray], backend: Optional[str] = None, input_size=None):
+	"""Detect faces in several whole images with one backend call.
+
+	`backend` and `input_size` are as for `detect_faces_with_landmarks`.
+	Returns one (boxes, landmarks, scores) triple per image, in input order.
+	"""
+	if not images:
+		return []
+	return _detect_images(list(images), backend, input_size)
+
 
-	if not boxes:
-		_LOG.error("No faces detected. Please check model files and input image quality.")
+def detect_faces(image: Union[np.ndarray, str], device: str = 'cpu', rois=None, tiles=None,
+				 backend: Optional[str] = None, input_size=None) -> List[Tuple[int, int, int, int]]:
+	"""Detect faces in an image and return bounding boxes.
+
+	Returns a list of (x1, y1, x2, y2). `device` is deprecated and ignored;
+	see `configure_detection`.
+	"""
+	boxes, _ = detect_faces_with_landmarks(image, device=device, rois=rois, tiles=tiles, backend=backend,
+										   input_size=input_size)
 	return boxes
 
 
+def detect_faces_with_landmarks(image: Union[np.ndarray, str], device: str = 'cpu', rois=None, tiles=None,
+								backend: Optional[str] = None, input_size=None) -> Tuple[List[Tuple[int, int, int, int]], List[Optional[np.ndarray]]]:
+	"""Detect faces and return (boxes, landmarks).
+
+	`boxes` is a list of (x1, y1, x2, y2). `landmarks` has one entry per box:
+	a (5, 2) float32 array of keypoints for SCRFD and YuNet, or None for
+	backends that do not predict landmarks (YOLO, Haar, DNN).
+
+	`device` is deprecated and ignored: the shared backends take their device
+	from `configure_detection`.
+
+	`backend` overrides the configured primary backend for this call and
+	`input_size` (w, h) the detection resolution of backends that take any
+	input size (YuNet).
+
+	If `rois` is given (rectangles [x1, y1, x2, y2] and/or polygons
+	[[x, y], ...]), only those regions are searched: each region is cropped,
+	all crops are detected together and the boxes are mapped back to frame
+	coordinates. Faces whose center lies outside a polygon are dropped.
+
+	If `tiles` is given (see `_tile_layout`), the frame (or each ROI) is split
+	into overlapping tiles at the detector's native input size so small faces
+	are not lost to downscaling. All tiles run as one batch; boxes cut off by
+	an inner tile edge are discarded (the overlapping tile sees them whole)
+	and the rest are merged with NMS.
+	"""
+	# Load image if a path was provided
+	if isinstance(image, str):
+		img = cv2.imread(image)
+		if img is None:
+			_LOG.error(f"Could not load image from path: {image}")
+			return [], []
+	else:
+		img = image
+
+	if img is None or not hasattr(img, 'shape'):
+		_LOG.error("Input image is invalid or not a numpy array.")
+		return [], []
+
+	h, w = img.shape[:2]
+	layout = None
+	if tiles:
+		primary = next(_backend_chain(backend), None)
+		layout = _tile_layout(tiles, primary.input_size if primary is not None else _SCRFD_INPUT_SIZE)
+	if not rois and (layout is None or (w <= layout[0] and h <= layout[1])):
+		boxes, landmarks, _ = _detect_images([img], backend, input_size)[0]
+		return boxes, landmarks
+
+	regions = _roi_regions(rois, w, h) if rois else [(0, 0, w, h, None)]
+	crops = [crop for region in regions for crop in _tile_crops(region, layout)]
+	if not crops:
+		return [], []
+
+	all_boxes, all_landmarks, all_scores = [], [], []
+	images = [img[y1:y2, x1:x2] for x1, y1, x2, y2, _, _ in crops]
+	for (x1, y1, x2, y2, polygon, inner), (boxes, landmarks, scores) in zip(crops, _detect_images(images, backend, input_size)):
+		for box, kps, score in zip(boxes, landmarks, scores):
+			# Cut off by a tile border inside the frame: a neighbouring tile has it whole
+			if ((inner[0] and box[0] <= 1) or (inner[1] and box[1] <= 1) or
+					(inner[2] and box[2] >= x2 - x1 - 1) or (inner[3] and box[3] >= y2 - y1 - 1)):
+				continue
+			fx1, fy1, fx2, fy2 = box[0] + x1, box[1] + y1, box[2] + x1, box[3] + y1
+			if polygon is not None:
+				center = ((fx1 + fx2) / 2.0, (fy1 + fy2) / 2.0)
+				if cv2.pointPolygonTest(polygon, center, False) < 0:
+					continue
+			all_boxes.append((fx1, fy1, fx2, fy2))
+			all_landmarks.append(kps + np.array([x1, y1], dtype=np.float32) if kps is not None else None)
+			all_scores.append(score)
+
+	# Overlapping ROIs and tiles can see the same face twice
+	if len(crops) > 1 and len(all_boxes) > 1:
+		keep = _nms(np.array(all_boxes), np.array(all_scores))
+		all_boxes = [all_boxes[i] for i in keep]
+		all_landmarks = [all_landmarks[i] for i in keep]
+	return all_boxes, all_landmarks
+
+
 if __name__ == '__main__':
 	# Quick local test: load an example image path if provided as argv
 	import sys
@@ -0,0 +1,181 @@
+"""Persistent per-image embedding cache for training.
+
+Vectors live in one append-only float32 file (`vectors.f32`, read through a
+memmap) and a small SQLite table maps each dataset image to its row:
+
+    (rel_path, model) -> size, mtime_ns, sha1, row
+
+`row` is -1 for images in which no face was found, so those are not
+re-processed either. A lookup whose size and mtime match is a hit without
+reading the file; otherwise the content hash decides (a touched but
+unchanged image is still a hit). Entries are only valid for the model key
+they were computed with, so switching models re-embeds everything; each
+model key gets its own subdirectory. A cache opened with the model's output
+`dim` drops vectors of any other size, and a lookup whose vector does not
+have that size is a miss.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_NO_FACE = -1
+
+
+def file_sha1(path: str, chunk_size: int = 1 << 20) -> str:
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class EmbeddingCache:
+
+    def __init__(self, cache_dir: str, model_key: str, dim: Optional[int] = None):
+        self.cache_dir = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_key))
+        self.model_key = model_key
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.cache_dir, 'vectors.f32')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'index.db'), check_same_thread=False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+                                rel_path TEXT NOT NULL,
+                                model TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                mtime_ns INTEGER NOT NULL,
+                                sha1 TEXT NOT NULL,
+                                row INTEGER NOT NULL,
+                                PRIMARY KEY (rel_path, model)
+                            )''')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)''')
+        self._conn.commit()
+        stored = self._conn.execute("SELECT value FROM meta WHERE key='dim'").fetchone()
+        self.dim: Optional[int] = int(stored[0]) if stored else None
+        if dim is not None and self.dim != int(dim):
+            if self.dim is not None:
+                # Written by a model with another output size: nothing in it is usable
+                self._conn.execute("DELETE FROM entries")
+                if os.path.exists(self.vectors_path):
+                    os.remove(self.vectors_path)
+            self.dim = int(dim)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            self._conn.commit()
+        self._vectors: Optional[np.ndarray] = None
+        self._pending: List[np.ndarray] = []
+        self._rows_on_disk = 0
+        self._open_vectors()
+        self.stats = {'hits': 0, 'misses': 0, 'hashed': 0}
+
+    def _open_vectors(self):
+        self._vectors = None
+        self._rows_on_disk = 0
+        if self.dim and os.path.exists(self.vectors_path):
+            rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+            if rows:
+                self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+            self._rows_on_disk = rows
+
+    def _vector(self, row: int) -> Optional[np.ndarray]:
+        if row < self._rows_on_disk:
+            return np.array(self._vectors[row])
+        if row - self._rows_on_disk < len(self._pending):
+            return self._pending[row - self._rows_on_disk]
+        return None
+
+    def lookup(self, path: str, rel_path: str) -> Tuple[bool, Optional[np.ndarray]]:
+        """Return (hit, vector). On a hit `vector` is None if the image has no face."""
+        st = os.stat(path)
+        with self._lock:
+            entry = self._conn.execute("SELECT size, mtime_ns, sha1, row FROM entries WHERE rel_path=? AND model=?",
+                                       (rel_path, self.model_key)).fetchone()
+        if entry is None:
+            self.stats['misses'] += 1
+            return False, None
+        size, mtime_ns, sha1, row = entry
+        if size != st.st_size or mtime_ns != st.st_mtime_ns:
+            self.stats['hashed'] += 1
+            if size != st.st_size or file_sha1(path) != sha1:
+                self.stats['misses'] += 1
+                return False, None
+            # Same content, new mtime: remember it so the next run skips hashing
+            with self._lock:
+                self._conn.execute("UPDATE entries SET mtime_ns=? WHERE rel_path=? AND model=?",
+                                   (st.st_mtime_ns, rel_path, self.model_key))
+        if row == _NO_FACE:
+            self.stats['hits'] += 1
+            return True, None
+        with self._lock:
+            vector = self._vector(row)
+        if vector is None or vector.shape[0] != self.dim:
+            # Row missing or of another model's size: re-embed rather than trust it
+            self.stats['misses'] += 1
+            return False, None
+        self.stats['hits'] += 1
+        return True, vector
+
+    def put(self, path: str, rel_path: str, vector: Optional[np.ndarray]):
+        """Store the embedding (or None for "no face") of one image."""
+        st = os.stat(path)
+        sha1 = file_sha1(path)
+        with self._lock:
+            row = _NO_FACE
+            if vector is not None:
+                vector = np.asarray(vector, dtype=np.float32).ravel()
+                if self.dim is None:
+                    self.dim = int(vector.shape[0])
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                if vector.shape[0] != self.dim:
+                    return  # a different model produced this vector; do not cache it
+                row = self._rows_on_disk + len(self._pending)
+                self._pending.append(vector)
+            self._conn.execute("INSERT OR REPLACE INTO entries (rel_path, model, size, mtime_ns, sha1, row) "
+                               "VALUES (?, ?, ?, ?, ?, ?)",
+                               (rel_path, self.model_key, st.st_size, st.st_mtime_ns, sha1, row))
+
+    def forget(self, rel_prefix: str):
+        """Drop the entries of every image under `rel_prefix` (e.g. a deleted person)."""
+        prefix = rel_prefix.rstrip('/') + '/'
+        # A plain prefix comparison: LIKE would treat '_' in folder names (john_doe) as a wildcard
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE rel_path = ? OR substr(rel_path, 1, ?) = ?",
+                               (rel_prefix.rstrip('/'), len(prefix), prefix))
+
+    def flush(self):
+        """Append pending vectors to the vector file and commit the table."""
+        with self._lock:
+            if self._pending:
+                with open(self.vectors_path, 'ab') as f:
+                    np.stack(self._pending).astype(np.float32).tofile(f)
+                self._pending = []
+            self._conn.commit()
+            self._open_vectors()
+        self.compact()
+
+    def compact(self, max_garbage: float = 0.5):
+        """Rewrite the vector file without rows no entry points to any more."""
+        with self._lock:
+            if not self._rows_on_disk or self._pending:
+                return
+            live = [row for (row,) in self._conn.execute("SELECT row FROM entries WHERE row >= 0 ORDER BY row")]
+            if len(live) >= (1.0 - max_garbage) * self._rows_on_disk:
+                return
+            remap: Dict[int, int] = {old: new for new, old in enumerate(live)}
+            vectors = np.array(self._vectors[live]) if live else np.zeros((0, self.dim), dtype=np.float32)
+            self._vectors = None
+            tmp_path = self.vectors_path + '.tmp'
+            vectors.tofile(tmp_path)
+            os.replace(tmp_path, self.vectors_path)
+            self._conn.executemany("UPDATE entries SET row=? WHERE row=?",
+                                   [(new, old) for old, new in remap.items() if old != new])
+            self._conn.commit()
+            self._open_vectors()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
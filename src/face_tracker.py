@@ -0,0 +1,268 @@
+"""SORT-style face tracking so recognition runs once per track.
+
+`FaceTracker` keeps one constant-velocity Kalman filter per face (state
+[cx, cy, area, aspect, vcx, vcy, varea]) with all filters stacked into NumPy
+arrays, and associates detections to tracks by IoU.
+
+`TrackedRecognizer` sits between detection and embedding for one camera:
+  - full detection only runs every `detect_every` frames; frames in between
+    report the Kalman-predicted boxes of live tracks;
+  - a track is only re-embedded while its identity is unconfirmed, or every
+    `refresh_frames` frames once confirmed; a track that keeps coming back
+    "Unknown" (a stranger, a bad angle) is retried at exponentially growing
+    intervals, capped at `refresh_frames`;
+  - every result carries a `track_id`, unique across cameras in the process.
+
+With an InferenceScheduler, both the detection and the embedding step go
+through it, so they are batched with the other cameras' work.
+"""
+
+import itertools
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+_TRACK_IDS = itertools.count(1)
+
+# Constant-velocity model, as in SORT
+_F = np.eye(7, dtype=np.float64)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+_H = np.eye(4, 7, dtype=np.float64)
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 10000.0, 10000.0, 10000.0])
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) arrays of (x1, y1, x2, y2)."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def _boxes_to_z(boxes: np.ndarray) -> np.ndarray:
+    w = boxes[:, 2] - boxes[:, 0]
+    h = np.maximum(boxes[:, 3] - boxes[:, 1], 1e-6)
+    return np.stack([boxes[:, 0] + w / 2.0, boxes[:, 1] + h / 2.0, w * h, w / h], axis=1)
+
+
+def _x_to_boxes(x: np.ndarray) -> np.ndarray:
+    area = np.maximum(x[:, 2], 1e-6)
+    w = np.sqrt(area * np.maximum(x[:, 3], 1e-6))
+    h = area / np.maximum(w, 1e-6)
+    return np.stack([x[:, 0] - w / 2.0, x[:, 1] - h / 2.0, x[:, 0] + w / 2.0, x[:, 1] + h / 2.0], axis=1)
+
+
+class Track:
+
+    def __init__(self, track_id: int):
+        self.track_id = track_id
+        self.misses = 0                 # detection rounds without a matching box
+        self.label = "Unknown"
+        self.score = 0.0
+        self.confirmations = 0          # consecutive embeddings agreeing on `label`
+        self.unknown_streak = 0         # consecutive embeddings that matched nobody
+        self.last_embedded: Optional[int] = None
+
+
+class FaceTracker:
+
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 2):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks: List[Track] = []
+        self._x = np.zeros((0, 7), dtype=np.float64)
+        self._P = np.zeros((0, 7, 7), dtype=np.float64)
+
+    def predict(self) -> np.ndarray:
+        """Advance every track by one frame; returns predicted (T, 4) boxes."""
+        if not self.tracks:
+            return np.zeros((0, 4), dtype=np.float64)
+        # Keep the predicted area positive
+        shrinking = (self._x[:, 2] + self._x[:, 6]) <= 0
+        self._x[shrinking, 6] = 0.0
+        self._x = self._x @ _F.T
+        self._P = _F @ self._P @ _F.T + _Q
+        return _x_to_boxes(self._x)
+
+    def boxes(self) -> np.ndarray:
+        return _x_to_boxes(self._x)
+
+    def update(self, detections: np.ndarray) -> List[Tuple[Track, int]]:
+        """Associate (D, 4) detections with tracks.
+
+        Matched tracks get a Kalman update, unmatched detections start new
+        tracks and tracks missing for more than `max_misses` rounds are
+        dropped. Returns (track, detection index) for every detection.
+        """
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 4)
+        track_for_det: Dict[int, int] = {}
+
+        if self.tracks and len(detections):
+            ious = iou_matrix(detections, self.boxes())
+            det_idx, trk_idx = np.nonzero(ious >= self.iou_threshold)
+            order = np.argsort(-ious[det_idx, trk_idx], kind='stable')
+            used_tracks = set()
+            # Greedy assignment, highest IoU first
+            for d, t in zip(det_idx[order], trk_idx[order]):
+                if d in track_for_det or t in used_tracks:
+                    continue
+                track_for_det[int(d)] = int(t)
+                used_tracks.add(int(t))
+
+        if track_for_det:
+            dets = np.fromiter(track_for_det.keys(), dtype=np.intp)
+            trks = np.fromiter(track_for_det.values(), dtype=np.intp)
+            self._kalman_update(trks, _boxes_to_z(detections[dets]))
+
+        matched_tracks = set(track_for_det.values())
+        for t, track in enumerate(self.tracks):
+            track.misses = 0 if t in matched_tracks else track.misses + 1
+
+        pairs = [(self.tracks[t], d) for d, t in track_for_det.items()]
+
+        new_dets = [d for d in range(len(detections)) if d not in track_for_det]
+        if new_dets:
+            z = _boxes_to_z(detections[new_dets])
+            x = np.zeros((len(new_dets), 7), dtype=np.float64)
+            x[:, :4] = z
+            self._x = np.concatenate([self._x, x], axis=0)
+            self._P = np.concatenate([self._P, np.repeat(_P0[None], len(new_dets), axis=0)], axis=0)
+            for d in new_dets:
+                track = Track(next(_TRACK_IDS))
+                self.tracks.append(track)
+                pairs.append((track, d))
+
+        keep = np.array([track.misses <= self.max_misses for track in self.tracks], dtype=bool)
+        if not keep.all():
+            self.tracks = [track for track, k in zip(self.tracks, keep) if k]
+            self._x = self._x[keep]
+            self._P = self._P[keep]
+
+        pairs.sort(key=lambda pair: pair[1])
+        return pairs
+
+    def _kalman_update(self, idx: np.ndarray, z: np.ndarray):
+        x = self._x[idx]
+        P = self._P[idx]
+        y = z - x @ _H.T
+        S = _H @ P @ _H.T + _R
+        K = P @ _H.T @ np.linalg.inv(S)
+        self._x[idx] = x + np.einsum('nij,nj->ni', K, y)
+        self._P[idx] = (np.eye(7) - K @ _H) @ P
+
+
+class TrackedRecognizer:
+
+    def __init__(self, recognizer, scheduler=None, camera: Optional[str] = None,
+                 detect_every: int = 5, refresh_frames: int = 150, confirm_hits: int = 2,
+                 iou_threshold: float = 0.3, max_misses: int = 2):
+        self.recognizer = recognizer
+        self.scheduler = scheduler
+        self.camera = camera
+        self.detect_every = max(1, int(detect_every))
+        self.refresh_frames = max(1, int(refresh_frames))
+        self.confirm_hits = max(1, int(confirm_hits))
+        self.tracker = FaceTracker(iou_threshold=iou_threshold, max_misses=max_misses)
+        self.frame_index = 0
+        self.stats = {'frames': 0, 'detections': 0, 'faces': 0, 'embeddings': 0}
+
+    def _detect(self, frame: np.ndarray):
+        # Through the scheduler the frame is detected in one batch with other cameras' frames
+        if self.scheduler is not None:
+            return self.scheduler.detect(frame, camera=self.camera)
+        return self.recognizer.detect(frame, camera=self.camera)
+
+    def _identify(self, faces):
+        if self.scheduler is not None:
+            return self.scheduler.identify_faces(faces, camera=self.camera)
+        return self.recognizer.identify_faces(faces, [self.camera] * len(faces))
+
+    def _needs_embedding(self, track: Track) -> bool:
+        if track.last_embedded is None:
+            return True
+        since = self.frame_index - track.last_embedded
+        if track.unknown_streak:
+            # Back off: wait 1, 2, 4, ... detection rounds before trying again
+            backoff = self.detect_every * 2 ** (track.unknown_streak - 1)
+            return since >= min(backoff, self.refresh_frames)
+        if track.confirmations < self.confirm_hits:
+            return True
+        return since >= self.refresh_frames
+
+    def active_track_ids(self) -> Set[int]:
+        """Ids of the tracks still alive; anything else will never be reported again."""
+        return {track.track_id for track in self.tracker.tracks}
+
+    def recognize_face(self, frame: np.ndarray):
+        """Same result format as FaceRecognizer.recognize_face, plus 'track_id'."""
+        self.frame_index += 1
+        self.stats['frames'] += 1
+        predicted = self.tracker.predict()
+
+        run_detection = (self.frame_index - 1) % self.detect_every == 0 or not self.tracker.tracks
+        if not run_detection:
+            return [self._result(track, box, frame.shape)
+                    for track, box in zip(self.tracker.tracks, predicted) if track.misses == 0]
+
+        self.stats['detections'] += 1
+        face_boxes, landmarks = self._detect(frame)
+        pairs = self.tracker.update(np.array(face_boxes, dtype=np.float64).reshape(-1, 4))
+        self.stats['faces'] += len(pairs)
+
+        to_embed = [(track, d) for track, d in pairs if self._needs_embedding(track)]
+        if to_embed:
+            faces = []
+            for _, d in to_embed:
+                faces.append((frame, self.recognizer.pad_box(face_boxes[d], frame.shape), landmarks[d]))
+            for (track, _), (label, score) in zip(to_embed, self._identify(faces)):
+                if label != "Unknown" and label == track.label:
+                    track.confirmations += 1
+                else:
+                    track.confirmations = 1 if label != "Unknown" else 0
+                track.unknown_streak = track.unknown_streak + 1 if label == "Unknown" else 0
+                track.label = label
+                track.score = score
+                track.last_embedded = self.frame_index
+            self.stats['embeddings'] += len(to_embed)
+
+        return [self._result(track, face_boxes[d], frame.shape) for track, d in pairs]
+
+    def _result(self, track: Track, box, frame_shape):
+        x1, y1, x2, y2 = self.recognizer.pad_box(tuple(int(round(v)) for v in box), frame_shape)
+        return {
+            'box': (x1, y1, x2 - x1, y2 - y1), # (x, y, w, h) format
+            'label': track.label,
+            'score': track.score,
+            'track_id': track.track_id
+        }
+
+
+def create_tracked_recognizer(recognizer, config, scheduler=None, camera: Optional[str] = None,
+                              detect_every: Optional[int] = None) -> Optional[TrackedRecognizer]:
+    """Build a per-camera TrackedRecognizer from the TRACKING section of config.yaml.
+
+    `detect_every` overrides DETECT_EVERY_N_FRAMES for callers that already
+    throttle the frames they pass in. Returns None when tracking is disabled.
+    """
+    track_cfg = (config or {}).get('TRACKING', {}) or {}
+    if not track_cfg.get('ENABLED', False):
+        return None
+    return TrackedRecognizer(
+        recognizer,
+        scheduler=scheduler,
+        camera=camera,
+        detect_every=detect_every or track_cfg.get('DETECT_EVERY_N_FRAMES', 5),
+        refresh_frames=track_cfg.get('REFRESH_FRAMES', 150),
+        confirm_hits=track_cfg.get('CONFIRM_HITS', 2),
+        iou_threshold=track_cfg.get('IOU_THRESHOLD', 0.3),
+        max_misses=track_cfg.get('MAX_MISSES', 2),
+    )
@@ -0,0 +1,226 @@
+"""Hot-reloadable FAISS gallery for running recognizers.
+
+`GalleryWatcher` holds the current `Gallery` (index + labels + version) and
+polls the gallery version published by `save_faiss_data()`, i.e. the
+CURRENT pointer of the versioned gallery directory. When it changes,
+the new index is loaded on the watcher thread and swapped in with a single
+reference assignment, so camera threads keep matching against the old
+gallery until the new one is fully loaded and never see a half-loaded one.
+
+Readers take one `watcher.current` snapshot per batch and use its index and
+labels together. Search settings (GALLERY.INDEX.NPROBE / EF_SEARCH, or
+`set_search_params()` at runtime) are applied to every gallery it loads.
+"""
+
+import logging
+import os
+import threading
+from typing import Optional, Sequence
+
+import faiss
+import numpy as np
+
+try:
+    from src.utils import load_faiss_data, gallery_version, read_gallery_manifest, GALLERY_VECTORS_FILE
+    from src.gallery_index import set_search_params, rerank_search, unwrap_index, aggregate_identities, multi_settings
+except ImportError:
+    try:
+        from utils import load_faiss_data, gallery_version, read_gallery_manifest, GALLERY_VECTORS_FILE
+        from gallery_index import set_search_params, rerank_search, unwrap_index, aggregate_identities, multi_settings
+    except ImportError:
+        import sys
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+        from utils import load_faiss_data, gallery_version, read_gallery_manifest, GALLERY_VECTORS_FILE
+        from gallery_index import set_search_params, rerank_search, unwrap_index, aggregate_identities, multi_settings
+
+_LOG = logging.getLogger("gallery")
+
+
+class Gallery:
+    """One immutable gallery version.
+
+    `labels[i]` is the name of person id i. In `mean` mode row i of the index
+    is person i; in `multi` mode `row_ids` maps every index row to its person.
+    If the index stores compressed vectors and the build kept the float32
+    originals, searches re-score the top `rerank_k` candidates exactly.
+    `vectors` (when saved) are the float32 index rows, in index order.
+    """
+
+    __slots__ = ('index', 'labels', 'version', 'vectors', 'rerank_k', 'row_ids', 'top_k', 'top_m', '_rows_index',
+                 '_vectors_warned')
+
+    def __init__(self, index, labels: Sequence[str], version=None, vectors=None, rerank_k: int = 0,
+                 row_ids=None, top_k: int = 20, top_m: int = 1):
+        self.index = index
+        self.labels = labels
+        self.version = version
+        self.vectors = vectors
+        self.rerank_k = int(rerank_k or 0)
+        self.row_ids = row_ids
+        self.top_k = max(1, int(top_k))
+        self.top_m = max(1, int(top_m))
+        # Index returning row numbers (the one inside an IndexIDMap), for reranking
+        self._rows_index = unwrap_index(index)[0] if row_ids is not None else index
+        self._vectors_warned = False
+
+    def __len__(self):
+        return len(self.labels)
+
+    def search(self, queries: np.ndarray, k: int = 1):
+        """Return (similarities, ids) of the k nearest index entries of every query.
+
+        Ids are what the index stores: person ids in both modes, so in
+        `multi` mode one person can appear several times.
+        """
+        if self.vectors is None or not self.rerank_k:
+            return self.index.search(queries, k)
+        similarities, rows = rerank_search(self._rows_index, self.vectors, queries, k, self.rerank_k)
+        if self.row_ids is None:
+            return similarities, rows
+        return similarities, np.where(rows >= 0, self.row_ids[np.maximum(rows, 0)], -1)
+
+    def best_matches(self, queries: np.ndarray):
+        """Best person per query with one batched search; returns (scores, person ids)."""
+        if self.row_ids is None:
+            similarities, ids = self.search(queries, 1)
+            return similarities[:, 0], ids[:, 0]
+        similarities, ids = self.search(queries, min(self.top_k, max(1, self.index.ntotal)))
+        return aggregate_identities(similarities, ids, self.top_m)
+
+    def person_vectors(self, person_id: int) -> Optional[np.ndarray]:
+        """(rows, d) float32 gallery vectors of one person, or None if they cannot be read."""
+        rows = np.flatnonzero(self.row_ids == person_id) if self.row_ids is not None else [person_id]
+        if self.vectors is not None:
+            return np.array(self.vectors[rows], dtype=np.float32)
+        try:
+            # Exact for flat indexes (the default without saved vectors)
+            return np.stack([self._rows_index.reconstruct(int(row)) for row in rows]).astype(np.float32)
+        except RuntimeError as e:
+            if not self._vectors_warned:
+                self._vectors_warned = True
+                _LOG.warning("Cannot read vectors of person %d from gallery version %s: %s",
+                             person_id, self.version, e)
+            return None
+
+
+def load_gallery(config) -> Optional[Gallery]:
+    """Load the published gallery, or None if it is missing or inconsistent.
+
+    The index and labels are memory-mapped unless GALLERY.MMAP is false.
+    With HOT_SET enabled, IVF indexes get a direct map so `person_vectors()`
+    can read them back.
+    """
+    mmap = bool((config.get('GALLERY', {}) or {}).get('MMAP', True))
+    manifest = read_gallery_manifest(config)
+    if manifest is None:
+        # Gallery from before versioned builds
+        version = gallery_version(config)
+        index, labels = load_faiss_data(config, mmap=mmap)
+    else:
+        # Version directories are never modified after publishing, so this pair is consistent
+        version = manifest['version']
+        index, labels = load_faiss_data(config, manifest['dir'], mmap=mmap)
+    if index is None or labels is None:
+        return None
+
+    multi = (manifest or {}).get('mode') == 'multi'
+    row_ids = unwrap_index(index)[1] if multi else None
+    if multi and (row_ids is None or (len(row_ids) and int(row_ids.max()) >= len(labels))):
+        _LOG.warning("Gallery version %s has person ids without labels", version)
+        return None
+    if not multi and index.ntotal != len(labels):
+        _LOG.warning("Gallery version %s has %d vectors but %d labels", version, index.ntotal, len(labels))
+        return None
+
+    vectors, rerank_k = None, 0
+    index_info = (manifest or {}).get('index', {}) or {}
+    vectors_path = os.path.join(manifest['dir'], GALLERY_VECTORS_FILE) if manifest else None
+    if vectors_path and os.path.exists(vectors_path):
+        vectors = np.load(vectors_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        rerank_k = index_info.get('rerank_k') or 0
+    if vectors is None and ((config.get('HOT_SET', {}) or {}).get('ENABLED', False)):
+        # The hot set reads person vectors back with reconstruct(), which IVF
+        # indexes only support with a direct map (one int64 per vector)
+        ivf = faiss.try_extract_index_ivf(unwrap_index(index)[0])
+        if ivf is not None:
+            try:
+                ivf.make_direct_map()
+            except RuntimeError as e:
+                _LOG.warning("Gallery version %s: no direct map for the hot set: %s", version, e)
+    multi_cfg = multi_settings(config)
+    top_m = multi_cfg['top_m'] if multi_cfg['aggregation'] == 'mean_top_m' else 1
+    return Gallery(index, labels, version, vectors=vectors, rerank_k=rerank_k,
+                   row_ids=row_ids, top_k=multi_cfg['top_k'], top_m=top_m)
+
+
+class GalleryWatcher:
+
+    def __init__(self, config, gallery: Gallery, poll_seconds: float = 5.0, search_params=None):
+        self.config = config
+        self.search_params = dict(search_params or {})
+        set_search_params(gallery.index, **self.search_params)
+        self.current = gallery
+        self.poll_seconds = max(0.5, float(poll_seconds))
+        self.reloads = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="gallery-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_seconds + 1.0)
+            self._thread = None
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """Change nprobe (IVF) / efSearch (HNSW) now and for every later reload."""
+        if nprobe is not None:
+            self.search_params['nprobe'] = int(nprobe)
+        if ef_search is not None:
+            self.search_params['ef_search'] = int(ef_search)
+        return set_search_params(self.current.index, **self.search_params)
+
+    def check(self) -> bool:
+        """Reload now if a newer gallery was published; returns True if swapped."""
+        version = gallery_version(self.config)
+        if version is None or version == self.current.version:
+            return False
+        gallery = load_gallery(self.config)
+        if gallery is None or gallery.version == self.current.version:
+            return False
+        set_search_params(gallery.index, **self.search_params)
+        old = self.current
+        self.current = gallery
+        self.reloads += 1
+        _LOG.info("Gallery reloaded: version %s -> %s (%d persons)", old.version, gallery.version, len(gallery))
+        return True
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception:
+                _LOG.exception("Gallery reload failed; keeping version %s", self.current.version)
+
+
+def create_gallery_watcher(config) -> Optional[GalleryWatcher]:
+    """Load the gallery and, unless GALLERY.HOT_RELOAD is off, start watching it.
+
+    Returns None if there is no gallery on disk yet.
+    """
+    gallery = load_gallery(config)
+    if gallery is None:
+        return None
+    cfg = config.get('GALLERY', {}) or {}
+    index_cfg = cfg.get('INDEX', {}) or {}
+    search_params = {'nprobe': index_cfg.get('NPROBE', 16), 'ef_search': index_cfg.get('EF_SEARCH', 64)}
+    watcher = GalleryWatcher(config, gallery, poll_seconds=cfg.get('POLL_SECONDS', 5.0), search_params=search_params)
+    if cfg.get('HOT_RELOAD', True):
+        watcher.start()
+    return watcher
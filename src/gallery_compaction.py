@@ -0,0 +1,146 @@
+"""Representative-embedding selection for multi-embedding galleries.
+
+In GALLERY.MODE multi every training image is its own index row, and video
+uploads add a frame every few frames, so a person can easily have hundreds
+of almost identical rows. Compaction keeps at most GALLERY.MULTI.MAX_PER_PERSON
+representatives per person:
+
+  fps       farthest-point sampling: start at the person's medoid, then keep
+            adding the vector least similar to everything already kept, so
+            distinct poses / lighting are kept before repeats of one pose
+  kmedoids  FPS picks refined by k-medoids (assign every vector to its most
+            similar representative, move each representative to the medoid
+            of its cluster, repeat)
+
+Vectors with cosine similarity >= DEDUPE_SIMILARITY to a kept one are
+near-duplicates and never kept, even below the limit. The report gives,
+for every dropped vector, its similarity to the closest representative
+of the same person ("coverage"); vectors whose coverage is below
+RECOGNITION.VERIFICATION_THRESHOLD would no longer be matched by an
+identical query and are counted as lost.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+COMPACTION_METHODS = ('fps', 'kmedoids')
+
+_COMPACTION_DEFAULTS = {
+    'max_per_person': 10,
+    'compaction': 'fps',
+    'dedupe_similarity': 0.97,
+}
+
+_KMEDOIDS_ITERATIONS = 10
+
+
+def compaction_settings(config) -> Dict:
+    """GALLERY.MULTI compaction options with defaults filled in, keys lowercased."""
+    cfg = ((config or {}).get('GALLERY', {}) or {}).get('MULTI', {}) or {}
+    settings = {key: cfg.get(key.upper(), value) for key, value in _COMPACTION_DEFAULTS.items()}
+    settings['max_per_person'] = int(settings['max_per_person'] or 0)
+    settings['compaction'] = str(settings['compaction']).lower()
+    settings['dedupe_similarity'] = float(settings['dedupe_similarity'] or 1.0)
+    if settings['compaction'] not in COMPACTION_METHODS:
+        raise ValueError(f"Unknown GALLERY.MULTI.COMPACTION {settings['compaction']!r}; expected one of {COMPACTION_METHODS}")
+    settings['coverage_threshold'] = float((config or {}).get('RECOGNITION', {}).get('VERIFICATION_THRESHOLD', 0.0))
+    return settings
+
+
+def farthest_point_sampling(vectors: np.ndarray, k: int, dedupe_similarity: float = 1.0) -> np.ndarray:
+    """Indices of up to `k` diverse rows of the L2-normalized `vectors`.
+
+    Stops early once every remaining row is at least `dedupe_similarity`
+    similar to a selected one. Costs k matrix-vector products.
+    """
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    # Medoid under cosine similarity: the row most similar to the mean direction
+    first = int(np.argmax(vectors @ vectors.sum(axis=0)))
+    selected = [first]
+    closest = vectors @ vectors[first]
+    while len(selected) < min(k, n):
+        candidate = int(np.argmin(closest))
+        if closest[candidate] >= dedupe_similarity:
+            break
+        selected.append(candidate)
+        np.maximum(closest, vectors @ vectors[candidate], out=closest)
+    return np.array(selected, dtype=np.int64)
+
+
+def k_medoids(vectors: np.ndarray, initial: np.ndarray, iterations: int = _KMEDOIDS_ITERATIONS) -> np.ndarray:
+    """Refine the representative rows `initial` with k-medoids under cosine similarity."""
+    medoids = np.array(initial, dtype=np.int64)
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ vectors[medoids].T, axis=1)
+        updated = medoids.copy()
+        for cluster in range(len(medoids)):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members):
+                # Sum of similarities to all cluster members, for every member at once
+                updated[cluster] = members[np.argmax(vectors[members] @ vectors[members].sum(axis=0))]
+        if np.array_equal(np.sort(updated), np.sort(medoids)):
+            break
+        medoids = np.unique(updated)
+    return medoids
+
+
+def select_representatives(vectors: np.ndarray, settings: Dict) -> np.ndarray:
+    """Sorted indices of the rows of one person's `vectors` to keep."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    k = settings['max_per_person'] or len(vectors)
+    selected = farthest_point_sampling(vectors, k, settings['dedupe_similarity'])
+    if settings['compaction'] == 'kmedoids' and 1 < len(selected) < len(vectors):
+        selected = k_medoids(vectors, selected)
+    return np.sort(selected)
+
+
+def compact_rows(vectors: np.ndarray, vector_ids: np.ndarray, settings: Dict, persons=None):
+    """Select representatives for every person (or only those in `persons`).
+
+    Returns (keep, report): `keep` is a boolean mask over the rows and
+    `report` the coverage summary described in the module docstring.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vector_ids = np.asarray(vector_ids, dtype=np.int64)
+    keep = np.ones(len(vectors), dtype=bool)
+    coverage = np.ones(len(vectors), dtype=np.float32)
+    order = np.argsort(vector_ids, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(vector_ids[order]) != 0])
+    for rows in np.split(order, starts[1:]) if len(order) else []:
+        if persons is not None and int(vector_ids[rows[0]]) not in persons:
+            continue
+        chosen = rows[select_representatives(vectors[rows], settings)]
+        keep[rows] = False
+        keep[chosen] = True
+        coverage[rows] = np.max(vectors[rows] @ vectors[chosen].T, axis=1)
+    return keep, coverage_report(coverage, keep, vector_ids, settings)
+
+
+def coverage_report(coverage: np.ndarray, keep: np.ndarray, vector_ids: np.ndarray, settings: Dict) -> Dict:
+    dropped = coverage[~keep]
+    threshold = settings['coverage_threshold']
+    lost = dropped < threshold
+    return {
+        'method': settings['compaction'],
+        'max_per_person': settings['max_per_person'],
+        'dedupe_similarity': settings['dedupe_similarity'],
+        'rows_before': int(len(keep)),
+        'rows_after': int(keep.sum()),
+        'dropped': int(len(dropped)),
+        'mean_coverage': float(dropped.mean()) if len(dropped) else 1.0,
+        'min_coverage': float(dropped.min()) if len(dropped) else 1.0,
+        'coverage_threshold': threshold,
+        'lost': int(lost.sum()),
+        'persons_with_lost': int(len(np.unique(vector_ids[~keep][lost]))),
+    }
+
+
+def format_report(report: Dict) -> str:
+    return (f"Compaction ({report['method']}, max {report['max_per_person'] or 'all'} per person): "
+            f"{report['rows_before']} -> {report['rows_after']} vectors; dropped vectors' similarity to "
+            f"nearest kept: mean {report['mean_coverage']:.3f}, min {report['min_coverage']:.3f}; "
+            f"{report['lost']} below {report['coverage_threshold']:.2f} "
+            f"({report['persons_with_lost']} person(s))")
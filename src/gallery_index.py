@@ -0,0 +1,316 @@
+"""FAISS index selection for the gallery.
+
+GALLERY.INDEX in config.yaml picks the index built over the (L2-normalized,
+inner-product) gallery vectors:
+
+  flat      exact scan (IndexFlatIP), the default
+  ivf_flat  inverted lists over full vectors; searched lists set by NPROBE
+  ivf_pq    inverted lists over product-quantized vectors (PQ_M bytes each)
+  hnsw      graph index; search breadth set by EF_SEARCH
+
+Galleries smaller than AUTO_THRESHOLD vectors always use `flat`: an exact
+scan is fast at that size and the approximate indexes need that many
+vectors to train. Above it the configured type is trained on the gallery
+itself at build time.
+
+STORAGE compresses the stored vectors of flat, ivf_flat and hnsw indexes
+with scalar quantization: float16 (2x smaller) or int8 (4x smaller, trained
+per dimension). The full float32 vectors are then saved next to the index
+(vectors.npy) and, with RERANK, the top RERANK_K candidates of every search
+are re-scored exactly against them (see gallery.Gallery.search).
+
+GALLERY.MODE picks what is indexed: `mean` (one averaged vector per person)
+or `multi` (every enrolled image's vector). Multi galleries wrap the index
+in an IndexIDMap whose ids are person ids, search the TOP_K nearest vectors
+and score each person by the max (AGGREGATION: max) or the mean of its
+TOP_M best similarities (AGGREGATION: mean_top_m), see
+`aggregate_identities()`.
+
+NPROBE / EF_SEARCH are not stored in the index file; `set_search_params()`
+applies them after every load and can be called again at runtime.
+Every build measures recall of the chosen index against an exact scan
+(`measure_recall()`); the report is printed and kept in the gallery manifest.
+"""
+
+import math
+import time
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+STORAGE_TYPES = ('float32', 'float16', 'int8')
+
+_SQ_TYPES = {'float16': 'QT_fp16', 'int8': 'QT_8bit'}
+
+_DEFAULTS = {
+    'type': 'flat',
+    'storage': 'float32',
+    'rerank': True,
+    'rerank_k': 10,
+    'auto_threshold': 10000,
+    'nlist': 'auto',
+    'pq_m': 64,
+    'pq_nbits': 8,
+    'hnsw_m': 32,
+    'ef_construction': 200,
+    'nprobe': 16,
+    'ef_search': 64,
+    'recall_sample': 1000,
+    'recall_k': 10,
+}
+
+
+GALLERY_MODES = ('mean', 'multi')
+
+_MULTI_DEFAULTS = {
+    'top_k': 20,
+    'aggregation': 'max',
+    'top_m': 3,
+}
+
+
+def gallery_mode(config) -> str:
+    mode = str(((config or {}).get('GALLERY', {}) or {}).get('MODE', 'mean')).lower()
+    if mode not in GALLERY_MODES:
+        raise ValueError(f"Unknown GALLERY.MODE {mode!r}; expected one of {GALLERY_MODES}")
+    return mode
+
+
+def multi_settings(config) -> Dict:
+    """GALLERY.MULTI with defaults filled in, keys lowercased."""
+    cfg = ((config or {}).get('GALLERY', {}) or {}).get('MULTI', {}) or {}
+    settings = dict(_MULTI_DEFAULTS)
+    settings.update({str(key).lower(): value for key, value in cfg.items()})
+    settings['aggregation'] = str(settings['aggregation']).lower()
+    if settings['aggregation'] not in ('max', 'mean_top_m'):
+        raise ValueError(f"Unknown GALLERY.MULTI.AGGREGATION {settings['aggregation']!r}")
+    return settings
+
+
+def index_settings(config) -> Dict:
+    """GALLERY.INDEX with defaults filled in, keys lowercased."""
+    cfg = ((config or {}).get('GALLERY', {}) or {}).get('INDEX', {}) or {}
+    settings = dict(_DEFAULTS)
+    settings.update({str(key).lower(): value for key, value in cfg.items()})
+    settings['type'] = str(settings['type']).lower()
+    if settings['type'] not in INDEX_TYPES:
+        raise ValueError(f"Unknown GALLERY.INDEX.TYPE {settings['type']!r}; expected one of {INDEX_TYPES}")
+    settings['storage'] = str(settings['storage']).lower()
+    if settings['storage'] not in STORAGE_TYPES:
+        raise ValueError(f"Unknown GALLERY.INDEX.STORAGE {settings['storage']!r}; expected one of {STORAGE_TYPES}")
+    return settings
+
+
+def is_compressed(info: Dict) -> bool:
+    """Whether an index built with this info stores lossy vectors (worth reranking)."""
+    return info.get('type') == 'ivf_pq' or info.get('storage', 'float32') != 'float32'
+
+
+def index_bytes(index) -> int:
+    """Serialized size of an index, a close proxy for the memory it needs."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def _nlist(n: int, settings: Dict) -> int:
+    nlist = settings['nlist']
+    nlist = int(4 * math.sqrt(n)) if nlist in (None, 'auto') else int(nlist)
+    # k-means wants ~39 training points per centroid
+    return max(1, min(nlist, n // 39))
+
+
+def _pq_m(d: int, m: int) -> int:
+    # PQ needs the dimension to split evenly into m sub-vectors
+    m = max(1, min(int(m), d))
+    while d % m:
+        m -= 1
+    return m
+
+
+def build_index(vectors: np.ndarray, settings: Dict, ids: Optional[np.ndarray] = None):
+    """Build (and train if needed) an index over `vectors`; returns (index, info).
+
+    With `ids` (one int64 per vector) the index is wrapped in an IndexIDMap
+    and searches return those ids instead of row numbers.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    kind = settings['type'] if n >= int(settings['auto_threshold']) else 'flat'
+    if kind == 'ivf_pq' and n < 39 * (1 << int(settings['pq_nbits'])):
+        print(f"Too few vectors ({n}) to train IVF-PQ codebooks; using IVF-Flat")
+        kind = 'ivf_flat'
+
+    # PQ codes are already compressed; scalar quantization applies to the others
+    storage = settings['storage'] if kind != 'ivf_pq' else 'float32'
+    if n == 0:
+        # Empty gallery (everyone removed): nothing to train quantizers on
+        kind, storage = 'flat', 'float32'
+    sq_type = getattr(faiss.ScalarQuantizer, _SQ_TYPES[storage]) if storage in _SQ_TYPES else None
+
+    params: Dict = {}
+    started = time.time()
+    if kind == 'flat':
+        if sq_type is None:
+            index = faiss.IndexFlatIP(d)
+        else:
+            index = faiss.IndexScalarQuantizer(d, sq_type, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+    elif kind in ('ivf_flat', 'ivf_pq'):
+        nlist = _nlist(n, settings)
+        quantizer = faiss.IndexFlatIP(d)
+        if kind == 'ivf_flat' and sq_type is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, sq_type, faiss.METRIC_INNER_PRODUCT)
+            params = {'nlist': nlist}
+        elif kind == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+            params = {'nlist': nlist}
+        else:
+            m = _pq_m(d, settings['pq_m'])
+            nbits = int(settings['pq_nbits'])
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+            params = {'nlist': nlist, 'pq_m': m, 'pq_nbits': nbits}
+        index.train(vectors)
+    else:
+        if sq_type is None:
+            index = faiss.IndexHNSWFlat(d, int(settings['hnsw_m']), faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWSQ(d, sq_type, int(settings['hnsw_m']), faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+        index.hnsw.efConstruction = int(settings['ef_construction'])
+        params = {'hnsw_m': int(settings['hnsw_m']), 'ef_construction': int(settings['ef_construction'])}
+    inner = index
+    if ids is not None:
+        index = faiss.IndexIDMap(inner)
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype=np.int64))
+    else:
+        index.add(vectors)
+    set_search_params(inner, settings.get('nprobe'), settings.get('ef_search'))
+
+    info = {'type': kind, 'storage': storage, 'params': params, 'build_seconds': round(time.time() - started, 3),
+            'bytes': index_bytes(index), 'id_map': ids is not None}
+    measure = int(settings['recall_sample']) > 0
+    # Recall is measured on row numbers, i.e. on the index inside the id map
+    if measure and (kind != 'flat' or storage != 'float32'):
+        info['recall'] = measure_recall(inner, vectors, k=int(settings['recall_k']),
+                                        sample=int(settings['recall_sample']))
+    if is_compressed(info) and settings['rerank']:
+        info['rerank_k'] = int(settings['rerank_k'])
+    if measure and info.get('rerank_k'):
+        info['recall_reranked'] = measure_recall(inner, vectors, k=int(settings['recall_k']),
+                                                 sample=int(settings['recall_sample']), rerank_k=info['rerank_k'])
+    return index, info
+
+
+def unwrap_index(index):
+    """(inner index, id array or None) of an index that may be an IndexIDMap."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index), faiss.vector_to_array(index.id_map)
+    return index, None
+
+
+def aggregate_identities(similarities: np.ndarray, ids: np.ndarray, top_m: int = 1):
+    """Best identity per query from the k nearest vectors of each query.
+
+    `similarities` / `ids` are (n, k) search results sorted best first, with
+    person ids (-1 for empty slots). A person's score is the mean of its
+    `top_m` best similarities among the k (top_m=1 is the max). Fully
+    vectorized over queries and neighbours. Returns (scores, ids), shape (n,).
+    """
+    n, k = ids.shape
+    valid = ids >= 0
+    same = (ids[:, :, None] == ids[:, None, :]) & valid[:, :, None] & valid[:, None, :]
+    # Rank of every hit among the earlier (better) hits of the same person
+    rank = np.sum(same & np.tri(k, k, -1, dtype=bool)[None], axis=2)
+    used = same & (rank < max(1, int(top_m)))[:, None, :]
+    totals = np.einsum('nij,nj->ni', used, similarities.astype(np.float32))
+    scores = totals / np.maximum(used.sum(axis=2), 1)
+    # Score each person once, at its best hit
+    scores = np.where(valid & (rank == 0), scores, -np.inf)
+    best = np.argmax(scores, axis=1)
+    rows = np.arange(n)
+    best_scores = scores[rows, best]
+    best_ids = np.where(np.isfinite(best_scores), ids[rows, best], -1)
+    return best_scores, best_ids
+
+
+def rerank_search(index, vectors: np.ndarray, queries: np.ndarray, k: int, rerank_k: int):
+    """Search `index` for `rerank_k` candidates and re-score them exactly.
+
+    `vectors` holds the full-precision gallery vectors in index order (it may
+    be a read-only memmap; only the candidate rows are read). Returns
+    (similarities, ids) like `index.search`, with -1 ids for missing results.
+    """
+    n, d = queries.shape
+    candidates_k = max(int(k), int(rerank_k))
+    _, candidates = index.search(queries, candidates_k)
+    valid = candidates >= 0
+    rows = np.asarray(vectors[np.where(valid, candidates, 0).ravel()], dtype=np.float32)
+    scores = np.einsum('nkd,nd->nk', rows.reshape(n, candidates_k, d), queries)
+    scores[~valid] = -np.inf
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    scores = np.take_along_axis(scores, order, axis=1)
+    ids = np.take_along_axis(candidates, order, axis=1)
+    ids[~np.isfinite(scores)] = -1
+    return scores, ids
+
+
+def set_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Dict:
+    """Apply search-time settings to whatever index type this is; returns what was set."""
+    applied = {}
+    index, _ = unwrap_index(index)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(int(nprobe), ivf.nlist)
+        applied['nprobe'] = ivf.nprobe
+    hnsw = getattr(index, 'hnsw', None)
+    if hnsw is not None and ef_search:
+        hnsw.efSearch = int(ef_search)
+        applied['ef_search'] = hnsw.efSearch
+    return applied
+
+
+def measure_recall(index, vectors: np.ndarray, k: int = 10, sample: int = 1000,
+                   noise: float = 0.3, seed: int = 0, rerank_k: Optional[int] = None) -> Dict:
+    """Recall of `index` against an exact scan of the same vectors.
+
+    Queries are gallery vectors with added noise (a stand-in for a new photo
+    of an enrolled person), re-normalized. Reports recall@1 (same top match
+    as the exact scan), recall@k, the search time per query of both and the
+    largest top-1 similarity error. With `rerank_k` the index is searched
+    through `rerank_search()`.
+    """
+    n, d = vectors.shape
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(n, size=min(int(sample), n), replace=False)
+    queries = vectors[picks] + rng.normal(scale=noise / math.sqrt(d), size=(len(picks), d)).astype(np.float32)
+    faiss.normalize_L2(queries)
+    k = min(int(k), n)
+
+    exact = faiss.IndexFlatIP(d)
+    exact.add(vectors)
+    started = time.time()
+    truth_scores, truth = exact.search(queries, k)
+    exact_ms = (time.time() - started) * 1000.0 / len(queries)
+    started = time.time()
+    if rerank_k:
+        scores, found = rerank_search(index, vectors, queries, k, rerank_k)
+    else:
+        scores, found = index.search(queries, k)
+    approx_ms = (time.time() - started) * 1000.0 / len(queries)
+
+    recall_at_1 = float(np.mean(found[:, 0] == truth[:, 0]))
+    hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+    report = {
+        'queries': len(queries),
+        'recall_at_1': round(recall_at_1, 4),
+        f'recall_at_{k}': round(hits / float(len(queries) * k), 4),
+        'exact_ms_per_query': round(exact_ms, 4),
+        'index_ms_per_query': round(approx_ms, 4),
+        'max_top1_error': round(float(np.max(np.abs(scores[:, 0] - truth_scores[:, 0]))), 6),
+    }
+    print(f"Index recall vs exact scan{' (reranked)' if rerank_k else ''}: recall@1 {report['recall_at_1']:.3f}, "
+          f"recall@{k} {report[f'recall_at_{k}']:.3f}, "
+          f"{approx_ms:.3f} ms/query (exact {exact_ms:.3f} ms/query)")
+    return report
@@ -0,0 +1,166 @@
+"""Per-camera "hot set" of recently matched identities.
+
+The same few dozen people pass each camera over and over. `HotSet` keeps,
+per camera, the gallery vectors of the people it matched recently and
+scores new queries against them with one small matrix product. A query is
+accepted from the hot set only if its best person clears the recognition
+threshold by MARGIN; everything else falls back to the full gallery search,
+and people found there join the camera's hot set. Entries leave it when
+more than SIZE people are hot (least recently seen first) or when they were
+not seen for TTL_SECONDS.
+
+Person ids are only valid for one gallery version, so all hot sets are
+cleared when the gallery is reloaded. `get_stats()` reports hits and misses
+per camera.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    from src.gallery_index import aggregate_identities
+except ImportError:
+    try:
+        from gallery_index import aggregate_identities
+    except ImportError:
+        import os
+        import sys
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+        from gallery_index import aggregate_identities
+
+
+class _CameraSet:
+
+    __slots__ = ('seen', 'person_vectors', 'matrix', 'owners', 'hits', 'misses')
+
+    def __init__(self):
+        self.seen = OrderedDict()   # person id -> last match time, least recent first
+        self.person_vectors = {}    # person id -> (rows, d) gallery vectors
+        self.matrix = None          # stacked vectors of all hot persons
+        self.owners = None          # person id of every matrix row
+        self.hits = 0
+        self.misses = 0
+
+    def rebuild(self):
+        if not self.seen:
+            self.matrix = self.owners = None
+            return
+        blocks = [self.person_vectors[person] for person in self.seen]
+        self.matrix = np.ascontiguousarray(np.vstack(blocks), dtype=np.float32)
+        self.owners = np.concatenate([np.full(len(block), person, dtype=np.int64)
+                                      for person, block in zip(self.seen, blocks)])
+
+
+class HotSet:
+
+    def __init__(self, size: int = 64, margin: float = 0.05, ttl_seconds: float = 600.0, top_k: int = 20):
+        self.size = max(1, int(size))
+        self.margin = float(margin)
+        self.ttl_seconds = float(ttl_seconds)
+        self.top_k = max(1, int(top_k))
+        self._cameras: Dict[Optional[str], _CameraSet] = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _camera_set(self, camera) -> _CameraSet:
+        camera_set = self._cameras.get(camera)
+        if camera_set is None:
+            camera_set = self._cameras[camera] = _CameraSet()
+        return camera_set
+
+    def _sync_version(self, gallery):
+        if gallery.version != self._version:
+            for camera_set in self._cameras.values():
+                camera_set.seen.clear()
+                camera_set.person_vectors.clear()
+                camera_set.rebuild()
+            self._version = gallery.version
+
+    def match(self, gallery, queries: np.ndarray, cameras, threshold: float):
+        """Score normalized `queries` against the hot set of each query's camera.
+
+        Returns (scores, ids, hit) of shape (n,); where `hit` is False the
+        caller must search the full gallery.
+        """
+        n = len(queries)
+        scores = np.full(n, -np.inf, dtype=np.float32)
+        ids = np.full(n, -1, dtype=np.int64)
+        hit = np.zeros(n, dtype=bool)
+        cameras = list(cameras) if cameras is not None else [None] * n
+        with self._lock:
+            self._sync_version(gallery)
+            snapshots = {camera: (self._camera_set(camera).matrix, self._camera_set(camera).owners)
+                         for camera in set(cameras)}
+
+        for camera, (matrix, owners) in snapshots.items():
+            rows = np.flatnonzero(np.array([c == camera for c in cameras], dtype=bool))
+            if matrix is not None:
+                similarities = queries[rows] @ matrix.T
+                k = min(self.top_k, matrix.shape[0])
+                order = np.argsort(-similarities, axis=1, kind='stable')[:, :k]
+                best, best_ids = aggregate_identities(np.take_along_axis(similarities, order, axis=1),
+                                                      owners[order], gallery.top_m)
+                scores[rows], ids[rows] = best, best_ids
+                hit[rows] = (best >= float(threshold) + self.margin) & (best_ids >= 0)
+            with self._lock:
+                camera_set = self._camera_set(camera)
+                camera_set.hits += int(hit[rows].sum())
+                camera_set.misses += int(len(rows) - hit[rows].sum())
+        return scores, ids, hit
+
+    def record(self, gallery, cameras, scores: np.ndarray, ids: np.ndarray, threshold: float):
+        """Mark every match at or above `threshold` as recently seen at its camera."""
+        now = time.monotonic()
+        cameras = list(cameras) if cameras is not None else [None] * len(ids)
+        with self._lock:
+            self._sync_version(gallery)
+            changed = set()
+            for camera, score, person in zip(cameras, scores, ids):
+                if person < 0 or not score >= threshold:
+                    continue
+                person = int(person)
+                camera_set = self._camera_set(camera)
+                if person not in camera_set.seen:
+                    vectors = gallery.person_vectors(person)
+                    if vectors is None or not len(vectors):
+                        continue
+                    camera_set.person_vectors[person] = vectors
+                    changed.add(camera)
+                camera_set.seen[person] = now
+                camera_set.seen.move_to_end(person)
+
+            for camera, camera_set in self._cameras.items():
+                while camera_set.seen and (len(camera_set.seen) > self.size or
+                                           now - next(iter(camera_set.seen.values())) > self.ttl_seconds):
+                    person, _ = camera_set.seen.popitem(last=False)
+                    camera_set.person_vectors.pop(person, None)
+                    changed.add(camera)
+            for camera in changed:
+                self._cameras[camera].rebuild()
+
+    def get_stats(self) -> Dict[Optional[str], Dict[str, float]]:
+        with self._lock:
+            stats = {camera: {'hits': camera_set.hits, 'misses': camera_set.misses, 'size': len(camera_set.seen)}
+                     for camera, camera_set in self._cameras.items()}
+        for values in stats.values():
+            total = values['hits'] + values['misses']
+            values['hit_rate'] = values['hits'] / total if total else 0.0
+        return stats
+
+
+def create_hot_set(config) -> Optional[HotSet]:
+    """Build a HotSet from the HOT_SET section of config.yaml, or None if disabled."""
+    hot_cfg = (config or {}).get('HOT_SET', {}) or {}
+    if not hot_cfg.get('ENABLED', False):
+        return None
+    multi_cfg = ((config or {}).get('GALLERY', {}) or {}).get('MULTI', {}) or {}
+    return HotSet(
+        size=hot_cfg.get('SIZE', 64),
+        margin=hot_cfg.get('MARGIN', 0.05),
+        ttl_seconds=hot_cfg.get('TTL_SECONDS', 600),
+        top_k=multi_cfg.get('TOP_K', 20),
+    )
@@ -0,0 +1,257 @@
+"""Cross-camera micro-batching in front of a shared FaceRecognizer.
+
+Camera threads call `scheduler.submit(frame)` (or the blocking
+`scheduler.recognize_face(frame)`, which mirrors FaceRecognizer) instead of
+calling the recognizer themselves. Each of `workers` threads waits for the
+first queued request, keeps collecting requests from any camera until either
+`max_batch` are queued or `max_latency_ms` has passed, and then detects
+every frame of the batch with one `FaceRecognizer.detect_batch()` call
+(one `detect_faces_batch()` per detector backend) before embedding all
+their faces together in `FaceRecognizer.recognize_batch()`. With more than
+one worker, one batch is detected while the next is being collected, so
+cameras still run in parallel as they did without the scheduler. Each caller
+gets its own result back through a `concurrent.futures.Future`.
+
+Callers that track faces themselves (e.g. the face tracker) run their
+detection step through `detect()`, which is batched with the frames of the
+other cameras, and submit the faces they want identified with
+`identify_faces()`; all face jobs in a batch are embedded together in one
+`FaceRecognizer.identify_faces()` call.
+
+`get_stats()` reports batch sizes overall (in requests, with frames and
+face jobs also counted apart) and, per camera, how many requests it sent,
+how long they waited to be batched and the mean size of the batches they
+ran in.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_LOG = logging.getLogger("scheduler")
+
+
+class _Request:
+
+    __slots__ = ('kind', 'payload', 'camera', 'future', 'queued_at')
+
+    def __init__(self, kind: str, payload, camera: Optional[str]):
+        self.kind = kind
+        self.payload = payload
+        self.camera = camera
+        self.future: Future = Future()
+        self.queued_at = time.monotonic()
+
+
+class InferenceScheduler:
+
+    def __init__(self, recognizer, max_batch: int = 32, max_latency_ms: float = 30.0, workers: int = 2):
+        self.recognizer = recognizer
+        self.max_batch = max(1, int(max_batch))
+        self.max_latency = max(0.0, float(max_latency_ms)) / 1000.0
+        self.workers = max(1, int(workers))
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        # 'jobs' counts every request; 'frames' only recognize/detect frames, 'face_jobs' identify_faces calls
+        self._stats = {'batches': 0, 'jobs': 0, 'frames': 0, 'face_jobs': 0, 'max_batch_seen': 0,
+                       'busy_seconds': 0.0}
+        self._camera_stats: Dict[Optional[str], Dict[str, float]] = {}
+
+    def start(self):
+        if any(worker.is_alive() for worker in self._workers):
+            return self
+        self._stop_event.clear()
+        self._workers = [threading.Thread(target=self._run, name=f"inference-scheduler-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for worker in self._workers:
+            worker.start()
+        _LOG.info(f"Inference scheduler started ({self.workers} worker(s), max batch {self.max_batch}, "
+                  f"latency budget {self.max_latency * 1000:.0f} ms)")
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+        # Fail anything still waiting so camera threads do not block forever
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            request.future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    def submit(self, frame: np.ndarray, camera: Optional[str] = None) -> Future:
+        """Queue a frame for recognition; the future resolves to its result list."""
+        return self._enqueue('frame', frame, camera)
+
+    def submit_detect(self, frame: np.ndarray, camera: Optional[str] = None) -> Future:
+        """Queue a frame for detection only; the future resolves to (boxes, landmarks)."""
+        return self._enqueue('detect', frame, camera)
+
+    def submit_faces(self, faces, camera: Optional[str] = None) -> Future:
+        """Queue detected faces, as taken by FaceRecognizer.identify_faces;
+        the future resolves to one (label, similarity) per face."""
+        return self._enqueue('faces', list(faces), camera)
+
+    def detect(self, frame: np.ndarray, camera: Optional[str] = None, timeout: Optional[float] = None):
+        """Blocking drop-in for FaceRecognizer.detect."""
+        return self.submit_detect(frame, camera=camera).result(timeout=timeout)
+
+    def identify_faces(self, faces, camera: Optional[str] = None, timeout: Optional[float] = None):
+        """Blocking drop-in for FaceRecognizer.identify_faces."""
+        if not faces:
+            return []
+        return self.submit_faces(faces, camera=camera).result(timeout=timeout)
+
+    def _enqueue(self, kind: str, payload, camera: Optional[str]) -> Future:
+        request = _Request(kind, payload, camera)
+        if self._stop_event.is_set() or not self._workers:
+            request.future.set_exception(RuntimeError("Inference scheduler is not running"))
+            return request.future
+        self._queue.put(request)
+        return request.future
+
+    def recognize_face(self, frame: np.ndarray, camera: Optional[str] = None, timeout: Optional[float] = None):
+        """Blocking drop-in for FaceRecognizer.recognize_face."""
+        return self.submit(frame, camera=camera).result(timeout=timeout)
+
+    def get_stats(self) -> Dict:
+        """Overall batch stats (avg_batch in requests per batch) plus a
+        'cameras' dict of per-camera requests, average wait before batching
+        (ms) and average batch size."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            cameras = {camera: dict(values) for camera, values in self._camera_stats.items()}
+        stats['queued'] = self._queue.qsize()
+        stats['avg_batch'] = stats['jobs'] / stats['batches'] if stats['batches'] else 0.0
+        # Entries are created with their first request, so requests >= 1
+        stats['cameras'] = {camera: {'requests': values['requests'],
+                                     'avg_wait_ms': values['wait_seconds'] * 1000.0 / values['requests'],
+                                     'avg_batch': values['batch_total'] / float(values['requests'])}
+                            for camera, values in cameras.items()}
+        return stats
+
+    def _collect_batch(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            # Drop requests whose caller gave up (e.g. cancelled futures)
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            with self._stats_lock:
+                for request in batch:
+                    values = self._camera_stats.setdefault(request.camera,
+                                                           {'requests': 0, 'wait_seconds': 0.0, 'batch_total': 0})
+                    values['requests'] += 1
+                    values['wait_seconds'] += started - request.queued_at
+                    values['batch_total'] += len(batch)
+
+            image_jobs = [request for request in batch if request.kind in ('frame', 'detect')]
+            face_jobs = [request for request in batch if request.kind == 'faces']
+            if image_jobs:
+                self._run_images(image_jobs)
+            if face_jobs:
+                self._run_faces(face_jobs)
+
+            with self._stats_lock:
+                self._stats['batches'] += 1
+                self._stats['jobs'] += len(batch)
+                self._stats['frames'] += len(image_jobs)
+                self._stats['face_jobs'] += len(face_jobs)
+                self._stats['max_batch_seen'] = max(self._stats['max_batch_seen'], len(batch))
+                self._stats['busy_seconds'] += time.monotonic() - started
+
+    def _run_images(self, jobs):
+        # Frames to recognize and frames to detect only share one detection batch
+        try:
+            detections = self.recognizer.detect_batch([job.payload for job in jobs],
+                                                      cameras=[job.camera for job in jobs])
+        except Exception as e:
+            _LOG.error(f"Batched detection failed for {len(jobs)} frame(s): {e}")
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+
+        frame_jobs = []
+        for job, detection in zip(jobs, detections):
+            if job.kind == 'detect':
+                job.future.set_result(detection)
+            else:
+                frame_jobs.append((job, detection))
+        if not frame_jobs:
+            return
+        try:
+            results = self.recognizer.recognize_batch([job.payload for job, _ in frame_jobs],
+                                                      cameras=[job.camera for job, _ in frame_jobs],
+                                                      detections=[detection for _, detection in frame_jobs])
+        except Exception as e:
+            _LOG.error(f"Batched recognition failed for {len(frame_jobs)} frame(s): {e}")
+            for job, _ in frame_jobs:
+                job.future.set_exception(e)
+            return
+        for (job, _), frame_results in zip(frame_jobs, results):
+            job.future.set_result(frame_results)
+
+    def _run_faces(self, jobs):
+        faces = [face for job in jobs for face in job.payload]
+        cameras = [job.camera for job in jobs for _ in job.payload]
+        try:
+            matches = self.recognizer.identify_faces(faces, cameras)
+        except Exception as e:
+            _LOG.error(f"Batched identification failed for {len(faces)} face(s): {e}")
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+        start = 0
+        for job in jobs:
+            job.future.set_result(matches[start:start + len(job.payload)])
+            start += len(job.payload)
+
+
+def create_scheduler(recognizer, config) -> Optional[InferenceScheduler]:
+    """Build and start a scheduler from the SCHEDULER section of config.yaml.
+
+    Returns None when scheduling is disabled, in which case callers should use
+    the recognizer directly.
+    """
+    sched_cfg = (config or {}).get('SCHEDULER', {}) or {}
+    if not sched_cfg.get('ENABLED', False):
+        return None
+    scheduler = InferenceScheduler(
+        recognizer,
+        max_batch=sched_cfg.get('MAX_BATCH', 32),
+        max_latency_ms=sched_cfg.get('MAX_LATENCY_MS', 30),
+        workers=sched_cfg.get('WORKERS', 2),
+    )
+    return scheduler.start()
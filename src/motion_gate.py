@@ -0,0 +1,94 @@
+"""Cheap motion gate in front of face detection.
+
+`MotionGate.has_motion(frame)` compares a small blurred grayscale copy of the
+frame against the previous one (or a MOG2 background model) and reports
+whether enough pixels changed. Callers skip detection entirely on frames
+without motion; a keep-alive still lets one frame through every
+`keepalive_frames` so people standing still are re-checked.
+
+Each camera owns its own gate, and `get_stats()` reports how many frames the
+gate skipped.
+"""
+
+import threading
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+
+    def __init__(self, method: str = 'diff', downscale_width: int = 160, pixel_threshold: int = 25,
+                 min_motion_ratio: float = 0.002, keepalive_frames: int = 50):
+        self.method = str(method).lower()
+        self.downscale_width = max(16, int(downscale_width))
+        self.pixel_threshold = int(pixel_threshold)
+        self.min_motion_ratio = float(min_motion_ratio)
+        self.keepalive_frames = max(0, int(keepalive_frames))
+        self._previous: Optional[np.ndarray] = None
+        self._subtractor = None
+        if self.method == 'mog2':
+            self._subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=self.pixel_threshold,
+                                                                  detectShadows=False)
+        self._since_pass = 0
+        self._lock = threading.Lock()
+        self._stats = {'frames': 0, 'skipped': 0, 'last_motion_ratio': 0.0}
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        scale = self.downscale_width / float(w)
+        small = cv2.resize(frame, (self.downscale_width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def motion_ratio(self, frame: np.ndarray) -> float:
+        """Fraction of downscaled pixels that changed since the last frame."""
+        gray = self._small_gray(frame)
+        if self._subtractor is not None:
+            mask = self._subtractor.apply(gray)
+            return float(np.count_nonzero(mask)) / mask.size
+
+        previous = self._previous
+        self._previous = gray
+        if previous is None or previous.shape != gray.shape:
+            return 1.0
+        diff = cv2.absdiff(gray, previous)
+        return float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+    def has_motion(self, frame: np.ndarray) -> bool:
+        """True if the frame should go on to detection."""
+        ratio = self.motion_ratio(frame)
+        passed = ratio >= self.min_motion_ratio
+        self._since_pass += 1
+        if not passed and self.keepalive_frames and self._since_pass >= self.keepalive_frames:
+            passed = True
+        if passed:
+            self._since_pass = 0
+        with self._lock:
+            self._stats['frames'] += 1
+            self._stats['last_motion_ratio'] = ratio
+            if not passed:
+                self._stats['skipped'] += 1
+        return passed
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hit_rate'] = stats['skipped'] / stats['frames'] if stats['frames'] else 0.0
+        return stats
+
+
+def create_motion_gate(config) -> Optional[MotionGate]:
+    """Build a MotionGate from the MOTION_GATE section of config.yaml, or None if disabled."""
+    gate_cfg = (config or {}).get('MOTION_GATE', {}) or {}
+    if not gate_cfg.get('ENABLED', False):
+        return None
+    return MotionGate(
+        method=gate_cfg.get('METHOD', 'diff'),
+        downscale_width=gate_cfg.get('DOWNSCALE_WIDTH', 160),
+        pixel_threshold=gate_cfg.get('PIXEL_THRESHOLD', 25),
+        min_motion_ratio=gate_cfg.get('MIN_MOTION_RATIO', 0.002),
+        keepalive_frames=gate_cfg.get('KEEPALIVE_FRAMES', 50),
+    )
@@ -1,12 +1,43 @@
+"""Build the FAISS gallery from the dataset folder.
+
+Training runs as a streaming pipeline:
+  1. a thread pool decodes images, downscaling large JPEGs while decoding
+     (PIL draft mode) so no full-resolution frame is ever held;
+  2. decoded images are detected and embedded in batches (SCRFD + ArcFace
+     via the shared detector and ArcFaceEmbedder, DeepFace as fallback);
+  3. embeddings are summed per person as they arrive and each person's mean
+     is computed once at the end (GALLERY.MODE mean), or every embedding is
+     kept as its own index row tagged with the person id (GALLERY.MODE multi),
+     compacted to at most GALLERY.MULTI.MAX_PER_PERSON representatives each.
+At most two batches of decoded images are in memory at any time: the one
+being embedded and the next one being decoded. Images already in the
+embedding cache skip stages 1 and 2 entirely. Only embeddings of the
+ArcFace output size make it into the gallery; DeepFace fallback vectors of
+another size are skipped.
+
+Usage: python src/precompute_embeddings.py [--workers N] [--batch-size N]
+"""
+
+import argparse
 import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import numpy as np
-import faiss
 from tqdm import tqdm
 from PIL import Image
-# DeepFace will be imported lazily if needed to avoid TensorFlow import errors
-# from deepface import DeepFace
+# DeepFace is only imported by the embedder when it is first needed,
+# to avoid TensorFlow import errors
+from deepface_embedder import DeepFaceEmbedder
+from embedding_cache import EmbeddingCache
+from face_embedder import ArcFaceEmbedder
+from detector_scrfd import detect_faces_batch, use_scrfd_model, configure_detection
+from gallery_index import build_index, index_settings, is_compressed, gallery_mode
+from gallery_compaction import compaction_settings, compact_rows, format_report
 
-from utils import load_config, save_faiss_data, get_device
+from utils import (load_config, save_faiss_data, load_faiss_data, load_person_stats, load_gallery_vectors,
+                   read_gallery_manifest, get_device)
 
 # Optional: use insightface (ArcFace) for embeddings when available
 _INSIGHT_AVAILABLE = False
@@ -17,150 +48,578 @@ try:
 except Exception:
     _INSIGHT_AVAILABLE = False
 
+# Full rebuilds and incremental updates both rewrite the index files
+_GALLERY_LOCK = threading.Lock()
+_MODELS_LOCK = threading.Lock()
+_ARCFACE_EMBEDDER = None
+_DEEPFACE_EMBEDDERS = {}
+
+# Bump when the embedding code changes in a way that invalidates cached vectors
+_CACHE_VERSION = 2
+
+_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _training_options(config, workers=None, batch_size=None):
+    train_cfg = config.get('TRAINING', {}) or {}
+    workers = int(workers or train_cfg.get('WORKERS') or min(8, os.cpu_count() or 1))
+    batch_size = int(batch_size or train_cfg.get('BATCH_SIZE', 32))
+    max_side = int(train_cfg.get('MAX_IMAGE_SIDE', 1280) or 0)
+    return max(1, workers), max(1, batch_size), max_side
+
+
+def _init_embedders(config):
+    """Prepare SCRFD + ArcFace (once per process) and the DeepFace fallback."""
+    global _INSIGHT_APP, _ARCFACE_EMBEDDER
+    embedding_model = config['RECOGNITION']['EMBEDDING_MODEL']
+
+    with _MODELS_LOCK:
+        # Initialize insightface FaceAnalysis if available
+        if _INSIGHT_AVAILABLE and _INSIGHT_APP is None:
+            device = get_device(config)
+            try:
+                ctx_id = 0 if device.startswith('cuda') else -1
+                # Only detection and recognition are used; FaceAnalysis will download if missing
+                _INSIGHT_APP = FaceAnalysis(name='buffalo_l', allowed_modules=['detection', 'recognition'])
+                _INSIGHT_APP.prepare(ctx_id=ctx_id)
+                configure_detection(config.get('DETECTION'), device=device)
+                use_scrfd_model(_INSIGHT_APP.det_model)
+                rec_model = _INSIGHT_APP.models.get('recognition')
+                _ARCFACE_EMBEDDER = ArcFaceEmbedder(rec_model) if rec_model is not None else None
+                print("InsightFace (ArcFace) initialized for embeddings.")
+            except Exception as e:
+                print(f"InsightFace init failed, will fallback to DeepFace: {e}")
+                _INSIGHT_APP = None
+                _ARCFACE_EMBEDDER = None
+
+        if embedding_model not in _DEEPFACE_EMBEDDERS:
+            _DEEPFACE_EMBEDDERS[embedding_model] = DeepFaceEmbedder(embedding_model)
+    return _DEEPFACE_EMBEDDERS[embedding_model]
+
+
+def _decode_image(image_path, max_side=0):
+    """Decode an image as BGR, downscaled so its longest side is at most `max_side`."""
+    try:
+        with Image.open(image_path) as img:
+            if max_side and max(img.size) > max_side:
+                # JPEG only: decode at a reduced DCT scale instead of full resolution
+                img.draft('RGB', (max_side, max_side))
+            img = img.convert('RGB')
+            if max_side and max(img.size) > max_side:
+                img.thumbnail((max_side, max_side), Image.BILINEAR)
+            return np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
+    except Exception as e:
+        print(f"Error processing {image_path}: {e}")
+        return None
+
+
+def _embed_images(images, deepface_embedder):
+    """Embed the most confident face of each BGR image; None where none is found.
+
+    All images are detected with one detector call and all aligned faces go
+    through one ArcFace batch; images without a landmarked face fall back to
+    DeepFace, which runs its own detector.
+    """
+    embeddings = [None] * len(images)
+    fallback = list(range(len(images)))
+    if _ARCFACE_EMBEDDER is not None:
+        try:
+            detections = detect_faces_batch(images, backend='scrfd')
+            items, owners = [], []
+            for i, (boxes, landmarks, scores) in enumerate(detections):
+                candidates = [j for j, kps in enumerate(landmarks) if kps is not None]
+                if candidates:
+                    best = max(candidates, key=lambda j: scores[j])
+                    items.append((images[i], landmarks[best]))
+                    owners.append(i)
+            if items:
+                for i, embedding in zip(owners, _ARCFACE_EMBEDDER.embed(items)):
+                    embeddings[i] = np.array(embedding, dtype='float32')
+            fallback = [i for i in range(len(images)) if embeddings[i] is None]
+        except Exception as e:
+            print(f"InsightFace error on batch: {e}")
+
+    for i in fallback:
+        # If insightface doesn't detect a face, try DeepFace as fallback
+        try:
+            embeddings[i] = deepface_embedder.embed_image(images[i])
+        except Exception as e:
+            print(f"DeepFace fallback failed: {e}")
+    return embeddings
+
+
+def _model_name(config):
+    """Models the gallery embeddings come from, recorded in the gallery manifest.
+
+    Describes the embedders that actually loaded: ArcFace by its model file
+    and output dimension (absent if insightface failed), plus the DeepFace
+    fallback. Call after `_init_embedders` for an accurate name.
+    """
+    deepface = f"deepface-{config['RECOGNITION']['EMBEDDING_MODEL']}"
+    if _ARCFACE_EMBEDDER is None:
+        return deepface
+    model_file = os.path.splitext(os.path.basename(_ARCFACE_EMBEDDER.model_file or 'unknown'))[0]
+    return f"arcface-{model_file}-d{_ARCFACE_EMBEDDER.dim or 'x'}+{deepface}"
+
 
-def precompute_embeddings():
+def _expected_dim(config):
+    """Output size of the primary (ArcFace) embedder, or None if it is unknown.
+
+    Images without a landmarked face fall back to DeepFace, whose vectors
+    usually have another size; the gallery must be built from one of them.
+    """
+    _init_embedders(config)
+    return _ARCFACE_EMBEDDER.dim if _ARCFACE_EMBEDDER is not None else None
+
+
+def _open_cache(config):
+    """Per-image embedding cache for the loaded models, or None if disabled.
+
+    Initializes the embedders first so the cache key names the models that
+    will actually produce the vectors; a failed ArcFace load therefore gets
+    its own (DeepFace) cache instead of poisoning the ArcFace one.
+    """
+    cache_cfg = config.get('EMBEDDING_CACHE', {}) or {}
+    if not cache_cfg.get('ENABLED', True):
+        return None
+    _init_embedders(config)
+    cache_dir = cache_cfg.get('DIR') or os.path.join(config['PATHS']['EMBEDDINGS_DIR'], 'cache')
+    model_key = f"{_model_name(config)}+v{_CACHE_VERSION}"
+    dim = _ARCFACE_EMBEDDER.dim if _ARCFACE_EMBEDDER is not None else None
+    try:
+        return EmbeddingCache(cache_dir, model_key, dim=dim)
+    except Exception as e:
+        print(f"Embedding cache unavailable, embedding every image: {e}")
+        return None
+
+
+def _rel_paths(image_paths, config):
+    """Dataset-relative paths, as the embedding cache keys images."""
+    dataset_dir = config['PATHS']['DATASET_DIR']
+    return [os.path.relpath(path, dataset_dir).replace(os.sep, '/') for path in image_paths]
+
+
+def _counted_images(image_paths, config, cache):
+    """Indices of the images the cache already holds.
+
+    Every build and enroll puts the images it embeds in the cache, and
+    remove_person forgets them, so a hit means the gallery already counts
+    the image (e.g. the same photo uploaded again).
+    """
+    counted = set()
+    for i, (image_path, rel_path) in enumerate(zip(image_paths, _rel_paths(image_paths, config))):
+        try:
+            if cache.lookup(image_path, rel_path)[0]:
+                counted.add(i)
+        except OSError:
+            pass  # Reported when the image is embedded
+    return counted
+
+
+def _iter_embeddings(image_paths, config, cache=None, workers=None, batch_size=None):
+    """Yield (index, embedding or None) once for each image path.
+
+    Cached images are served from `cache` (opened by `_open_cache`, which
+    already loaded the models its key names) and come first; the misses
+    follow in input order. They are decoded by `workers` threads, one batch
+    ahead of the batch being embedded.
+    """
+    workers, batch_size, max_side = _training_options(config, workers, batch_size)
+    rel_paths = _rel_paths(image_paths, config)
+
+    misses = []
+    for i, image_path in enumerate(image_paths):
+        if cache is not None:
+            try:
+                hit, embedding = cache.lookup(image_path, rel_paths[i])
+            except OSError as e:
+                print(f"Error processing {image_path}: {e}")
+                yield i, None
+                continue
+            if hit:
+                yield i, embedding
+                continue
+        misses.append(i)
+
+    if not misses:
+        return
+
+    deepface_embedder = _init_embedders(config)
+    pending_misses = iter(misses)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decode') as pool:
+        in_flight = deque()
+
+        def submit_batch():
+            batch = list(islice(pending_misses, batch_size))
+            if batch:
+                in_flight.append([(i, pool.submit(_decode_image, image_paths[i], max_side)) for i in batch])
+
+        # Keep one batch decoding while the current one is embedded
+        submit_batch()
+        submit_batch()
+        while in_flight:
+            batch = [(i, future.result()) for i, future in in_flight.popleft()]
+            decoded = [(i, image) for i, image in batch if image is not None]
+            embeddings = _embed_images([image for _, image in decoded], deepface_embedder)
+            results = dict(zip([i for i, _ in decoded], embeddings))
+            indices = [i for i, _ in batch]
+            # Release this batch's pixels before the one after next starts decoding
+            del batch, decoded
+            submit_batch()
+            for i in indices:
+                embedding = results.get(i)
+                if embedding is None:
+                    print(f"Could not detect face in {image_paths[i]}. Skipping.")
+                if cache is not None and i in results and os.path.exists(image_paths[i]):
+                    cache.put(image_paths[i], rel_paths[i], embedding)
+                yield i, embedding
+
+
+def _normalized_means(sums, counts):
+    """L2-normalized mean embedding per person (cosine similarity, ArcFace style)."""
+    means = np.asarray(sums, dtype=np.float32) / np.maximum(np.asarray(counts, dtype=np.float32), 1.0)[:, None]
+    norms = np.linalg.norm(means, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (means / norms).astype('float32')
+
+
+def _normalized(embeddings):
+    """L2-normalize embeddings row-wise."""
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (embeddings / norms).astype('float32')
+
+
+def precompute_embeddings(workers=None, batch_size=None, progress=None):
+    """Rebuild the whole gallery; returns the number of persons in it.
+
+    `progress(done, total)` is called after every image, if given.
+    """
     config = load_config()
     if not config:
-        return
+        return 0
 
     dataset_dir = config['PATHS']['DATASET_DIR']
     embedding_model = config['RECOGNITION']['EMBEDDING_MODEL']
-    
-    
-    print(f"Initializing DeepFace with model: {embedding_model}...")
 
-    device = get_device(config)
 
-    # Initialize insightface FaceAnalysis if available
-    global _INSIGHT_APP
-    if _INSIGHT_AVAILABLE and _INSIGHT_APP is None:
-        try:
-            ctx_id = 0 if device.startswith('cuda') else -1
-            # Use a compact recognition model; FaceAnalysis will download if missing
-            _INSIGHT_APP = FaceAnalysis(name='buffalo_l')
-            _INSIGHT_APP.prepare(ctx_id=ctx_id)
-            print("InsightFace (ArcFace) initialized for embeddings.")
-        except Exception as e:
-            print(f"InsightFace init failed, will fallback to DeepFace: {e}")
-            _INSIGHT_APP = None
+    print(f"Embedding model: {embedding_model}")
 
-    all_embeddings = []
-    all_labels = []
+    person_folders = sorted(f.name for f in os.scandir(dataset_dir) if f.is_dir())
 
-    
-    person_folders = [f.name for f in os.scandir(dataset_dir) if f.is_dir()]
-    
     if not person_folders:
         print(f"No person folders found in {dataset_dir}. Check your folder structure.")
-        return
+        return 0
 
     print(f"Found {len(person_folders)} persons to process.")
 
-    for person_name in tqdm(person_folders, desc="Generating Embeddings"):
+    # One flat list so batches span persons; owners[i] is the person of image i
+    image_paths = []
+    owners = []
+    for person_name in person_folders:
         person_dir = os.path.join(dataset_dir, person_name)
-        image_files = [f for f in os.listdir(person_dir) if f.endswith(('.jpg', '.jpeg', '.png'))]
-
+        image_files = sorted(f for f in os.listdir(person_dir) if f.lower().endswith(_IMAGE_EXTENSIONS))
         if not image_files:
             print(f"Warning: No images found for {person_name}. Skipping.")
             continue
+        image_paths.extend(os.path.join(person_dir, image_name) for image_name in image_files)
+        owners.extend([person_name] * len(image_files))
 
-        
-        
-        person_embeddings = []
-        
-        for image_name in image_files:
-            image_path = os.path.join(person_dir, image_name)
-            try:
-                # Prefer insightface ArcFace embeddings when available
-                embedding = None
-                if _INSIGHT_APP is not None:
-                    try:
-                        img = Image.open(image_path).convert('RGB')
-                        img_np = np.array(img)  # RGB
-                        faces = _INSIGHT_APP.get(img_np)
-                        if faces:
-                            emb = faces[0].embedding
-                            embedding = np.array(emb)
-                        else:
-                            # If insightface doesn't detect a face, try DeepFace as fallback
-                            print(f"InsightFace did not detect a face in {image_path}; trying DeepFace fallback...")
-                            try:
-                                from deepface import DeepFace
-                                representations = DeepFace.represent(
-                                    img_path=image_path,
-                                    model_name=embedding_model,
-                                    enforce_detection=False,
-                                    detector_backend='opencv',
-                                )
-                                if representations:
-                                    embedding = np.array(representations[0]['embedding'])
-                                else:
-                                    embedding = None
-                            except Exception as e:
-                                print(f"DeepFace fallback failed: {e}")
-                                embedding = None
-                    except Exception as e:
-                        print(f"InsightFace error on {image_path}: {e}")
-                        embedding = None
-                else:
-                    # If insightface is not available, fallback to DeepFace for embeddings
-                    try:
-                        from deepface import DeepFace
-                        representations = DeepFace.represent(
-                            img_path=image_path,
-                            model_name=embedding_model,
-                            enforce_detection=False,
-                            detector_backend='opencv',
-                        )
-                        if representations:
-                            embedding = np.array(representations[0]['embedding'])
-                    except Exception as e:
-                        print(f"DeepFace represent failed: {e}")
-                        embedding = None
-
-                if embedding is not None:
-                    person_embeddings.append(embedding)
-                else:
-                    print(f"Could not detect face in {image_path}. Skipping.")
+    cache = _open_cache(config)
 
-            except Exception as e:
-                print(f"Error processing {image_path}: {e}")
-                continue
-        
-            if person_embeddings:
-                # Convert list to numpy array and ensure all embeddings have same shape
-                person_embeddings = np.array(person_embeddings)
-                if len(person_embeddings.shape) == 2:  # Valid embeddings array
-                    mean_embedding = np.mean(person_embeddings, axis=0)
-                    all_embeddings.append(mean_embedding)
-                    all_labels.append(person_name)
-                    print(f"Added embeddings for {person_name} - Shape: {person_embeddings.shape}")
-                else:
-                    print(f"Skipping {person_name} - Invalid embeddings shape: {person_embeddings.shape}")
-    
-    if not all_embeddings:
+    # Running sum and count per person; the mean is taken once at the end
+    sums = {}
+    counts = {}
+    dimension = _expected_dim(config)
+    # multi mode: every embedding is indexed, (image index, person name, embedding)
+    multi = gallery_mode(config) == 'multi'
+    rows = []
+    for done, (i, embedding) in enumerate(tqdm(_iter_embeddings(image_paths, config, cache, workers, batch_size),
+                                               total=len(image_paths), desc="Generating Embeddings"), 1):
+        if progress is not None:
+            progress(done, len(image_paths))
+        if embedding is None:
+            continue
+        embedding = np.asarray(embedding, dtype='float32').ravel()
+        if dimension is None:
+            dimension = embedding.shape[0]
+        if embedding.shape[0] != dimension:
+            print(f"Skipping {image_paths[i]} - Invalid embedding shape: {embedding.shape}")
+            continue
+        person_name = owners[i]
+        if person_name in sums:
+            sums[person_name] += embedding
+            counts[person_name] += 1
+        else:
+            sums[person_name] = embedding.copy()
+            counts[person_name] = 1
+        if multi:
+            rows.append((i, person_name, embedding))
+
+    if cache is not None:
+        print(f"Embedding cache: {cache.stats['hits']} hit(s), {cache.stats['misses']} miss(es)")
+        cache.close()
+
+    all_labels = [person_name for person_name in person_folders if person_name in sums]
+    if not all_labels:
         print("No embeddings were generated. FAISS index not created.")
-        return
+        return 0
+
+    with _GALLERY_LOCK:
+        for person_name in all_labels:
+            print(f"Added embeddings for {person_name} - {counts[person_name]} image(s)")
+        all_sums = np.stack([sums[person_name] for person_name in all_labels])
+        all_counts = [counts[person_name] for person_name in all_labels]
+        vectors = vector_ids = compaction = None
+        if multi:
+            # Embeddings arrive cached first; index them in dataset order so builds are reproducible
+            rows.sort(key=lambda row: row[0])
+            person_ids = {person_name: i for i, person_name in enumerate(all_labels)}
+            vectors = _normalized([embedding for _, _, embedding in rows])
+            vector_ids = np.array([person_ids[person_name] for _, person_name, _ in rows], dtype=np.int64)
+            vectors, vector_ids, compaction = _compact(vectors, vector_ids, config)
+        _publish_gallery(all_labels, all_sums, all_counts, config, vectors=vectors, vector_ids=vector_ids,
+                         compaction=compaction)
+    return len(all_labels)
 
-    embeddings_matrix = np.array(all_embeddings).astype('float32')
+
+def _compact(vectors, vector_ids, config, persons=None):
+    """Keep GALLERY.MULTI.MAX_PER_PERSON representatives per person (or only of `persons`).
+
+    Returns (vectors, vector_ids, report); the report is None if nothing was selected.
+    """
+    settings = compaction_settings(config)
+    if not settings['max_per_person'] and settings['dedupe_similarity'] >= 1.0:
+        return vectors, vector_ids, None
+    keep, report = compact_rows(vectors, vector_ids, settings, persons)
+    print(format_report(report))
+    return vectors[keep], vector_ids[keep], report
+
+
+def _publish_gallery(labels, sums, counts, config, vectors=None, vector_ids=None, compaction=None):
+    """Build the configured index and save a new gallery version.
+
+    The index holds the per-person means, or, if `vector_ids` is given, the
+    normalized `vectors` themselves with vector_ids[i] the person of row i.
+    """
+    settings = index_settings(config)
+    if vector_ids is None:
+        # Normalize mean embeddings (L2) for cosine similarity (ArcFace style)
+        embeddings_matrix = _normalized_means(sums, counts)
+    else:
+        embeddings_matrix = np.ascontiguousarray(vectors, dtype=np.float32)
     dimension = embeddings_matrix.shape[1]
-    
-    
-    
-    # Normalize embeddings (L2) for cosine similarity (ArcFace style)
-    norms = np.linalg.norm(embeddings_matrix, axis=1, keepdims=True)
-    norms[norms == 0] = 1.0
-    embeddings_matrix = embeddings_matrix / norms
 
     print(f"Creating FAISS Index (Dimension: {dimension}) using Inner Product (cosine similarity)...")
-    faiss_index = faiss.IndexFlatIP(dimension)
+    faiss_index, index_info = build_index(embeddings_matrix, settings, ids=vector_ids)
+    print(f"Total embeddings added to FAISS: {faiss_index.ntotal} ({index_info['type']} index, {index_info['storage']})")
+
+    # Full-precision copy for exact reranking of compressed indexes; multi-embedding
+    # galleries always keep it so enroll/remove can rebuild without re-embedding
+    if vector_ids is None and not (is_compressed(index_info) and settings['rerank']):
+        embeddings_matrix = None
+
+    # Per-person sums let enroll_images() update one person later
+    return save_faiss_data(faiss_index, labels, config, sums=sums, counts=counts,
+                           model_name=_model_name(config), index_info=index_info,
+                           vectors=embeddings_matrix, vector_ids=vector_ids, compaction=compaction)
+
+
+def _load_gallery(config):
+    """Load the labels and person stats of the current gallery, or None if missing or out of sync.
+
+    Returns (names, sums, counts, rows); rows is (vectors, vector_ids) for a
+    multi-embedding gallery in multi mode, else None. A gallery built in the
+    other mode counts as missing so the caller rebuilds it.
+    """
+    # Read everything from one version directory so they always match
+    manifest = read_gallery_manifest(config)
+    version_dir = manifest['dir'] if manifest else None
+    faiss_index, labels = load_faiss_data(config, version_dir, mmap=True)
+    stats = load_person_stats(config, version_dir)
+    if faiss_index is None or stats is None:
+        return None
+    names, sums, counts = stats
+    if [str(label) for label in labels] != names:
+        print("Person stats do not match the FAISS index.")
+        return None
+
+    multi = gallery_mode(config) == 'multi'
+    if multi != ((manifest or {}).get('mode') == 'multi'):
+        print("Gallery was built in another GALLERY.MODE; rebuilding.")
+        return None
+    if not multi:
+        if faiss_index.ntotal != len(names):
+            print("Person stats do not match the FAISS index.")
+            return None
+        return names, sums, counts, None
+
+    rows = load_gallery_vectors(config, version_dir, mmap=False)
+    if rows is None or rows[1] is None or len(rows[0]) != faiss_index.ntotal:
+        print("Gallery vectors do not match the FAISS index.")
+        return None
+    return names, sums, counts, rows
+
+
+def enroll_images(person_name, image_paths, config=None, progress=None):
+    """Add new images of one person to the gallery without a full retrain.
+
+    Only `image_paths` are embedded; the person's running embedding sum is
+    updated and their mean vector in the index is replaced (or, in multi
+    mode, the new embeddings are added as extra rows). Images the embedding
+    cache already holds are counted in the gallery and skipped, so uploading
+    the same images again does not weigh them twice. Falls back to
+    a full precompute_embeddings() if the gallery has no person stats yet
+    (e.g. it was built before they existed). Returns the number of images
+    that produced an embedding. `progress(done, total)` is called after
+    every image, if given.
+    """
+    config = config or load_config()
+    if not config:
+        return 0
+
+    cache = _open_cache(config)
+    if cache is not None:
+        counted = _counted_images(image_paths, config, cache)
+        if counted:
+            print(f"Skipping {len(counted)} image(s) of {person_name} already in the gallery")
+            image_paths = [path for i, path in enumerate(image_paths) if i not in counted]
+    dimension = _expected_dim(config)
+    new_embeddings = []
+    for done, (i, embedding) in enumerate(_iter_embeddings(image_paths, config, cache), 1):
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype='float32').ravel()
+            if dimension is None:
+                dimension = embedding.shape[0]
+            if embedding.shape[0] == dimension:
+                new_embeddings.append(embedding)
+            else:
+                print(f"Skipping {image_paths[i]} - Invalid embedding shape: {embedding.shape}")
+        if progress is not None:
+            progress(done, len(image_paths))
+    if cache is not None:
+        cache.close()
+
+    with _GALLERY_LOCK:
+        gallery = _load_gallery(config)
+        if gallery is not None and new_embeddings and gallery[1].shape[1] != len(new_embeddings[0]):
+            print("Embedding dimension changed; rebuilding the gallery.")
+            gallery = None
+        if gallery is None:
+            rebuild = True
+        else:
+            rebuild = False
+            labels, sums, counts, rows = gallery
+            if not new_embeddings:
+                print(f"No embeddings produced for {person_name}; gallery unchanged.")
+                return 0
+
+            new_sum = np.sum(np.array(new_embeddings, dtype='float32'), axis=0)
+            new_count = len(new_embeddings)
+            if person_name in labels:
+                pos = labels.index(person_name)
+                sums[pos] += new_sum
+                counts[pos] += new_count
+                new_count = int(counts[pos])
+            else:
+                pos = len(labels)
+                sums = np.vstack([sums.reshape(-1, new_sum.shape[0]), new_sum[None]])
+                counts = np.append(counts, new_count)
+                labels.append(person_name)
+
+            # Only the new images were embedded; everyone else is re-indexed from disk
+            vectors = vector_ids = compaction = None
+            if rows is not None:
+                vectors = np.vstack([rows[0], _normalized(new_embeddings)])
+                vector_ids = np.append(rows[1], np.full(len(new_embeddings), pos, dtype=np.int64))
+                # Re-select only this person's representatives
+                vectors, vector_ids, compaction = _compact(vectors, vector_ids, config, persons={pos})
+            _publish_gallery(labels, sums, counts, config, vectors=vectors, vector_ids=vector_ids,
+                             compaction=compaction)
+            print(f"Enrolled {len(new_embeddings)} image(s) for {person_name} ({new_count} total)")
+
+    if rebuild:
+        precompute_embeddings(progress=progress)
+    return len(new_embeddings)
+
+
+def remove_person(person_name, config=None, progress=None):
+    """Remove one person from the gallery without re-embedding anyone else.
+
+    Falls back to a full precompute_embeddings() if the gallery has no person
+    stats yet; `progress(done, total)` is passed on to it. Returns True if
+    the person was in the gallery.
+    """
+    config = config or load_config()
+    if not config:
+        return False
+
+    with _GALLERY_LOCK:
+        gallery = _load_gallery(config)
+        if gallery is None:
+            rebuild = True
+        else:
+            rebuild = False
+            labels, sums, counts, rows = gallery
+            positions = [i for i, label in enumerate(labels) if label == person_name]
+            if not positions:
+                return False
+            cache = _open_cache(config)
+            if cache is not None:
+                cache.forget(person_name)
+                cache.close()
+            keep = [i for i in range(len(labels)) if i not in positions]
+            vectors = vector_ids = None
+            if rows is not None:
+                # Drop the person's rows and renumber the ids of everyone after them
+                new_ids = np.full(len(labels), -1, dtype=np.int64)
+                new_ids[keep] = np.arange(len(keep))
+                kept_rows = new_ids[rows[1]] >= 0
+                vectors, vector_ids = rows[0][kept_rows], new_ids[rows[1][kept_rows]]
+            if not keep:
+                # Publish an empty gallery so running recognizers stop matching the person
+                print("Gallery is empty now.")
+            _publish_gallery([labels[i] for i in keep], sums[keep], counts[keep], config,
+                             vectors=vectors, vector_ids=vector_ids)
+            print(f"Removed {person_name} from the gallery")
+
+    if rebuild:
+        precompute_embeddings(progress=progress)
+    return True
+
+
+def compact_gallery(config=None, dry_run=False):
+    """Re-select the representatives of every person in the current multi-embedding gallery.
+
+    Publishes a new version unless `dry_run`; returns the coverage report,
+    or None if the gallery is not a multi-embedding one.
+    """
+    config = config or load_config()
+    if not config:
+        return None
+
+    with _GALLERY_LOCK:
+        gallery = _load_gallery(config) if gallery_mode(config) == 'multi' else None
+        if gallery is None or gallery[3] is None:
+            print("No multi-embedding gallery to compact (GALLERY.MODE must be multi).")
+            return None
+        labels, sums, counts, (vectors, vector_ids) = gallery
+        keep, report = compact_rows(vectors, vector_ids, compaction_settings(config))
+        print(format_report(report))
+        if not dry_run and not keep.all():
+            _publish_gallery(labels, sums, counts, config, vectors=vectors[keep], vector_ids=vector_ids[keep],
+                             compaction=report)
+    return report
 
-    faiss_index.add(embeddings_matrix)
-    print(f"Total embeddings added to FAISS: {faiss_index.ntotal}")
 
-    
-    save_faiss_data(faiss_index, all_labels, config)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the FAISS gallery from the dataset folder.")
+    parser.add_argument('--workers', type=int, default=None, help="image decoding threads (TRAINING.WORKERS)")
+    parser.add_argument('--batch-size', type=int, default=None, help="images per detection/embedding batch (TRAINING.BATCH_SIZE)")
+    args = parser.parse_args(argv)
+    return precompute_embeddings(workers=args.workers, batch_size=args.batch_size)
 
 
 if __name__ == "__main__":
-    precompute_embeddings()
\ No newline at end of file
+    main()
@@ -11,19 +11,34 @@ except Exception:
     _INSIGHT_AVAILABLE = False
 
 try:
-    from src.utils import load_config, load_faiss_data, get_device
-    from src.detector_scrfd import detect_faces
+    from src.utils import load_config, get_device, parse_rois
+    from src.detector_scrfd import (detect_faces, detect_faces_with_landmarks, detect_faces_batch, use_scrfd_model,
+                                    configure_detection)
+    from src.face_embedder import ArcFaceEmbedder
+    from src.deepface_embedder import DeepFaceEmbedder
+    from src.gallery import create_gallery_watcher
+    from src.hot_set import create_hot_set
 except ImportError:
     try:
-        from utils import load_config, load_faiss_data, get_device
-        from detector_scrfd import detect_faces
+        from utils import load_config, get_device, parse_rois
+        from detector_scrfd import (detect_faces, detect_faces_with_landmarks, detect_faces_batch, use_scrfd_model,
+                                    configure_detection)
+        from face_embedder import ArcFaceEmbedder
+        from deepface_embedder import DeepFaceEmbedder
+        from gallery import create_gallery_watcher
+        from hot_set import create_hot_set
     except ImportError:
         # If running from the project root, add current directory to path
         import sys
         import os
         sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-        from utils import load_config, load_faiss_data, get_device
-        from detector_scrfd import detect_faces
+        from utils import load_config, get_device, parse_rois
+        from detector_scrfd import (detect_faces, detect_faces_with_landmarks, detect_faces_batch, use_scrfd_model,
+                                    configure_detection)
+        from face_embedder import ArcFaceEmbedder
+        from deepface_embedder import DeepFaceEmbedder
+        from gallery import create_gallery_watcher
+        from hot_set import create_hot_set
 
 
 class FaceRecognizer:
@@ -43,14 +58,18 @@ class FaceRecognizer:
             # 1. Load FAISS Index and Labels
 
 
-            self.faiss_index, self.labels = load_faiss_data(self.config)
-            if self.faiss_index is None:
+            # Reloaded in the background whenever a retrain publishes a new version
+            self.gallery = create_gallery_watcher(self.config)
+            if self.gallery is None:
                 raise Exception("FAISS index not loaded. Run precompute_embeddings.py first.")
-            print(f"FAISS index loaded with {len(self.labels)} persons: {self.labels}")
+            print(f"FAISS index loaded with {len(self.labels)} labels (version {self.gallery.current.version})")
+            # Recently matched people per camera, searched before the full gallery
+            self.hot_set = create_hot_set(self.config)
 
             print("Step 4: Loading Face Detector...")
             # 2. Load Face Detector (For bounding box on live/new images)
             print(f"   Using face detector with device: {self.device}")
+            configure_detection(self.config.get('DETECTION'), device=self.device)
             print(f"Face Detector ready on {self.device}")
             print("Step 5: Configuring DeepFace/Embedding model...")
 
@@ -58,19 +77,63 @@ class FaceRecognizer:
             self.embedding_model_name = self.config['RECOGNITION']['EMBEDDING_MODEL']
             self.recognition_threshold = self.config['RECOGNITION']['VERIFICATION_THRESHOLD']
             self.distance_metric = self.config['RECOGNITION']['DISTANCE_METRIC']
+            # 'single_pass' feeds detector keypoints straight into ArcFace;
+            # 'full_frame' also runs the whole buffalo_l pack on every frame
+            self.pipeline = str(self.config['RECOGNITION'].get('PIPELINE', 'single_pass')).lower()
             # Initialize insightface FaceAnalysis if available
             self.insight_app = None
+            self.rec_model = None
+            self.embedder = None
             if _INSIGHT_AVAILABLE:
                 try:
                     ctx_id = 0 if self.device.startswith('cuda') else -1
-                    self.insight_app = FaceAnalysis(name='buffalo_l')
-                    self.insight_app.prepare(ctx_id=0 if ctx_id == 0 else -1)
-                    print("Using InsightFace (ArcFace) for embeddings")
+                    if self.pipeline == 'single_pass':
+                        # Landmark and gender/age modules are never used in this mode
+                        self.insight_app = FaceAnalysis(name='buffalo_l', allowed_modules=['detection', 'recognition'])
+                    else:
+                        self.insight_app = FaceAnalysis(name='buffalo_l')
+                    self.insight_app.prepare(ctx_id=ctx_id)
+                    self.rec_model = self.insight_app.models.get('recognition')
+                    if self.rec_model is not None:
+                        self.embedder = ArcFaceEmbedder(self.rec_model)
+                    if self.pipeline == 'single_pass':
+                        # Share buffalo_l's SCRFD with the detector if models/scrfd_500m.onnx is absent
+                        use_scrfd_model(self.insight_app.det_model)
+                    print(f"Using InsightFace (ArcFace) for embeddings, pipeline: {self.pipeline}")
                 except Exception as e:
                     self.insight_app = None
+                    self.rec_model = None
+                    self.embedder = None
                     print(f"InsightFace init failed, falling back to DeepFace: {e}")
             
             
+            # Default tile layout for cameras without their own 'tiles' entry
+            tiling_cfg = (self.config.get('DETECTION', {}) or {}).get('TILING', {}) or {}
+            self.default_tiles = None
+            if tiling_cfg.get('ENABLED', False):
+                self.default_tiles = {key.lower(): value for key, value in tiling_cfg.items() if key != 'ENABLED'}
+
+            # Per-camera detection options (ROIs, tiles, ...) keyed by camera name
+            self.camera_options = {}
+            for cam in self.config.get('CAMERA_SOURCES', []) or []:
+                camera = str(cam.get('name', cam.get('source')))
+                try:
+                    self.set_camera_options(camera, rois=parse_rois(cam.get('roi')))
+                except ValueError as e:
+                    print(f"Ignoring ROI for camera {cam.get('name')}: {e}")
+                if 'tiles' in cam:
+                    self.set_camera_options(camera, tiles=cam['tiles'])
+                if cam.get('detector'):
+                    self.set_camera_options(camera, backend=str(cam['detector']).lower())
+                if cam.get('detector_input_size'):
+                    self.set_camera_options(camera, input_size=tuple(int(v) for v in cam['detector_input_size']))
+
+            # DeepFace fallback (full frames, boxes without landmarks), warmed now so
+            # the first miss does not stall a camera thread while TensorFlow loads
+            self.deepface = DeepFaceEmbedder(self.embedding_model_name)
+            if self.config['RECOGNITION'].get('DEEPFACE_WARMUP', True):
+                self.deepface.warmup()
+
             print(f"DeepFace Embedding Model: {self.embedding_model_name}")
             print("\nFaceRecognizer initialized successfully!\n")
             
@@ -83,12 +146,158 @@ class FaceRecognizer:
             raise
 
 
-    def recognize_face(self, frame: np.ndarray):
+    @property
+    def faiss_index(self):
+        return self.gallery.current.index
+
+    @property
+    def labels(self):
+        return self.gallery.current.labels
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """Tune approximate gallery search at runtime (IVF nprobe / HNSW efSearch)."""
+        return self.gallery.set_search_params(nprobe=nprobe, ef_search=ef_search)
+
+    def get_hot_set_stats(self):
+        """Per-camera hot-set hits / misses, or {} if HOT_SET is disabled."""
+        return self.hot_set.get_stats() if self.hot_set is not None else {}
+
+    def set_camera_options(self, camera, **options):
+        """Set detection options for one camera, e.g. rois=[[x1, y1, x2, y2]] or
+        tiles={'size': 640, 'overlap': 0.25} (tiles=False turns tiling off) or
+        backend='yunet' to pin a detector backend, with input_size=(w, h) for
+        backends that take any input size."""
+        current = dict(self.camera_options.get(camera, {}))
+        current.update({key: value for key, value in options.items() if value is not None})
+        self.camera_options[camera] = current
+
+    def detection_options(self, camera=None):
+        """Keyword arguments for detect_faces_with_landmarks() for this camera."""
+        options = self.camera_options.get(camera, {}) if camera is not None else {}
+        return {'rois': options.get('rois') or None, 'tiles': options.get('tiles', self.default_tiles),
+                'backend': options.get('backend'), 'input_size': options.get('input_size')}
+
+    def recognize_face(self, frame: np.ndarray, camera=None):
+
+        return self.recognize_batch([frame], cameras=[camera])[0]
+
+    def recognize_batch(self, frames, cameras=None, detections=None):
+        """Recognize faces in several frames (e.g. from different cameras) at once.
+
+        `cameras` optionally names the camera of each frame so its detection
+        options (ROIs, tiles, detector backend) apply. `detections` takes
+        (boxes, landmarks) per frame from an earlier `detect_batch()` call;
+        without it the frames are detected here. Returns one result list per
+        frame, in the same order as `frames`.
+        """
+        cameras = list(cameras) if cameras is not None else [None] * len(frames)
+        if detections is None:
+            detections = self.detect_batch(frames, cameras)
+        if self.pipeline == 'single_pass' and self.embedder is not None:
+            return self._recognize_single_pass(frames, cameras, detections)
+        return [self._recognize_full_frame(frame, camera, face_boxes)
+                for frame, camera, (face_boxes, _) in zip(frames, cameras, detections)]
+
+    def _recognize_single_pass(self, frames, cameras, detections):
+        """Use the SCRFD keypoints of `detections` and embed every aligned face of every frame in one ArcFace batch."""
+        batch_results = []
+        faces = []   # (frame, padded box, kps) for every detected face
+        owners = []  # result dict for each entry of `faces`
+        face_cameras = []
+
+        for frame, camera, (face_boxes, landmarks) in zip(frames, cameras, detections):
+            # If the detector found nothing, try DeepFace on the full frame as a fallback
+            if not face_boxes:
+                batch_results.append(self._recognize_whole_frame(frame, camera))
+                continue
+
+            results = []
+            for box, kps in zip(face_boxes, landmarks):
+                x1, y1, x2, y2 = self.pad_box(box, frame.shape)
+                result = {
+                    'box': (x1, y1, x2 - x1, y2 - y1), # (x, y, w, h) format
+                    'label': "Unknown",
+                    'score': 0.0
+                }
+                results.append(result)
+                faces.append((frame, (x1, y1, x2, y2), kps))
+                owners.append(result)
+                face_cameras.append(camera)
+            batch_results.append(results)
+
+        for result, (person_name, sim) in zip(owners, self.identify_faces(faces, face_cameras)):
+            result['label'] = person_name
+            result['score'] = sim
+
+        return batch_results
+
+    def detect(self, frame: np.ndarray, camera=None):
+        """Return (boxes, landmarks) for one frame; landmarks may be None per box."""
+        return self.detect_batch([frame], [camera])[0]
+
+    def detect_batch(self, frames, cameras=None):
+        """Return (boxes, landmarks) for each of several frames.
+
+        Frames searched whole go through one `detect_faces_batch()` call per
+        detector backend / input size, whatever camera they come from; frames
+        of cameras with ROIs or tiles are cropped and detected one by one
+        (their crops are batched inside `detect_faces_with_landmarks()`).
+        """
+        cameras = list(cameras) if cameras is not None else [None] * len(frames)
+        detections = [None] * len(frames)
+        groups = {}
+        for i, camera in enumerate(cameras):
+            options = self.detection_options(camera)
+            if options['rois'] or options['tiles']:
+                detections[i] = detect_faces_with_landmarks(frames[i], **options)
+            else:
+                groups.setdefault((options['backend'], options['input_size']), []).append(i)
+        for (backend, input_size), indices in groups.items():
+            outputs = detect_faces_batch([frames[i] for i in indices], backend=backend, input_size=input_size)
+            for i, (boxes, landmarks, _) in zip(indices, outputs):
+                detections[i] = (boxes, landmarks)
+        return detections
+
+    def identify_faces(self, faces, cameras=None):
+        """Identify already detected faces.
+
+        `faces` is a list of (frame, (x1, y1, x2, y2), kps). Faces with
+        keypoints are embedded in one ArcFace batch and matched with one FAISS
+        search; faces without keypoints (YOLO/Haar boxes) fall back to one
+        DeepFace batch over the box crops. `cameras` optionally names the
+        camera of each face (for its hot set). Returns one (label, similarity) per face.
+        """
+        matches = [("Unknown", 0.0)] * len(faces)
+        cameras = list(cameras) if cameras is not None else [None] * len(faces)
+
+        aligned_idx = [i for i, (_, _, kps) in enumerate(faces) if kps is not None]
+        if aligned_idx and self.embedder is not None:
+            try:
+                embeddings = self.embedder.embed([(faces[i][0], faces[i][2]) for i in aligned_idx])
+                for i, match in zip(aligned_idx, self.match_embeddings(embeddings, [cameras[i] for i in aligned_idx])):
+                    matches[i] = match
+            except Exception:
+                pass # Keep labels as "Unknown"
+
+        crop_idx = [i for i, (_, (x1, y1, x2, y2), kps) in enumerate(faces)
+                    if (kps is None or self.embedder is None) and x2 > x1 and y2 > y1]
+        if crop_idx:
+            try:
+                crops = [faces[i][0][faces[i][1][1]:faces[i][1][3], faces[i][1][0]:faces[i][1][2]] for i in crop_idx]
+                for i, match in zip(crop_idx, self.match_embeddings(self.deepface.embed(crops), [cameras[i] for i in crop_idx])):
+                    matches[i] = match
+            except Exception:
+                pass # Keep labels as "Unknown"
+
+        return matches
+
+    def _recognize_full_frame(self, frame: np.ndarray, camera=None, face_boxes=None):
 
         results = []
         
         # Use SCRFD/YOLO for face detection
-        face_boxes = detect_faces(frame, device=self.device)
+        if face_boxes is None:
+            face_boxes = detect_faces(frame, **self.detection_options(camera))
 
         # If insightface is available, run it once on the full frame to get embeddings and boxes
         insight_faces = []
@@ -101,41 +310,7 @@ class FaceRecognizer:
 
         # If no detector boxes and no insight results, try DeepFace on the full frame as a fallback
         if not face_boxes and not insight_faces:
-            try:
-                from deepface import DeepFace
-                import tempfile, uuid
-                tmp_path = os.path.join(tempfile.gettempdir(), f"frame_{uuid.uuid4().hex}.jpg")
-                cv2.imwrite(tmp_path, frame)
-                reps = DeepFace.represent(
-                    img_path=tmp_path,
-                    model_name=self.embedding_model_name,
-                    enforce_detection=False,
-                    detector_backend='opencv'
-                )
-                if reps:
-                    emb = np.array(reps[0]['embedding']).astype('float32')
-                    # normalize
-                    qnorm = np.linalg.norm(emb)
-                    if qnorm == 0:
-                        qnorm = 1.0
-                    emb = (emb / qnorm).astype('float32')
-                    k = 1
-                    similarities, indices = self.faiss_index.search(emb[np.newaxis, :], k)
-                    sim = float(similarities[0][0])
-                    best_match_index = int(indices[0][0])
-                    person_name = self.labels[best_match_index] if sim >= float(self.recognition_threshold) else 'Unknown'
-                    results.append({
-                        'box': (0, 0, frame.shape[1], frame.shape[0]),
-                        'label': person_name,
-                        'score': sim
-                    })
-                    try:
-                        os.remove(tmp_path)
-                    except Exception:
-                        pass
-                    return results
-            except Exception:
-                pass
+            return self._recognize_whole_frame(frame, camera)
 
         def _box_iou(a, b):
             # a and b are (x1,y1,x2,y2)
@@ -154,21 +329,14 @@ class FaceRecognizer:
             return inter_area / union if union > 0 else 0.0
 
         for box in face_boxes:
-            x1, y1, x2, y2 = box
-            
-            # Add padding to face crop
-            padding = 10 
-            x1 = max(0, x1 - padding)
-            y1 = max(0, y1 - padding)
-            x2 = min(frame.shape[1], x2 + padding)
-            y2 = min(frame.shape[0], y2 + padding)
+            x1, y1, x2, y2 = self.pad_box(box, frame.shape)
             
             # Extract face crop
             face_crop = frame[y1:y2, x1:x2]
             
             # Initialize recognition variables
             person_name = "Unknown"
-            min_distance = float('inf')
+            sim = 0.0
             
             try:
                 # Generate embedding for the face - prefer insightface ArcFace when available
@@ -205,58 +373,10 @@ class FaceRecognizer:
 
                 if query_embedding is None:
                     # Lazy-import DeepFace only if insightface did not provide embedding
-                    try:
-                        from deepface import DeepFace
-                        # DeepFace.represent expects a file path or a proper image input.
-                        # If we have a numpy array crop, write it to a temporary file first.
-                        rep_path = None
-                        tmp_created = False
-                        try:
-                            if isinstance(face_crop, np.ndarray):
-                                import tempfile, uuid
-                                rep_path = os.path.join(tempfile.gettempdir(), f"face_{uuid.uuid4().hex}.jpg")
-                                cv2.imwrite(rep_path, face_crop)
-                                tmp_created = True
-                            else:
-                                rep_path = face_crop
-
-                            representations = DeepFace.represent(
-                                img_path=rep_path,
-                                model_name=self.embedding_model_name,
-                                enforce_detection=False,
-                                detector_backend='opencv'
-                            )
-                            if representations:
-                                query_embedding = np.array(representations[0]['embedding']).astype('float32')
-                        finally:
-                            if tmp_created and rep_path and os.path.exists(rep_path):
-                                try:
-                                    os.remove(rep_path)
-                                except Exception:
-                                    pass
-                    except Exception:
-                        query_embedding = None
+                    query_embedding = self._deepface_embedding(face_crop)
 
                 if query_embedding is not None:
-                    # Normalize query embedding for cosine similarity
-                    try:
-                        qnorm = np.linalg.norm(query_embedding)
-                        if qnorm == 0:
-                            qnorm = 1.0
-                        query_embedding = (query_embedding / qnorm).astype('float32')
-                    except Exception:
-                        pass
-
-                    # Search in FAISS index (Inner Product as similarity)
-                    k = 1
-                    similarities, indices = self.faiss_index.search(query_embedding[np.newaxis, :], k)
-
-                    sim = float(similarities[0][0])
-                    best_match_index = int(indices[0][0])
-
-                    # Check against the verification threshold (higher is better for cosine)
-                    if sim >= float(self.recognition_threshold):
-                        person_name = self.labels[best_match_index]
+                    person_name, sim = self._match(query_embedding, camera)
 
             except Exception:
                 pass # Keep label as "Unknown"
@@ -264,11 +384,89 @@ class FaceRecognizer:
             results.append({
                 'box': (x1, y1, x2 - x1, y2 - y1), # (x, y, w, h) format
                 'label': person_name,
-                'score': sim if 'sim' in locals() else 0.0
+                'score': sim
             })
                 
         return results
 
+    def _recognize_whole_frame(self, frame: np.ndarray, camera=None):
+        """DeepFace fallback on the full frame when no face box was found."""
+        try:
+            query_embedding = self.deepface.embed_image(frame)
+        except Exception:
+            query_embedding = None
+        if query_embedding is None:
+            return []
+        try:
+            person_name, sim = self._match(query_embedding, camera)
+        except Exception:
+            return []
+        return [{
+            'box': (0, 0, frame.shape[1], frame.shape[0]),
+            'label': person_name,
+            'score': sim
+        }]
+
+    @staticmethod
+    def pad_box(box, frame_shape, padding: int = 10):
+        # Add padding to face crop
+        x1, y1, x2, y2 = box
+        x1 = max(0, x1 - padding)
+        y1 = max(0, y1 - padding)
+        x2 = min(frame_shape[1], x2 + padding)
+        y2 = min(frame_shape[0], y2 + padding)
+        return x1, y1, x2, y2
+
+    def _deepface_embedding(self, face_crop):
+        """DeepFace embedding of one face crop, or None if DeepFace is unavailable."""
+        try:
+            return self.deepface.embed([face_crop])[0]
+        except Exception:
+            return None
+
+    def _match(self, query_embedding: np.ndarray, camera=None):
+        """Return (label, similarity) for one embedding against the FAISS index."""
+        return self.match_embeddings(np.asarray(query_embedding, dtype='float32').reshape(1, -1), [camera])[0]
+
+    def match_embeddings(self, embeddings: np.ndarray, cameras=None):
+        """Match an (N, D) batch of embeddings with a single FAISS search.
+
+        With HOT_SET enabled, each embedding is first scored against the
+        people recently matched at its camera (`cameras`, one per row) and
+        only the ones not accepted there go to the FAISS search.
+        Returns a list of (label, similarity), "Unknown" below the threshold.
+        """
+        # Normalize query embeddings for cosine similarity
+        queries = np.array(embeddings, dtype='float32', copy=True)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries /= norms
+
+        # One snapshot per batch so a gallery swap never mixes index and labels
+        gallery = self.gallery.current
+
+        threshold = float(self.recognition_threshold)
+
+        # Search in FAISS index (Inner Product as similarity); in multi-embedding
+        # mode the k nearest vectors are aggregated per person
+        if self.hot_set is None:
+            similarities, indices = gallery.best_matches(queries)
+        else:
+            similarities, indices, hit = self.hot_set.match(gallery, queries, cameras, threshold)
+            if not hit.all():
+                similarities[~hit], indices[~hit] = gallery.best_matches(queries[~hit])
+            self.hot_set.record(gallery, cameras, similarities, indices, threshold)
+
+        matches = []
+        for sim, best_match_index in zip(similarities, indices):
+            sim = float(sim) if np.isfinite(sim) else -1.0
+            # Check against the verification threshold (higher is better for cosine)
+            if sim >= threshold and best_match_index >= 0:
+                matches.append((str(gallery.labels[int(best_match_index)]), sim))
+            else:
+                matches.append(("Unknown", sim))
+        return matches
+
 
 def draw_results(frame, recognition_results):
     for result in recognition_results:
@@ -293,7 +491,7 @@ if __name__ == "__main__":
     try:
         recognizer = FaceRecognizer()
         print("FaceRecognizer initialized successfully!")
-        print(f"Loaded {len(recognizer.labels)} persons: {recognizer.labels}")
+        print(f"Loaded {len(recognizer.labels)} labels")
     except Exception as e:
         print(f"Failed to initialize FaceRecognizer: {e}")
         print("Please ensure:")
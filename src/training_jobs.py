@@ -0,0 +1,258 @@
+"""Background training jobs for the API.
+
+Dataset changes no longer train inside the Flask request. `TrainingQueue`
+records each request as a job in the `training_sessions` table and returns
+its id immediately; a single worker thread runs jobs one at a time:
+
+  - `enroll(person, paths)` embeds new images of one person,
+  - `remove(person)` drops a person from the gallery,
+  - `full()` rebuilds the whole gallery from the dataset folder.
+
+While a job is still queued, further requests are merged into it instead of
+creating a new job, so a burst of uploads costs one training run. A queued
+full rebuild absorbs everything else, since it re-reads the whole dataset.
+
+Several processes may share the database (WSGI workers, the werkzeug
+reloader). Each has its own queue, but a job only starts once no other job
+is running, so training still runs one job at a time. Every job holds a
+lease (`lease_until`) that its process keeps renewing; `recover()`, called
+once at startup, marks jobs whose lease ran out, i.e. whose process died,
+as interrupted and leaves those of live processes alone.
+"""
+
+import datetime
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import precompute_embeddings
+from utils import load_config
+
+_LOG = logging.getLogger("training")
+
+# Write progress to the database at most this often
+_PROGRESS_INTERVAL = 1.0
+# Leases of live jobs are renewed every third of this; a lapsed lease means a dead process
+_LEASE_SECONDS = 30.0
+# How often to check whether another process's running job has finished
+_CLAIM_POLL = 1.0
+
+
+class _Job:
+
+    def __init__(self, job_id: int):
+        self.id = job_id
+        self.full = False
+        self.enroll: Dict[str, List[str]] = {}
+        self.remove: List[str] = []
+        self.requests = 0
+
+    def details(self) -> dict:
+        return {'full': self.full, 'enroll': {name: len(paths) for name, paths in self.enroll.items()},
+                'remove': list(self.remove)}
+
+
+class TrainingQueue:
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._cond = threading.Condition()
+        self._pending: Optional[_Job] = None
+        self._running: Optional[_Job] = None
+        self._worker: Optional[threading.Thread] = None
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def recover(self):
+        """Mark jobs whose process died (their lease ran out) as interrupted."""
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE training_sessions SET status='interrupted', completed_at=? "
+                         "WHERE status IN ('queued', 'running') AND (lease_until IS NULL OR lease_until < ?)",
+                         (_now(), time.time()))
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass  # New database: no table, so no jobs yet
+        finally:
+            conn.close()
+
+    # ---------------- Submitting ----------------
+    def enroll(self, person_name: str, image_paths: List[str]) -> int:
+        def merge(job):
+            if not job.full:
+                job.enroll.setdefault(person_name, []).extend(image_paths)
+        return self._submit(merge)
+
+    def remove(self, person_name: str) -> int:
+        def merge(job):
+            if not job.full:
+                # The person's files are gone; images queued for them no longer matter
+                job.enroll.pop(person_name, None)
+                if person_name not in job.remove:
+                    job.remove.append(person_name)
+        return self._submit(merge)
+
+    def full(self) -> int:
+        def merge(job):
+            job.full = True
+            job.enroll.clear()
+            job.remove.clear()
+        return self._submit(merge)
+
+    def _submit(self, merge) -> int:
+        with self._cond:
+            job = self._pending
+            if job is None:
+                conn = self._connect()
+                cur = conn.execute("INSERT INTO training_sessions (started_at, status, progress, requests, lease_until) "
+                                   "VALUES (?, 'queued', 0, 0, ?)", (_now(), time.time() + _LEASE_SECONDS))
+                conn.commit()
+                conn.close()
+                job = self._pending = _Job(cur.lastrowid)
+            merge(job)
+            job.requests += 1
+            self._update(job.id, requests=job.requests, details=json.dumps(job.details()))
+            self._ensure_worker()
+            self._cond.notify()
+            return job.id
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="training-worker", daemon=True)
+            self._worker.start()
+        if self._heartbeat is None or not self._heartbeat.is_alive():
+            self._heartbeat = threading.Thread(target=self._renew_leases, name="training-lease", daemon=True)
+            self._heartbeat.start()
+
+    # ---------------- Status ----------------
+    def get(self, job_id: int) -> Optional[dict]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM training_sessions WHERE id=?", (job_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job['job_id'] = job.pop('id')
+        if job.get('details'):
+            job['details'] = json.loads(job['details'])
+        # Same fields the synchronous endpoints used to return
+        job['training_completed'] = job['status'] == 'completed'
+        if job['status'] in ('failed', 'interrupted'):
+            job['training_error'] = job.get('error') or job['status']
+        return job
+
+    def _update(self, job_id: int, **fields):
+        columns = ', '.join(f"{name}=?" for name in fields)
+        conn = self._connect()
+        conn.execute(f"UPDATE training_sessions SET {columns} WHERE id=?", (*fields.values(), job_id))
+        conn.commit()
+        conn.close()
+
+    # ---------------- Worker ----------------
+    def _renew_leases(self):
+        while True:
+            time.sleep(_LEASE_SECONDS / 3.0)
+            with self._cond:
+                ids = [job.id for job in (self._pending, self._running) if job is not None]
+            if not ids:
+                continue
+            try:
+                conn = self._connect()
+                conn.execute(f"UPDATE training_sessions SET lease_until=? WHERE id IN ({', '.join('?' * len(ids))})",
+                             (time.time() + _LEASE_SECONDS, *ids))
+                conn.commit()
+                conn.close()
+            except sqlite3.Error as e:
+                _LOG.warning("Could not renew training job leases: %s", e)
+
+    def _claim(self, job: _Job) -> bool:
+        """Mark `job` running unless another process's job is running; atomic across processes."""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            # A running job whose lease ran out lost its process and never finishes
+            conn.execute("UPDATE training_sessions SET status='interrupted', completed_at=? "
+                         "WHERE status='running' AND (lease_until IS NULL OR lease_until < ?)", (_now(), now))
+            busy = conn.execute("SELECT 1 FROM training_sessions WHERE status='running' AND id != ? LIMIT 1",
+                                (job.id,)).fetchone() is not None
+            if not busy:
+                conn.execute("UPDATE training_sessions SET status='running', started_at=?, lease_until=? WHERE id=?",
+                             (_now(), now + _LEASE_SECONDS, job.id))
+            conn.execute("COMMIT")
+            return not busy
+        finally:
+            conn.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                # Claimed under the lock, so no request merges into the job once it runs
+                claimed = self._claim(self._pending)
+                if claimed:
+                    job = self._running = self._pending
+                    self._pending = None
+            if not claimed:
+                # Requests keep merging into the pending job meanwhile
+                time.sleep(_CLAIM_POLL)
+                continue
+            try:
+                self._execute(job)
+            except Exception as e:
+                _LOG.exception("Training job %d failed", job.id)
+                self._update(job.id, status='failed', error=str(e), completed_at=_now())
+            finally:
+                with self._cond:
+                    self._running = None
+
+    def _execute(self, job: _Job):
+        started = time.time()
+        self._update(job.id, details=json.dumps(job.details()))
+        config = load_config()
+        if not config:
+            raise RuntimeError("Config not found")
+
+        state = {'images': sum(len(paths) for paths in job.enroll.values()), 'last_write': 0.0}
+
+        def progress(current, total):
+            state['images'] = total
+            now = time.time()
+            if now - state['last_write'] >= _PROGRESS_INTERVAL or current == total:
+                state['last_write'] = now
+                self._update(job.id, progress=round(min(current / max(total, 1), 1.0), 4))
+
+        if job.full:
+            trained = precompute_embeddings.precompute_embeddings(progress=progress)
+            if not trained:
+                raise RuntimeError("No embeddings were generated")
+        else:
+            total = state['images']
+            for person_name in job.remove:
+                # Only reports progress if the gallery has to be rebuilt from scratch
+                precompute_embeddings.remove_person(person_name, config, progress=progress)
+            done = 0
+            for person_name, image_paths in job.enroll.items():
+                # Scale to this person's share of the job, also when enroll falls back to a full rebuild
+                precompute_embeddings.enroll_images(
+                    person_name, image_paths, config,
+                    progress=lambda current, count, offset=done, share=len(image_paths):
+                        progress(offset + current * share / max(count, 1), total))
+                done += len(image_paths)
+            trained = len(job.remove) + len(job.enroll)
+
+        self._update(job.id, status='completed', progress=1.0, completed_at=_now(),
+                     total_images=state['images'], trained_persons=trained,
+                     model_path=config['PATHS']['EMBEDDINGS_DIR'])
+        _LOG.info("Training job %d completed in %.1fs", job.id, time.time() - started)
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
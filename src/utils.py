@@ -1,9 +1,14 @@
 import yaml
 import os
+import hashlib
+import shutil
 import faiss
+import numpy as np
 import pickle
 import torch
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from typing import Optional, Dict, Tuple
 import csv
 from datetime import datetime, timedelta
@@ -21,30 +26,393 @@ def load_config(config_path='config.yaml'):
         print(f"Error loading config file: {e}")
         return None
 
-def save_faiss_data(faiss_index, labels, config):
-    
+# ---------------- Gallery storage ----------------
+# Every build is written to its own directory and published by atomically
+# replacing the CURRENT pointer file, so readers never see a half-written
+# gallery and older versions stay around for rollback:
+#
+#   EMBEDDINGS_DIR/gallery/CURRENT            -> "v000042"
+#   EMBEDDINGS_DIR/gallery/v000042/manifest.json, faiss_index.bin, labels.npy, person_stats.npz
+#                                  [, vectors.npy: float32 vectors when the index is compressed
+#                                     or the gallery keeps several embeddings per person,
+#                                     vector_ids.npy: person id of every row in multi mode]
+#
+# Labels are a plain NumPy string array (no pickle). Recognizers memory-map
+# both the index and the labels, so processes on one host share the pages
+# and start without reading the whole gallery.
+
+_VERSION_PREFIX = 'v'
+_LABELS_NPY = 'labels.npy'
+GALLERY_VECTORS_FILE = 'vectors.npy'
+GALLERY_VECTOR_IDS_FILE = 'vector_ids.npy'
+
+
+def _gallery_root(config):
+    return os.path.join(config['PATHS']['EMBEDDINGS_DIR'], 'gallery')
+
+
+def _file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _write_person_stats(stats_path, names, sums, counts):
+    np.savez(stats_path, names=np.array(names, dtype=str), sums=np.asarray(sums, dtype=np.float32),
+             counts=np.asarray(counts, dtype=np.int64))
+
+
+def _atomic_write_text(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def list_gallery_versions(config):
+    """Return the version numbers of all complete gallery builds, oldest first."""
+    root = _gallery_root(config)
+    if not os.path.isdir(root):
+        return []
+    versions = []
+    for entry in os.scandir(root):
+        name = entry.name
+        if entry.is_dir() and name.startswith(_VERSION_PREFIX) and name[1:].isdigit() \
+                and os.path.exists(os.path.join(entry.path, 'manifest.json')):
+            versions.append(int(name[1:]))
+    return sorted(versions)
+
+
+def gallery_version_dir(config, version):
+    return os.path.join(_gallery_root(config), f"{_VERSION_PREFIX}{int(version):06d}")
+
+
+def current_gallery_dir(config):
+    """Directory of the published gallery, or None if there is none (or only a legacy one)."""
+    try:
+        with open(os.path.join(_gallery_root(config), 'CURRENT'), 'r') as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(_gallery_root(config), name)
+    return path if name and os.path.isdir(path) else None
+
+
+@contextmanager
+def _publish_lock(root, timeout=60.0, stale_after=600.0):
+    """Hold EMBEDDINGS_DIR/gallery/.publish.lock (across processes) while publishing.
+
+    A lock file older than `stale_after` seconds is left over from a crashed
+    publisher and is broken.
+    """
+    lock_path = os.path.join(root, '.publish.lock')
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock_path).st_mtime > stale_after:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for {lock_path}")
+            time.sleep(0.05)
     try:
-        os.makedirs(config['PATHS']['EMBEDDINGS_DIR'], exist_ok=True)
-        index_path = os.path.join(config['PATHS']['EMBEDDINGS_DIR'], config['PATHS']['FAISS_INDEX_FILE'])
-        labels_path = os.path.join(config['PATHS']['EMBEDDINGS_DIR'], config['PATHS']['LABELS_FILE'])
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def _next_gallery_version(root):
+    # Count every version directory, also half-deleted ones without a manifest,
+    # so a new build never collides with a directory that is still there
+    numbers = [int(entry.name[1:]) for entry in os.scandir(root)
+               if entry.is_dir() and entry.name.startswith(_VERSION_PREFIX) and entry.name[1:].isdigit()]
+    return max(numbers, default=0) + 1
+
+
+def save_faiss_data(faiss_index, labels, config, sums=None, counts=None, model_name=None, index_info=None,
+                    vectors=None, vector_ids=None, compaction=None):
+    """Write a new gallery version and publish it; returns its version number.
+
+    The index, labels and (optionally) the per-person embedding sums and
+    counts used for incremental enrollment are written to a fresh directory
+    together with a manifest, which then becomes current with one rename.
+    The version number is picked under a lock file, so concurrent publishers
+    (e.g. a training job and a CLI rebuild) never claim the same one.
+    The newest GALLERY.KEEP_VERSIONS older versions are kept for rollback.
+    `index_info` (index type, parameters, recall report) goes into the manifest;
+    `vectors` are the full-precision vectors kept for reranking a compressed index.
+
+    Multi-embedding galleries pass `vector_ids`, the person (position in
+    `labels`) of every row of `vectors`; the index then returns person ids.
+    `compaction` is their representative-selection report, if any.
+
+    Raises on failure (after removing the partial build), so callers never
+    report a gallery that was not published.
+    """
+    root = _gallery_root(config)
+    os.makedirs(root, exist_ok=True)
+    build_dir = os.path.join(root, f".build-{os.getpid()}-{int(time.time() * 1000)}")
+    try:
+        os.makedirs(build_dir)
+        index_path = os.path.join(build_dir, config['PATHS']['FAISS_INDEX_FILE'])
+        labels_path = os.path.join(build_dir, _LABELS_NPY)
 
         # 1. Save FAISS Index
         faiss.write_index(faiss_index, index_path)
-        print(f"FAISS index saved to: {index_path}")
 
         # 2. Save Labels
-        with open(labels_path, 'wb') as f:
-            pickle.dump(labels, f)
-        print(f"Labels saved to: {labels_path}")
+        np.save(labels_path, np.array([str(label) for label in labels], dtype=str), allow_pickle=False)
+
+        files = [index_path, labels_path]
+        if sums is not None and counts is not None:
+            # Per-person sums let enrollment update one person without re-embedding everyone
+            stats_path = os.path.join(build_dir, config['PATHS'].get('PERSON_STATS_FILE', 'person_stats.npz'))
+            _write_person_stats(stats_path, labels, sums, counts)
+            files.append(stats_path)
+        if vectors is not None:
+            vectors_path = os.path.join(build_dir, GALLERY_VECTORS_FILE)
+            np.save(vectors_path, np.ascontiguousarray(vectors, dtype=np.float32), allow_pickle=False)
+            files.append(vectors_path)
+        if vector_ids is not None:
+            ids_path = os.path.join(build_dir, GALLERY_VECTOR_IDS_FILE)
+            np.save(ids_path, np.asarray(vector_ids, dtype=np.int64), allow_pickle=False)
+            files.append(ids_path)
+
+        with _publish_lock(root):
+            # 3. Manifest, then move the finished build into place
+            version = _next_gallery_version(root)
+            manifest = {
+                'version': version,
+                'model': model_name or config.get('RECOGNITION', {}).get('EMBEDDING_MODEL'),
+                'dimension': int(faiss_index.d),
+                'count': int(faiss_index.ntotal),
+                'persons': len(labels),
+                'mode': 'multi' if vector_ids is not None else 'mean',
+                'built_at': datetime.utcnow().isoformat(),
+                'index': index_info or {'type': 'flat'},
+                **({'compaction': compaction} if compaction else {}),
+                'files': {os.path.basename(path): _file_sha256(path) for path in files},
+            }
+            _atomic_write_text(os.path.join(build_dir, 'manifest.json'), json.dumps(manifest, indent=2))
+            version_dir = gallery_version_dir(config, version)
+            os.rename(build_dir, version_dir)
+
+            # 4. Publish: readers switch to the new version on their next load
+            _atomic_write_text(os.path.join(root, 'CURRENT'), os.path.basename(version_dir))
+            print(f"Gallery version {version} published to: {version_dir}")
+
+            keep = int((config.get('GALLERY', {}) or {}).get('KEEP_VERSIONS', 3))
+            _prune_gallery_versions(config, keep)
+        return version
 
     except Exception as e:
         print(f"Error saving FAISS data: {e}")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
 
 
-def load_faiss_data(config):
-    
+def _remove_gallery_version(version_dir):
+    """Delete one version directory, its manifest last.
+
+    A reader may still have a file open or memory-mapped (Windows); then the
+    manifest stays, the version stays listed and removal is retried after
+    the next build instead of leaving a directory nothing would ever delete.
+    """
+    manifest_path = os.path.join(version_dir, 'manifest.json')
+    for entry in os.scandir(version_dir):
+        if entry.path == manifest_path:
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+        except OSError:
+            return False
+    try:
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        os.rmdir(version_dir)
+    except OSError:
+        return False
+    return True
+
+
+def _sweep_stale_builds(root, stale_after=24 * 3600.0):
+    # Builds of a publisher that crashed before its own cleanup; a build still
+    # being written by another process is younger than `stale_after`
+    for entry in os.scandir(root):
+        if entry.is_dir(follow_symlinks=False) and entry.name.startswith('.build-'):
+            try:
+                if time.time() - entry.stat().st_mtime > stale_after:
+                    shutil.rmtree(entry.path)
+            except OSError:
+                pass
+
+
+def _prune_gallery_versions(config, keep):
+    current = read_gallery_manifest(config)
+    current_version = current.get('version') if current else None
+    older = [v for v in list_gallery_versions(config) if v != current_version and (current_version is None or v < current_version)]
+    for version in older[:max(0, len(older) - max(0, keep))]:
+        _remove_gallery_version(gallery_version_dir(config, version))
+
+    # Sweep version directories left without a manifest (e.g. by older releases
+    # whose rmtree removed the manifest but not a memory-mapped index)
+    listed = set(list_gallery_versions(config))
+    for entry in os.scandir(_gallery_root(config)):
+        name = entry.name
+        if entry.is_dir() and name.startswith(_VERSION_PREFIX) and name[1:].isdigit() \
+                and int(name[1:]) not in listed and int(name[1:]) != current_version:
+            _remove_gallery_version(entry.path)
+    _sweep_stale_builds(_gallery_root(config))
+
+
+def rollback_gallery(config, version=None):
+    """Make an older gallery version current again (default: the one before current).
+
+    Checksums are verified before switching. Returns the version now current.
+    """
+    versions = list_gallery_versions(config)
+    current = read_gallery_manifest(config)
+    current_version = current.get('version') if current else None
+    if version is None:
+        older = [v for v in versions if current_version is None or v < current_version]
+        if not older:
+            raise ValueError("No older gallery version to roll back to")
+        version = older[-1]
+    if int(version) not in versions:
+        raise ValueError(f"Gallery version {version} not found")
+    version_dir = gallery_version_dir(config, version)
+    problems = verify_gallery(version_dir)
+    if problems:
+        raise ValueError(f"Gallery version {version} is damaged: {'; '.join(problems)}")
+    with _publish_lock(_gallery_root(config)):
+        _atomic_write_text(os.path.join(_gallery_root(config), 'CURRENT'), os.path.basename(version_dir))
+    print(f"Gallery rolled back to version {version}")
+    return int(version)
+
+
+def verify_gallery(version_dir):
+    """Return a list of problems with a gallery version directory (empty if intact)."""
+    try:
+        with open(os.path.join(version_dir, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        return [f"manifest unreadable: {e}"]
+    problems = []
+    for name, checksum in manifest.get('files', {}).items():
+        path = os.path.join(version_dir, name)
+        if not os.path.exists(path):
+            problems.append(f"{name} missing")
+        elif _file_sha256(path) != checksum:
+            problems.append(f"{name} checksum mismatch")
+    return problems
+
+
+def read_gallery_manifest(config, version_dir=None):
+    """Return the manifest of the current (or given) gallery version, or None."""
+    version_dir = version_dir or current_gallery_dir(config)
+    if version_dir is None:
+        return None
+    try:
+        with open(os.path.join(version_dir, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        manifest['dir'] = version_dir
+        return manifest
+    except (OSError, ValueError):
+        return None
+
+
+def gallery_version(config):
+    """Version of the published gallery; changes every time save_faiss_data runs.
+
+    Galleries from before versioned builds fall back to the index mtime.
+    """
+    manifest = read_gallery_manifest(config)
+    if manifest is not None:
+        return manifest.get('version')
     index_path = os.path.join(config['PATHS']['EMBEDDINGS_DIR'], config['PATHS']['FAISS_INDEX_FILE'])
-    labels_path = os.path.join(config['PATHS']['EMBEDDINGS_DIR'], config['PATHS']['LABELS_FILE'])
+    try:
+        return f"mtime:{os.stat(index_path).st_mtime_ns}"
+    except OSError:
+        return None
+
+
+def _gallery_files_dir(config, version_dir=None):
+    # Galleries from before versioned builds live directly in EMBEDDINGS_DIR
+    return version_dir or current_gallery_dir(config) or config['PATHS']['EMBEDDINGS_DIR']
+
+
+def load_gallery_vectors(config, version_dir=None, mmap=True):
+    """Return (vectors, vector_ids) saved with the current (or given) gallery, or None.
+
+    vector_ids is None for galleries with one mean vector per person.
+    """
+    files_dir = _gallery_files_dir(config, version_dir)
+    vectors_path = os.path.join(files_dir, GALLERY_VECTORS_FILE)
+    if not os.path.exists(vectors_path):
+        return None
+    mmap_mode = 'r' if mmap else None
+    vectors = np.load(vectors_path, mmap_mode=mmap_mode, allow_pickle=False)
+    ids_path = os.path.join(files_dir, GALLERY_VECTOR_IDS_FILE)
+    vector_ids = np.load(ids_path, mmap_mode=mmap_mode, allow_pickle=False) if os.path.exists(ids_path) else None
+    return vectors, vector_ids
+
+
+def load_person_stats(config, version_dir=None):
+    """Return (names, sums, counts) of the current (or given) gallery, or None if missing."""
+    stats_path = os.path.join(_gallery_files_dir(config, version_dir), config['PATHS'].get('PERSON_STATS_FILE', 'person_stats.npz'))
+    if not os.path.exists(stats_path):
+        return None
+    try:
+        with np.load(stats_path) as data:
+            return [str(name) for name in data['names']], data['sums'].astype(np.float32), data['counts'].astype(np.int64)
+    except Exception as e:
+        print(f"Error loading person stats: {e}")
+        return None
+
+
+def _read_index(index_path, mmap):
+    if mmap:
+        # Map the stored vectors instead of copying them into RAM (read-only)
+        flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+        try:
+            return faiss.read_index(index_path, flag | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            pass  # index type without mmap support
+    return faiss.read_index(index_path)
+
+
+def load_faiss_data(config, version_dir=None, mmap=False):
+    """Load (index, labels) of the current (or given) gallery version.
+
+    With `mmap=True` the index and labels are memory-mapped read-only and
+    labels is a NumPy string array; otherwise labels is a list of str and
+    the index can be modified.
+    """
+    
+    files_dir = _gallery_files_dir(config, version_dir)
+    index_path = os.path.join(files_dir, config['PATHS']['FAISS_INDEX_FILE'])
+    labels_path = os.path.join(files_dir, _LABELS_NPY)
+    if not os.path.exists(labels_path):
+        # Galleries from before pickle-free labels
+        labels_path = os.path.join(files_dir, config['PATHS']['LABELS_FILE'])
 
     if not os.path.exists(index_path) or not os.path.exists(labels_path):
         print("FAISS index or labels file not found. Run precompute_embeddings.py first.")
@@ -52,12 +420,17 @@ def load_faiss_data(config):
 
     try:
         # 1. Load FAISS Index
-        index = faiss.read_index(index_path)
+        index = _read_index(index_path, mmap)
         print(f"FAISS index loaded from: {index_path}")
 
         # 2. Load Labels
-        with open(labels_path, 'rb') as f:
-            labels = pickle.load(f)
+        if labels_path.endswith('.npy'):
+            labels = np.load(labels_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+            if not mmap:
+                labels = [str(label) for label in labels]
+        else:
+            with open(labels_path, 'rb') as f:
+                labels = pickle.load(f)
         print(f"Labels loaded from: {labels_path}")
 
         return index, labels
@@ -66,6 +439,42 @@ def load_faiss_data(config):
         print(f"Error loading FAISS data: {e}")
         return None, None
 
+def parse_rois(value):
+    """Parse camera regions of interest from config.yaml or the cameras table.
+
+    Accepts a list (or its JSON string) of rectangles [x1, y1, x2, y2] and/or
+    polygons [[x, y], [x, y], ...]; a single rectangle or polygon may be given
+    without the outer list. Coordinates are pixels, or 0-1 fractions of the
+    frame. Returns a list of ROIs; raises ValueError on malformed input.
+    """
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"ROIs must be a list, got {type(value).__name__}")
+
+    def _is_number(v):
+        return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+    def _is_point(v):
+        return isinstance(v, (list, tuple)) and len(v) == 2 and all(_is_number(c) for c in v)
+
+    if value and all(_is_number(v) for v in value):
+        value = [value]
+    elif len(value) >= 3 and all(_is_point(v) for v in value):
+        value = [value]
+
+    rois = []
+    for roi in value:
+        if isinstance(roi, (list, tuple)) and len(roi) == 4 and all(_is_number(v) for v in roi):
+            rois.append([float(v) for v in roi])
+        elif isinstance(roi, (list, tuple)) and len(roi) >= 3 and all(_is_point(v) for v in roi):
+            rois.append([[float(x), float(y)] for x, y in roi])
+        else:
+            raise ValueError(f"Invalid ROI: {roi}")
+    return rois
+
 # Device Management
 def get_device(config):
     
@@ -85,6 +494,18 @@ def get_device(config):
 
 
 
+# Track ids only grow, so the oldest remembered tracks are the ones long gone
+_MAX_REMEMBERED_TRACKS = 1024
+
+
+def _remember_track(tracks: 'OrderedDict[int, str]', track_id: int, label: str):
+    """Record `label` for `track_id`, keeping only the most recent tracks."""
+    tracks[track_id] = label
+    tracks.move_to_end(track_id)
+    while len(tracks) > _MAX_REMEMBERED_TRACKS:
+        tracks.popitem(last=False)
+
+
 class DedupeManager:
     
     def __init__(self, same_camera_cooldown: int = 15, cross_camera_cooldown: int = 30,
@@ -135,6 +556,7 @@ class AttendanceManager:
         self.api_url = api_url
         self.camera_id = camera_id
         self._last_marked: Dict[str, datetime] = {}
+        self._marked_tracks: 'OrderedDict[int, str]' = OrderedDict()
 
         
         if self.log_file:
@@ -147,17 +569,22 @@ class AttendanceManager:
                     writer = csv.writer(f)
                     writer.writerow(["timestamp", "name", "camera"])  # header
 
-    def should_mark(self, name: str) -> bool:
+    def should_mark(self, name: str, track_id: Optional[int] = None) -> bool:
         if not name or name == 'Unknown':
             return False
+        # Mark each tracked face once instead of on every frame it is visible
+        if track_id is not None and self._marked_tracks.get(track_id) == name:
+            return False
         # Cooldown disabled - allow unlimited attendance marking
         return True
 
-    def mark(self, name: str, camera_name: str):
+    def mark(self, name: str, camera_name: str, track_id: Optional[int] = None):
         if not name or name == 'Unknown':
             return
         now = datetime.now()
         self._last_marked[name] = now
+        if track_id is not None:
+            _remember_track(self._marked_tracks, track_id, name)
         
         # Save to CSV file
         if self.log_file:
@@ -0,0 +1,17 @@
+import os
+import sys
+
+# The src modules import each other as top-level modules (see src/utils.py users)
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import pytest
+
+
+@pytest.fixture
+def three_people(tmp_path):
+    """Config of a multi-mode gallery published in tmp_path: alice (2 rows), bob (1), carol (2)."""
+    # Imported here: gallery_helpers needs torch, which not every test module requires
+    from gallery_helpers import gallery_config, publish_three_people
+    return publish_three_people(gallery_config(tmp_path))
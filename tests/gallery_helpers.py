@@ -0,0 +1,47 @@
+"""Shared setup for tests that publish small galleries to a temp directory."""
+
+import numpy as np
+
+import precompute_embeddings
+
+
+def gallery_config(tmp_path, mode='multi'):
+    return {
+        'PATHS': {
+            'EMBEDDINGS_DIR': str(tmp_path / 'embeddings'),
+            'DATASET_DIR': str(tmp_path / 'dataset'),
+            'FAISS_INDEX_FILE': 'faiss_index.bin',
+            'LABELS_FILE': 'labels.pkl',
+        },
+        'RECOGNITION': {'EMBEDDING_MODEL': 'VGG-Face', 'VERIFICATION_THRESHOLD': 0.5},
+        'EMBEDDING_CACHE': {'ENABLED': False},
+        'GALLERY': {
+            'MODE': mode,
+            'KEEP_VERSIONS': 5,
+            'MULTI': {'TOP_K': 8, 'AGGREGATION': 'max', 'MAX_PER_PERSON': 0, 'DEDUPE_SIMILARITY': 1.0},
+        },
+    }
+
+
+def unit(*rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def publish_multi(config, labels, vectors, vector_ids):
+    vector_ids = np.asarray(vector_ids, dtype=np.int64)
+    sums = np.stack([vectors[vector_ids == i].sum(axis=0) for i in range(len(labels))])
+    counts = np.bincount(vector_ids, minlength=len(labels))
+    return precompute_embeddings._publish_gallery(list(labels), sums, counts, config,
+                                                  vectors=vectors, vector_ids=vector_ids)
+
+
+def publish_three_people(config):
+    vectors = unit([1, 0, 0, 0], [1, 0.1, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 1, 0.1])
+    publish_multi(config, ['alice', 'bob', 'carol'], vectors, [0, 0, 1, 2, 2])
+    return config
+
+
+def best_label(gallery, query):
+    _, ids = gallery.best_matches(np.asarray(query, dtype=np.float32)[None])
+    return gallery.labels[int(ids[0])] if ids[0] >= 0 else None
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip('torch')  # background_processor imports src/utils.py, which imports torch
+
+import background_processor
+
+CONFIG_ROI = [[0.0, 0.0, 0.5, 0.5]]
+
+
+class FakeRecognizer:
+
+    def __init__(self):
+        self.rois = {}
+
+    def set_camera_options(self, camera, rois=None):
+        self.rois[camera] = rois
+
+
+@pytest.fixture
+def recognizer(monkeypatch):
+    recognizer = FakeRecognizer()
+    monkeypatch.setattr(background_processor, 'face_recognizer', recognizer)
+    monkeypatch.setattr(background_processor, 'CONFIG', {'CAMERA_SOURCES': [
+        {'name': 'door', 'source': 0, 'roi': CONFIG_ROI}, {'name': 'yard', 'source': 1}]})
+    monkeypatch.setattr(background_processor, 'applied_rois', {})
+    return recognizer
+
+
+def _apply(camera_id, name, roi):
+    background_processor.apply_camera_roi({'camera_id': camera_id, 'name': name, 'ip_address': '0', 'roi': roi})
+
+
+def test_null_roi_column_keeps_the_config_roi(recognizer):
+    _apply(1, 'door', None)
+    assert recognizer.rois['door'] == CONFIG_ROI
+    _apply(2, 'yard', None)
+    assert recognizer.rois['yard'] == []
+
+
+def test_roi_column_overrides_the_config_roi(recognizer):
+    _apply(1, 'door', '[[10, 20, 300, 400]]')
+    assert recognizer.rois['door'] == [[10.0, 20.0, 300.0, 400.0]]
+
+
+def test_cleared_roi_column_clears_the_config_roi(recognizer):
+    # PUT /cameras/<id>/roi with null stores '[]'
+    _apply(1, 'door', '[]')
+    assert recognizer.rois['door'] == []
+    assert background_processor.applied_rois == {1: '[]'}
+
+
+def test_invalid_roi_column_leaves_the_camera_unchanged(recognizer):
+    _apply(1, 'door', None)
+    _apply(1, 'door', '[[1, 2]]')
+    assert recognizer.rois['door'] == CONFIG_ROI
@@ -0,0 +1,155 @@
+import queue
+import time
+
+import numpy as np
+import pytest
+
+from capture import LatestFrameReader
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+class FakeSource:
+    """cv2.VideoCapture stand-in fed by the test: push() a value per frame, None for EOF."""
+
+    def __init__(self):
+        self.frames = queue.Queue()
+        self.opened = 0
+        self.buffers = []   # buffer passed to every read()
+
+    def open(self, source):
+        self.opened += 1
+        return self
+
+    def push(self, value):
+        self.frames.put(value)
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop_id, value):
+        return True
+
+    def read(self, image=None):
+        self.buffers.append(image)
+        try:
+            value = self.frames.get(timeout=0.5)
+        except queue.Empty:
+            value = None   # lets the reader thread notice stop()
+        if value is None:
+            return False, None
+        if image is None:
+            image = np.empty((2, 2), dtype=np.uint8)
+        image[:] = value
+        return True, image
+
+    def release(self):
+        pass
+
+
+@pytest.fixture
+def source():
+    return FakeSource()
+
+
+def _reader(source, **kwargs):
+    return LatestFrameReader('fake', open_capture=source.open, reconnect_seconds=0.1, **kwargs).start()
+
+
+def test_read_returns_the_newest_frame_and_counts_drops(source):
+    reader = _reader(source)
+    try:
+        for value in (1, 2, 3):
+            source.push(value)
+        _wait_for(lambda: reader.get_stats()['decoded'] == 3)
+        frame = reader.read(timeout=1)
+        assert frame.seq == 3 and frame.image[0, 0] == 3
+        stats = reader.get_stats()
+        assert stats['dropped'] == 2 and stats['delivered'] == 1
+        assert stats['drop_rate'] == pytest.approx(2 / 3)
+        assert stats['connected']
+    finally:
+        reader.stop()
+
+
+def test_read_waits_for_a_frame_it_has_not_returned(source):
+    reader = _reader(source)
+    try:
+        source.push(1)
+        assert reader.read(timeout=1).seq == 1
+        # Already returned: nothing new yet
+        assert reader.read(timeout=0.05) is None
+        source.push(2)
+        frame = reader.read(timeout=1)
+        assert frame.seq == 2 and frame.image[0, 0] == 2
+        assert reader.get_stats()['dropped'] == 0
+    finally:
+        reader.stop()
+
+
+def test_read_returns_none_after_stop(source):
+    reader = _reader(source)
+    reader.stop()
+    assert reader.read(timeout=0.05) is None
+
+
+def test_eof_reconnects_and_keeps_counting(source):
+    reader = _reader(source)
+    try:
+        source.push(1)
+        assert reader.read(timeout=1).seq == 1
+        source.push(None)   # short read / end of stream
+        _wait_for(lambda: source.opened == 2)
+        assert reader.get_stats()['reconnects'] == 1
+        source.push(7)
+        frame = reader.read(timeout=1)
+        assert frame.seq == 2 and frame.image[0, 0] == 7
+    finally:
+        reader.stop()
+
+
+def test_handled_frames_are_decoded_into_again(source):
+    reader = _reader(source, reuse_buffers=True)
+    try:
+        images = []
+        for value in range(1, 11):
+            source.push(value)
+            frame = reader.read(timeout=1)
+            # Valid until the next read()
+            assert frame.image[0, 0] == value
+            images.append(frame.image)
+        assert len({id(image) for image in images}) <= 3
+        # Only the first few reads had to allocate
+        assert sum(buffer is None for buffer in source.buffers) <= 3
+    finally:
+        reader.stop()
+
+
+def test_dropped_frames_are_decoded_into_again(source):
+    reader = _reader(source, reuse_buffers=True)
+    try:
+        for value in range(1, 11):
+            source.push(value)
+        _wait_for(lambda: reader.get_stats()['decoded'] == 10)
+        assert sum(buffer is None for buffer in source.buffers[:10]) <= 2
+        frame = reader.read(timeout=1)
+        assert frame.seq == 10 and frame.image[0, 0] == 10
+    finally:
+        reader.stop()
+
+
+def test_buffers_are_not_reused_by_default(source):
+    reader = _reader(source)
+    try:
+        for value in (1, 2, 3):
+            source.push(value)
+            reader.read(timeout=1)
+        assert all(buffer is None for buffer in source.buffers)
+    finally:
+        reader.stop()
@@ -0,0 +1,103 @@
+import sys
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+from deepface_embedder import DeepFaceEmbedder
+
+
+class FakeKerasModel:
+    """Embeds each image as its mean value per channel, scaled by 2."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, batch, training=False):
+        self.batches.append(batch.shape)
+        return batch.mean(axis=(1, 2)) * 2
+
+
+class FakeClient:
+    input_shape = (6, 4)   # (width, height), as DeepFace reports it
+
+    def __init__(self):
+        self.model = FakeKerasModel()
+
+
+@pytest.fixture
+def deepface(monkeypatch):
+    """Install a fake `deepface` package; DeepFaceEmbedder imports it lazily."""
+    client = FakeClient()
+    fake = types.SimpleNamespace(built=[], represented=[], client=client)
+
+    class DeepFace:
+        @staticmethod
+        def build_model(name):
+            fake.built.append(name)
+            return client
+
+        @staticmethod
+        def represent(img_path, model_name, enforce_detection, detector_backend):
+            fake.represented.append((img_path.shape, model_name, enforce_detection, detector_backend))
+            return [{'embedding': [1.0, 2.0]}]
+
+    def resize_image(img, target_size):
+        # DeepFace returns a (1, h, w, 3) batch
+        return cv2.resize(img, (target_size[1], target_size[0]))[None]
+
+    package = types.ModuleType('deepface')
+    package.DeepFace = DeepFace
+    modules = types.ModuleType('deepface.modules')
+    modules.preprocessing = types.SimpleNamespace(resize_image=resize_image)
+    package.modules = modules
+    monkeypatch.setitem(sys.modules, 'deepface', package)
+    monkeypatch.setitem(sys.modules, 'deepface.modules', modules)
+
+    def no_files(*args, **kwargs):
+        raise AssertionError("DeepFace embeddings must not write temp images")
+
+    monkeypatch.setattr(cv2, 'imwrite', no_files)
+    return fake
+
+
+def test_crops_are_embedded_in_one_batch(deepface):
+    embedder = DeepFaceEmbedder('Facenet')
+    crops = [np.full((20, 10, 3), value, dtype=np.uint8) for value in (0, 51, 255)]
+    embeddings = embedder.embed(crops)
+    # One warmup pass, then one pass for the whole batch at the model's (h, w)
+    assert deepface.client.model.batches == [(1, 4, 6, 3), (3, 4, 6, 3)]
+    assert embeddings.shape == (3, 3) and embeddings.dtype == np.float32
+    # Pixels are scaled to 0-1 as in DeepFace.represent
+    np.testing.assert_allclose(embeddings[:, 0], [0.0, 0.4, 2.0], atol=1e-5)
+
+
+def test_vgg_face_embeddings_are_normalized(deepface):
+    embeddings = DeepFaceEmbedder('VGG-Face').embed([np.full((8, 8, 3), 100, dtype=np.uint8)])
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), [1.0], atol=1e-6)
+
+
+def test_model_is_built_once(deepface):
+    embedder = DeepFaceEmbedder('Facenet')
+    assert embedder.warmup() and embedder.available
+    embedder.embed([np.zeros((8, 8, 3), dtype=np.uint8)])
+    embedder.embed([np.zeros((8, 8, 3), dtype=np.uint8)])
+    assert deepface.built == ['Facenet']
+    assert embedder.embed([]).shape == (0, 0)
+
+
+def test_embed_image_passes_the_array_to_deepface(deepface):
+    embedder = DeepFaceEmbedder('Facenet', detector_backend='ssd')
+    embedding = embedder.embed_image(np.zeros((30, 40, 3), dtype=np.uint8))
+    np.testing.assert_allclose(embedding, [1.0, 2.0])
+    assert deepface.represented == [((30, 40, 3), 'Facenet', False, 'ssd')]
+
+
+def test_missing_deepface_is_reported_once(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'deepface', None)
+    embedder = DeepFaceEmbedder()
+    assert not embedder.warmup()
+    assert embedder.embed_image(np.zeros((8, 8, 3), dtype=np.uint8)) is None
+    with pytest.raises(RuntimeError):
+        embedder.embed([np.zeros((8, 8, 3), dtype=np.uint8)])
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import detector_scrfd
+from detector_scrfd import DetectorBackend, _roi_regions
+
+
+class CropBackend(DetectorBackend):
+    """Finds one face at a fixed position in every crop and records crop sizes."""
+
+    name = 'crop'
+
+    def __init__(self, box=(10, 10, 40, 40)):
+        super().__init__()
+        self.box = box
+        self.shapes = []
+
+    def detect_many(self, images):
+        self.shapes.extend(image.shape[:2] for image in images)
+        kps = np.zeros((5, 2), dtype=np.float32)
+        return [([self.box], [kps], [0.9]) for _ in images]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(detector_scrfd, '_BACKENDS', {})
+    monkeypatch.setattr(detector_scrfd, '_AUTO_ORDER', [])
+    monkeypatch.setattr(detector_scrfd, '_STATS', {})
+    monkeypatch.setattr(detector_scrfd, '_PRIMARY', 'auto')
+    monkeypatch.setattr(detector_scrfd, '_FALLBACKS', None)
+    crop = CropBackend()
+    detector_scrfd.register_backend(crop)
+    return crop
+
+
+def test_pixel_rectangle():
+    assert _roi_regions([[100, 50, 300, 250]], 640, 480) == [(100, 50, 300, 250, None)]
+
+
+def test_fraction_rectangle_is_scaled_to_the_frame():
+    assert _roi_regions([[0.25, 0.5, 0.75, 1.0]], 640, 480) == [(160, 240, 480, 480, None)]
+
+
+def test_polygon_uses_its_bounding_box():
+    (region,) = _roi_regions([[[100, 50], [300, 80], [200, 250]]], 640, 480)
+    assert region[:4] == (100, 50, 300, 250)
+    assert region[4].shape == (3, 2)
+
+
+def test_fraction_polygon_is_scaled_to_the_frame():
+    (region,) = _roi_regions([[[0.0, 0.0], [0.5, 0.0], [0.5, 0.5]]], 640, 480)
+    assert region[:4] == (0, 0, 320, 240)
+    np.testing.assert_allclose(region[4], [[0, 0], [320, 0], [320, 240]])
+
+
+def test_rectangles_are_clipped_to_the_frame():
+    assert _roi_regions([[-50, -20, 700, 500]], 640, 480) == [(0, 0, 640, 480, None)]
+
+
+def test_invalid_and_tiny_rois_are_dropped():
+    assert _roi_regions([[1, 2, 3], [[0, 0], [10, 10]], [100, 100, 104, 200], [700, 0, 800, 100]], 640, 480) == []
+
+
+def test_boxes_are_mapped_back_to_frame_coordinates(backend):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    boxes, landmarks = detector_scrfd.detect_faces_with_landmarks(frame, rois=[[100, 50, 300, 250]])
+    assert backend.shapes == [(200, 200)]   # only the ROI is searched
+    assert boxes == [(110, 60, 140, 90)]
+    np.testing.assert_allclose(landmarks[0], np.tile([100, 50], (5, 1)))
+
+
+def test_faces_outside_the_polygon_are_dropped(backend):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    # The face (center 25, 25 in the crop) lies in the bounding box, not in the triangle
+    triangle = [[300, 0], [300, 200], [100, 200]]
+    assert detector_scrfd.detect_faces(frame, rois=[triangle]) == []
+    inside = [[0, 0], [200, 0], [0, 200]]
+    assert detector_scrfd.detect_faces(frame, rois=[inside]) == [(10, 10, 40, 40)]
+
+
+def test_overlapping_rois_report_a_face_once(backend):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    boxes = detector_scrfd.detect_faces(frame, rois=[[100, 100, 300, 300], [100, 100, 200, 200]])
+    assert len(backend.shapes) == 2
+    assert boxes == [(110, 110, 140, 140)]
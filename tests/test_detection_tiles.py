@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+import detector_scrfd
+from detector_scrfd import DetectorBackend, _nms, _tile_crops, _tile_layout, _tile_starts
+
+
+class BrightBackend(DetectorBackend):
+    """Reports the bright pixels of each image as one face, like a detector
+    would see the part of a face that falls inside its crop."""
+
+    name = 'bright'
+    input_size = (100, 100)
+
+    def __init__(self):
+        super().__init__()
+        self.shapes = []
+
+    def detect_many(self, images):
+        outputs = []
+        for image in images:
+            self.shapes.append(image.shape[:2])
+            ys, xs = np.nonzero(image[:, :, 0] > 128)
+            if not len(xs):
+                outputs.append(([], [], []))
+                continue
+            box = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+            # Smaller boxes score higher, so NMS alone would keep a cut-off face
+            score = 1.0 / ((box[2] - box[0]) * (box[3] - box[1]))
+            outputs.append(([box], [np.zeros((5, 2), dtype=np.float32)], [score]))
+        return outputs
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(detector_scrfd, '_BACKENDS', {})
+    monkeypatch.setattr(detector_scrfd, '_AUTO_ORDER', [])
+    monkeypatch.setattr(detector_scrfd, '_STATS', {})
+    monkeypatch.setattr(detector_scrfd, '_PRIMARY', 'auto')
+    monkeypatch.setattr(detector_scrfd, '_FALLBACKS', None)
+    bright = BrightBackend()
+    detector_scrfd.register_backend(bright)
+    return bright
+
+
+def _frame_with_face(x1, y1, x2, y2, w=250, h=100):
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    frame[y1:y2, x1:x2] = 255
+    return frame
+
+
+def test_tile_layout_defaults_to_the_native_size():
+    assert _tile_layout(True) == (640, 640, 160, True)
+    assert _tile_layout(True, (320, 240)) == (320, 240, 60, True)
+    assert _tile_layout(False) is None and _tile_layout(None) is None
+
+
+def test_tile_layout_sizes_and_overlap():
+    assert _tile_layout(512) == (512, 512, 128, True)
+    assert _tile_layout((400, 300)) == (400, 300, 75, True)
+    assert _tile_layout({'SIZE': 400, 'OVERLAP': 50, 'FULL_FRAME': False}) == (400, 400, 50, False)
+    assert _tile_layout({'overlap': 0.5}, (200, 100)) == (200, 100, 50, True)
+    # Overlap can not reach the tile size
+    assert _tile_layout({'size': 100, 'overlap': 500}) == (100, 100, 99, True)
+
+
+def test_tile_starts_cover_the_length_with_overlap():
+    assert _tile_starts(80, 100, 25) == [0]
+    starts = _tile_starts(250, 100, 25)
+    assert starts[0] == 0 and starts[-1] == 150
+    assert all(b - a <= 75 for a, b in zip(starts, starts[1:]))
+
+
+def test_tile_crops_flag_inner_edges():
+    crops = _tile_crops((10, 20, 260, 120, None), (100, 100, 25, False))
+    assert [crop[:4] for crop in crops] == [(10, 20, 110, 120), (85, 20, 185, 120), (160, 20, 260, 120)]
+    assert [crop[5] for crop in crops] == [(False, False, True, False), (True, False, True, False),
+                                           (True, False, False, False)]
+
+
+def test_tile_crops_add_a_full_frame_pass():
+    crops = _tile_crops((0, 0, 250, 250, None), (100, 100, 25, True))
+    assert len(crops) == 3 * 3 + 1
+    assert crops[-1][:4] == (0, 0, 250, 250) and not any(crops[-1][5])
+    # Inner tiles touch the region on no side
+    assert crops[4][5] == (True, True, True, True)
+
+
+def test_region_that_fits_one_tile_is_not_split():
+    assert _tile_crops((0, 0, 90, 90, None), (100, 100, 25, True)) == [(0, 0, 90, 90, None, (False,) * 4)]
+    assert _tile_crops((0, 0, 90, 90, None), None) == [(0, 0, 90, 90, None, (False,) * 4)]
+
+
+def test_nms_keeps_the_best_of_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60], [0, 0, 10, 10]])
+    scores = np.array([0.5, 0.9, 0.7, 0.1])
+    assert _nms(boxes, scores).tolist() == [1, 2]
+    assert _nms(boxes, scores, iou_threshold=0.99).tolist() == [1, 2, 0]
+    assert _nms(np.zeros((0, 4)), np.zeros(0)).tolist() == []
+
+
+def test_tiles_map_boxes_back_to_frame_coordinates(backend):
+    frame = _frame_with_face(200, 30, 230, 60)
+    boxes, landmarks = detector_scrfd.detect_faces_with_landmarks(frame, tiles={'overlap': 25, 'full_frame': False})
+    assert backend.shapes == [(100, 100)] * 3   # tiled at the backend's native size, one batch
+    assert boxes == [(200, 30, 230, 60)]
+    np.testing.assert_allclose(landmarks[0], np.tile([150, 0], (5, 1)))
+
+
+def test_face_on_a_seam_is_reported_once(backend):
+    # Spans x=90..110: whole in the second tile (x 75-175), cut off by the first tile's edge at 100
+    frame = _frame_with_face(90, 30, 110, 60)
+    assert detector_scrfd.detect_faces(frame, tiles={'overlap': 25, 'full_frame': False}) == [(90, 30, 110, 60)]
+    assert detector_scrfd.detect_faces(frame, tiles={'overlap': 25}) == [(90, 30, 110, 60)]
+
+
+def test_face_in_the_overlap_seen_whole_by_two_tiles_is_merged(backend):
+    frame = _frame_with_face(80, 30, 95, 60)
+    boxes = detector_scrfd.detect_faces(frame, tiles={'overlap': 25, 'full_frame': False})
+    assert boxes == [(80, 30, 95, 60)]
+
+
+def test_small_frames_skip_tiling(backend):
+    frame = _frame_with_face(10, 10, 30, 30, w=90, h=90)
+    assert detector_scrfd.detect_faces(frame, tiles=True) == [(10, 10, 30, 30)]
+    assert backend.shapes == [(90, 90)]
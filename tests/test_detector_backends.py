@@ -0,0 +1,218 @@
+import numpy as np
+import pytest
+
+import detector_scrfd
+from detector_scrfd import DetectorBackend
+
+
+class FakeBackend(DetectorBackend):
+    """Finds `faces` boxes in every image, or raises when `error` is set."""
+
+    def __init__(self, name, faces=1, error=None, usable=True):
+        super().__init__()
+        self.name = name
+        self.faces = faces
+        self.error = error
+        self.usable = usable
+        self.loads = 0
+        self.calls = 0
+
+    def _load(self):
+        self.loads += 1
+        return self.usable
+
+    def detect_many(self, images):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        box = (10, 10, 50, 50)
+        return [([box] * self.faces, [None] * self.faces, [0.9] * self.faces) for _ in images]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An empty backend registry; restored after the test."""
+    monkeypatch.setattr(detector_scrfd, '_BACKENDS', {})
+    monkeypatch.setattr(detector_scrfd, '_AUTO_ORDER', [])
+    monkeypatch.setattr(detector_scrfd, '_STATS', {})
+    monkeypatch.setattr(detector_scrfd, '_PRIMARY', 'auto')
+    monkeypatch.setattr(detector_scrfd, '_FALLBACKS', None)
+
+    def register(*backends, primary='auto', fallbacks=None):
+        for backend in backends:
+            detector_scrfd.register_backend(backend)
+        detector_scrfd._PRIMARY = primary
+        detector_scrfd._FALLBACKS = fallbacks
+        return backends
+    return register
+
+
+def _image():
+    return np.zeros((120, 160, 3), dtype=np.uint8)
+
+
+def test_fallback_runs_only_when_the_primary_raises(registry):
+    primary, fallback = registry(FakeBackend('a', error=RuntimeError("boom")), FakeBackend('b', faces=2))
+    boxes, _ = detector_scrfd.detect_faces_with_landmarks(_image())
+    assert len(boxes) == 2
+    assert primary.calls == 1 and fallback.calls == 1
+    stats = detector_scrfd.get_backend_stats()
+    assert stats['a']['errors'] == 1 and stats['a']['calls'] == 0
+    assert stats['b']['calls'] == 1 and stats['b']['faces'] == 2
+
+
+def test_no_faces_is_not_a_failure(registry):
+    primary, fallback = registry(FakeBackend('a', faces=0), FakeBackend('b', faces=2))
+    assert detector_scrfd.detect_faces(_image()) == []
+    assert primary.calls == 1
+    assert fallback.calls == 0 and fallback.loads == 0
+
+
+def test_fallbacks_load_lazily(registry):
+    primary, fallback = registry(FakeBackend('a'), FakeBackend('b'))
+    chain = detector_scrfd._backend_chain()
+    assert next(chain) is primary
+    assert fallback.loads == 0
+    assert next(chain) is fallback
+    assert fallback.loads == 1
+    detector_scrfd.detect_faces(_image())
+    assert primary.loads == 1 and fallback.loads == 1   # loaded once, then cached
+
+
+def test_auto_skips_unusable_backends_and_loads_only_until_one_works(registry):
+    broken, working, unused = registry(FakeBackend('a', usable=False), FakeBackend('b'), FakeBackend('c'))
+    assert len(detector_scrfd.detect_faces(_image())) == 1
+    assert broken.loads == 1 and broken.calls == 0
+    assert working.calls == 1
+    assert unused.loads == 0
+
+
+def test_configured_primary_and_fallbacks(registry):
+    a, b, c = registry(FakeBackend('a'), FakeBackend('b', error=RuntimeError("boom")), FakeBackend('c'),
+                       primary='b', fallbacks=['c'])
+    assert [backend.name for backend in detector_scrfd._backend_chain()] == ['b', 'c']
+    detector_scrfd.detect_faces(_image())
+    assert (a.calls, b.calls, c.calls) == (0, 1, 1)
+    assert a.loads == 0
+    # A per-call backend replaces the configured primary
+    assert [backend.name for backend in detector_scrfd._backend_chain('a')] == ['a', 'c']
+
+
+def test_every_backend_failing_returns_no_faces(registry):
+    registry(FakeBackend('a', error=RuntimeError("boom")), FakeBackend('b', error=ValueError("bad")))
+    outputs = detector_scrfd.detect_faces_batch([_image(), _image()])
+    assert outputs == [([], [], []), ([], [], [])]
+
+
+def test_device_argument_is_ignored(registry):
+    registry(FakeBackend('a'))
+    image = _image()
+    assert detector_scrfd.detect_faces(image, device='cuda') == detector_scrfd.detect_faces(image)
+
+
+class FakeDnnNet:
+    """Returns canned SSD rows of [image_id, label, confidence, x1, y1, x2, y2]."""
+
+    def __init__(self, rows):
+        self.rows = np.asarray(rows, dtype=np.float32).reshape(1, 1, -1, 7)
+        self.blobs = []
+
+    def setInput(self, blob):
+        self.blobs.append(blob.shape)
+
+    def forward(self):
+        return self.rows
+
+
+def test_dnn_runs_every_image_in_one_forward_pass():
+    backend = detector_scrfd.DnnBackend(confidence=0.5)
+    backend.net = FakeDnnNet([[0, 1, 0.9, 0.1, 0.2, 0.3, 0.4],
+                              [1, 1, 0.8, 0.5, 0.5, 1.2, 1.0],
+                              [1, 1, 0.3, 0.0, 0.0, 0.5, 0.5],   # below the confidence
+                              [2, 1, 0.7, 0.0, 0.0, 0.5, 0.5]])
+    images = [np.zeros((100, 200, 3), dtype=np.uint8), np.zeros((300, 300, 3), dtype=np.uint8),
+              np.zeros((50, 50, 3), dtype=np.uint8)]
+    outputs = backend.detect_many(images)
+    assert backend.net.blobs == [(3, 3, 300, 300)]
+    # Boxes are scaled to each image's own size and clipped to it
+    assert outputs[0] == ([(20, 20, 60, 40)], [None], [pytest.approx(0.9)])
+    assert outputs[1][0] == [(150, 150, 300, 300)]
+    assert outputs[2][0] == [(0, 0, 25, 25)]
+
+
+def test_dnn_confidence_comes_from_config(monkeypatch):
+    monkeypatch.setattr(detector_scrfd, '_BACKENDS', dict(detector_scrfd._BACKENDS))
+    monkeypatch.setattr(detector_scrfd, '_PRIMARY', detector_scrfd._PRIMARY)
+    monkeypatch.setattr(detector_scrfd, '_FALLBACKS', detector_scrfd._FALLBACKS)
+    backend = detector_scrfd._BACKENDS['dnn'] = detector_scrfd.DnnBackend()
+    detector_scrfd.configure_detection({'DNN': {'CONFIDENCE': 0.85}})
+    assert backend.confidence == 0.85
+    backend.net = FakeDnnNet([[0, 1, 0.9, 0, 0, 0.5, 0.5], [0, 1, 0.8, 0.5, 0.5, 1, 1]])
+    (boxes, _, _), = backend.detect_many([np.zeros((100, 100, 3), dtype=np.uint8)])
+    assert boxes == [(0, 0, 50, 50)]
+
+
+def test_dnn_network_is_parsed_once(monkeypatch, tmp_path):
+    proto, weights = tmp_path / 'deploy.prototxt', tmp_path / 'res10.caffemodel'
+    proto.write_text('')
+    weights.write_bytes(b'')
+    parsed = []
+    # raising=False: OpenCV 5 builds no longer ship the Caffe importer
+    monkeypatch.setattr(detector_scrfd.cv2.dnn, 'readNetFromCaffe',
+                        lambda p, w: parsed.append((p, w)) or FakeDnnNet([[0, 1, 0.9, 0, 0, 1, 1]]), raising=False)
+    backend = detector_scrfd.DnnBackend(proto=str(proto), weights=str(weights))
+    for _ in range(3):
+        assert backend.load()
+        backend.detect_many([np.zeros((10, 10, 3), dtype=np.uint8)])
+    assert parsed == [(str(proto), str(weights))]
+    backend.release()
+    assert backend.load() and len(parsed) == 2
+
+
+class FakeYunet:
+    """Stands in for cv2.FaceDetectorYN; returns rows of [x, y, w, h, 5 x (x, y), score]."""
+
+    def __init__(self, rows):
+        self.rows = np.asarray(rows, dtype=np.float32) if rows else None
+        self.input_sizes = []
+
+    def setInputSize(self, size):
+        self.input_sizes.append(size)
+
+    def detect(self, image):
+        assert (image.shape[1], image.shape[0]) == self.input_sizes[-1]
+        return 1, self.rows
+
+
+def _yunet_row(x, y, w, h, score):
+    landmarks = [x + w * 0.3, y + h * 0.4, x + w * 0.7, y + h * 0.4, x + w * 0.5, y + h * 0.6,
+                 x + w * 0.35, y + h * 0.8, x + w * 0.65, y + h * 0.8]
+    return [x, y, w, h] + landmarks + [score]
+
+
+def test_yunet_returns_boxes_landmarks_and_scores():
+    backend = detector_scrfd.YunetBackend()
+    backend.detector = FakeYunet([_yunet_row(10, 20, 40, 50, 0.95), _yunet_row(-5, 70, 30, 40, 0.7)])
+    (boxes, landmarks, scores), = backend.detect_many([np.zeros((100, 120, 3), dtype=np.uint8)])
+    assert backend.detector.input_sizes == [(120, 100)]
+    # (x, y, w, h) becomes (x1, y1, x2, y2), clipped to the frame
+    assert boxes == [(10, 20, 50, 70), (0, 70, 25, 100)]
+    assert scores == [pytest.approx(0.95), pytest.approx(0.7)]
+    assert landmarks[0].shape == (5, 2) and landmarks[0].dtype == np.float32
+    # Same keypoint order as SCRFD: eyes, nose, mouth corners
+    np.testing.assert_allclose(landmarks[0], [[22, 40], [38, 40], [30, 50], [24, 60], [36, 60]])
+
+
+def test_yunet_downscales_to_the_input_size_and_maps_back():
+    backend = detector_scrfd.YunetBackend()
+    backend.detector = FakeYunet([_yunet_row(10, 20, 40, 50, 0.9)])
+    (boxes, landmarks, _), = backend.detect_many([np.zeros((400, 640, 3), dtype=np.uint8)], input_size=(320, 320))
+    assert backend.detector.input_sizes == [(320, 200)]
+    assert boxes == [(20, 40, 100, 140)]
+    np.testing.assert_allclose(landmarks[0][0], [44, 80])
+
+
+def test_yunet_without_faces():
+    backend = detector_scrfd.YunetBackend()
+    backend.detector = FakeYunet(None)
+    assert backend.detect_many([np.zeros((10, 10, 3), dtype=np.uint8)]) == [([], [], [])]
@@ -0,0 +1,172 @@
+import os
+
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+
+def _image(root, rel_path, content=b'image'):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return str(tmp_path / 'dataset')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'cache'), 'arcface', dim=4)
+    yield cache
+    cache._conn.close()
+
+
+def test_unknown_image_is_a_miss(cache, dataset):
+    path = _image(dataset, 'alice/1.jpg')
+    assert cache.lookup(path, 'alice/1.jpg') == (False, None)
+    assert cache.stats['misses'] == 1
+
+
+def test_put_then_lookup_hits_without_hashing(cache, dataset):
+    path = _image(dataset, 'alice/1.jpg')
+    cache.put(path, 'alice/1.jpg', np.arange(4, dtype=np.float32))
+    hit, vector = cache.lookup(path, 'alice/1.jpg')
+    assert hit
+    np.testing.assert_array_equal(vector, np.arange(4))
+    assert cache.stats['hashed'] == 0
+
+
+def test_no_face_result_is_cached(cache, dataset):
+    path = _image(dataset, 'alice/blurry.jpg')
+    cache.put(path, 'alice/blurry.jpg', None)
+    assert cache.lookup(path, 'alice/blurry.jpg') == (True, None)
+
+
+def test_touched_but_unchanged_image_is_a_hit(cache, dataset):
+    path = _image(dataset, 'alice/1.jpg')
+    cache.put(path, 'alice/1.jpg', np.ones(4, dtype=np.float32))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.lookup(path, 'alice/1.jpg')[0]
+    assert cache.stats['hashed'] == 1
+    # The new mtime was stored, so the next lookup does not hash again
+    assert cache.lookup(path, 'alice/1.jpg')[0]
+    assert cache.stats['hashed'] == 1
+
+
+def test_changed_content_is_a_miss(cache, dataset):
+    path = _image(dataset, 'alice/1.jpg', b'first')
+    cache.put(path, 'alice/1.jpg', np.ones(4, dtype=np.float32))
+    st = os.stat(path)
+    # Same size and a new mtime: only the hash tells them apart
+    _image(dataset, 'alice/1.jpg', b'other')
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.lookup(path, 'alice/1.jpg') == (False, None)
+
+
+def test_changed_size_is_a_miss(cache, dataset):
+    path = _image(dataset, 'alice/1.jpg', b'first')
+    cache.put(path, 'alice/1.jpg', np.ones(4, dtype=np.float32))
+    _image(dataset, 'alice/1.jpg', b'a longer image')
+    assert cache.lookup(path, 'alice/1.jpg') == (False, None)
+
+
+def test_flush_persists_across_reopen(tmp_path, dataset):
+    path = _image(dataset, 'alice/1.jpg')
+    cache = EmbeddingCache(str(tmp_path / 'cache'), 'arcface', dim=4)
+    cache.put(path, 'alice/1.jpg', np.full(4, 2.0, dtype=np.float32))
+    cache.close()
+
+    reopened = EmbeddingCache(str(tmp_path / 'cache'), 'arcface', dim=4)
+    hit, vector = reopened.lookup(path, 'alice/1.jpg')
+    assert hit
+    np.testing.assert_array_equal(vector, np.full(4, 2.0))
+    reopened.close()
+
+
+def test_other_model_key_does_not_share_entries(tmp_path, dataset):
+    path = _image(dataset, 'alice/1.jpg')
+    cache = EmbeddingCache(str(tmp_path / 'cache'), 'arcface', dim=4)
+    cache.put(path, 'alice/1.jpg', np.ones(4, dtype=np.float32))
+    cache.close()
+    other = EmbeddingCache(str(tmp_path / 'cache'), 'VGG-Face', dim=4)
+    assert not other.lookup(path, 'alice/1.jpg')[0]
+    other.close()
+
+
+def test_vector_of_another_size_is_not_cached(cache, dataset):
+    path = _image(dataset, 'alice/1.jpg')
+    cache.put(path, 'alice/1.jpg', np.ones(3, dtype=np.float32))
+    assert not cache.lookup(path, 'alice/1.jpg')[0]
+
+
+def test_forget_removes_only_that_person(cache, dataset):
+    for rel_path in ('a_b/1.jpg', 'a_b/2.jpg', 'axb/1.jpg', 'a_bc/1.jpg', 'a%b/1.jpg'):
+        cache.put(_image(dataset, rel_path), rel_path, np.ones(4, dtype=np.float32))
+    cache.forget('a_b')
+    assert not cache.lookup(os.path.join(dataset, 'a_b/1.jpg'), 'a_b/1.jpg')[0]
+    assert not cache.lookup(os.path.join(dataset, 'a_b/2.jpg'), 'a_b/2.jpg')[0]
+    # '_' and '%' are not wildcards, and a longer name with the same prefix is another person
+    for rel_path in ('axb/1.jpg', 'a_bc/1.jpg', 'a%b/1.jpg'):
+        assert cache.lookup(os.path.join(dataset, rel_path), rel_path)[0], rel_path
+
+
+def test_compact_drops_unreferenced_rows(cache, dataset):
+    paths = {name: _image(dataset, f"{name}/1.jpg") for name in ('alice', 'bob', 'carol')}
+    for i, (name, path) in enumerate(paths.items()):
+        cache.put(path, f"{name}/1.jpg", np.full(4, float(i), dtype=np.float32))
+    cache.flush()
+    assert os.path.getsize(cache.vectors_path) == 3 * 4 * 4
+
+    cache.forget('alice')
+    cache.forget('bob')
+    cache.flush()   # compacts: only a third of the rows is still referenced
+    assert os.path.getsize(cache.vectors_path) == 1 * 4 * 4
+    hit, vector = cache.lookup(paths['carol'], 'carol/1.jpg')
+    assert hit
+    np.testing.assert_array_equal(vector, np.full(4, 2.0))
+
+
+def test_rebuild_only_embeds_changed_images(tmp_path, monkeypatch):
+    pytest.importorskip('torch')  # precompute_embeddings imports src/utils.py, which imports torch
+    from PIL import Image
+    import precompute_embeddings
+
+    dataset_dir = tmp_path / 'dataset'
+    paths = []
+    for i, name in enumerate(('alice', 'bob', 'carol')):
+        (dataset_dir / name).mkdir(parents=True)
+        path = str(dataset_dir / name / '1.png')
+        Image.new('RGB', (8, 8), (i * 40, 0, 0)).save(path)
+        paths.append(path)
+    config = {'PATHS': {'DATASET_DIR': str(dataset_dir)}, 'TRAINING': {'WORKERS': 2, 'BATCH_SIZE': 2}}
+
+    embedded = []
+
+    def fake_embed(images, deepface_embedder):
+        embedded.extend(int(image[0, 0, 2]) for image in images)   # red channel, BGR order
+        return [np.full(4, float(image[0, 0, 2]), dtype=np.float32) for image in images]
+
+    monkeypatch.setattr(precompute_embeddings, '_init_embedders', lambda config: None)
+    monkeypatch.setattr(precompute_embeddings, '_embed_images', fake_embed)
+
+    def build():
+        cache = EmbeddingCache(str(tmp_path / 'cache'), 'arcface', dim=4)
+        results = dict(precompute_embeddings._iter_embeddings(paths, config, cache))
+        cache.close()
+        return results
+
+    first = build()
+    assert sorted(embedded) == [0, 40, 80]
+    embedded.clear()
+
+    Image.new('RGB', (8, 8), (200, 0, 0)).save(paths[1])
+    second = build()
+    assert embedded == [200]
+    np.testing.assert_array_equal(second[0], first[0])
+    np.testing.assert_array_equal(second[1], np.full(4, 200.0))
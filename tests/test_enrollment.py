@@ -0,0 +1,153 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')  # src/utils.py imports torch at module level
+
+import precompute_embeddings
+from gallery import load_gallery
+from gallery_helpers import best_label, gallery_config, publish_multi, unit
+from utils import load_person_stats
+
+
+def test_remove_person_renumbers_later_ids(three_people):
+    config = three_people
+    assert precompute_embeddings.remove_person('alice', config)
+    gallery = load_gallery(config)
+    assert list(gallery.labels) == ['bob', 'carol']
+    np.testing.assert_array_equal(np.sort(gallery.row_ids), [0, 1, 1])
+    assert best_label(gallery, [0, 1, 0, 0]) == 'bob'
+    assert best_label(gallery, [0, 0, 1, 0.05]) == 'carol'
+    assert len(gallery.person_vectors(1)) == 2
+    assert not precompute_embeddings.remove_person('alice', config)
+
+
+def test_enroll_images_adds_rows_for_new_and_existing_people(three_people, monkeypatch):
+    config = three_people
+    new_vectors = {'dave': unit([0, 0, 0, 1]), 'bob': unit([0, 1, 0, 0.2])}
+
+    def fake_iter_embeddings(image_paths, config, cache=None, workers=None, batch_size=None):
+        # image_paths carry the person name here; no images are decoded
+        for i, name in enumerate(image_paths):
+            yield i, new_vectors[name][0]
+
+    monkeypatch.setattr(precompute_embeddings, '_iter_embeddings', fake_iter_embeddings)
+    assert precompute_embeddings.enroll_images('dave', ['dave'], config) == 1
+    assert precompute_embeddings.enroll_images('bob', ['bob'], config) == 1
+
+    gallery = load_gallery(config)
+    assert list(gallery.labels) == ['alice', 'bob', 'carol', 'dave']
+    np.testing.assert_array_equal(np.bincount(gallery.row_ids), [2, 2, 2, 1])
+    assert best_label(gallery, [0, 0, 0, 1]) == 'dave'
+    assert best_label(gallery, [0, 1, 0, 0.2]) == 'bob'
+    assert best_label(gallery, [1, 0, 0, 0]) == 'alice'
+
+
+def test_removing_the_last_person_publishes_an_empty_gallery(tmp_path):
+    config = gallery_config(tmp_path)
+    publish_multi(config, ['alice'], unit([1, 0, 0, 0]), [0])
+    assert precompute_embeddings.remove_person('alice', config)
+    gallery = load_gallery(config)
+    assert gallery.version == 2 and len(gallery) == 0
+    assert best_label(gallery, [1, 0, 0, 0]) is None
+
+
+class FakeArcFace:
+    dim = 4
+    model_file = 'w600k_r50.onnx'
+
+
+@pytest.fixture
+def mean_gallery(tmp_path, monkeypatch):
+    """Mean-mode gallery of alice and bob built from real files, with the embedding cache on.
+
+    Each image file holds the index of the unit vector it embeds to.
+    """
+    config = gallery_config(tmp_path, mode='mean')
+    config['EMBEDDING_CACHE'] = {'ENABLED': True}
+
+    def decode(image_path, max_side=0):
+        with open(image_path) as f:
+            return np.array([int(f.read())])
+
+    def embed(images, deepface_embedder):
+        return [np.eye(4, dtype=np.float32)[int(image[0])] for image in images]
+
+    monkeypatch.setattr(precompute_embeddings, 'load_config', lambda: config)
+    monkeypatch.setattr(precompute_embeddings, '_init_embedders', lambda config: None)
+    monkeypatch.setattr(precompute_embeddings, '_ARCFACE_EMBEDDER', FakeArcFace())
+    monkeypatch.setattr(precompute_embeddings, '_decode_image', decode)
+    monkeypatch.setattr(precompute_embeddings, '_embed_images', embed)
+    for name, axis in (('alice', 0), ('bob', 1)):
+        _write_image(config, name, '0.jpg', axis)
+    assert precompute_embeddings.precompute_embeddings() == 2
+    return config
+
+
+def _write_image(config, name, filename, axis):
+    person_dir = os.path.join(config['PATHS']['DATASET_DIR'], name)
+    os.makedirs(person_dir, exist_ok=True)
+    path = os.path.join(person_dir, filename)
+    with open(path, 'w') as f:
+        f.write(str(axis))
+    return path
+
+
+def _stats(config):
+    names, sums, counts = load_person_stats(config)
+    return dict(zip(names, counts.tolist())), dict(zip(names, sums))
+
+
+def test_mean_enroll_updates_the_persons_mean_in_place(mean_gallery):
+    config = mean_gallery
+    path = _write_image(config, 'alice', '1.jpg', 2)
+    assert precompute_embeddings.enroll_images('alice', [path], config) == 1
+
+    counts, sums = _stats(config)
+    assert counts == {'alice': 2, 'bob': 1}
+    np.testing.assert_allclose(sums['alice'], [1, 0, 1, 0])
+    gallery = load_gallery(config)
+    assert gallery.index.ntotal == 2
+    # The new mean lies between alice's two images
+    assert best_label(gallery, [1, 0, 1, 0]) == 'alice'
+    assert best_label(gallery, [0, 1, 0, 0]) == 'bob'
+
+
+def test_mean_enroll_of_a_new_person_adds_one_row(mean_gallery):
+    config = mean_gallery
+    path = _write_image(config, 'carol', '0.jpg', 3)
+    assert precompute_embeddings.enroll_images('carol', [path], config) == 1
+    gallery = load_gallery(config)
+    assert list(gallery.labels) == ['alice', 'bob', 'carol'] and gallery.index.ntotal == 3
+    assert best_label(gallery, [0, 0, 0, 1]) == 'carol'
+
+
+def test_uploading_the_same_images_again_does_not_count_them_twice(mean_gallery):
+    config = mean_gallery
+    new = _write_image(config, 'alice', '1.jpg', 2)
+    assert precompute_embeddings.enroll_images('alice', [new], config) == 1
+    version = load_gallery(config).version
+    existing = os.path.join(config['PATHS']['DATASET_DIR'], 'alice', '0.jpg')
+    assert precompute_embeddings.enroll_images('alice', [existing, new], config) == 0
+
+    counts, sums = _stats(config)
+    assert counts == {'alice': 2, 'bob': 1}
+    np.testing.assert_allclose(sums['alice'], [1, 0, 1, 0])
+    # Nothing new, so no new version either
+    assert load_gallery(config).version == version
+
+
+def test_mean_remove_person_keeps_everyone_else(mean_gallery):
+    config = mean_gallery
+    assert precompute_embeddings.remove_person('alice', config)
+    counts, sums = _stats(config)
+    assert counts == {'bob': 1}
+    gallery = load_gallery(config)
+    assert list(gallery.labels) == ['bob'] and gallery.index.ntotal == 1
+    assert best_label(gallery, [0, 1, 0, 0]) == 'bob'
+
+    # The removed person's images are forgotten, so enrolling them again counts them
+    path = os.path.join(config['PATHS']['DATASET_DIR'], 'alice', '0.jpg')
+    assert precompute_embeddings.enroll_images('alice', [path], config) == 1
+    assert _stats(config)[0] == {'bob': 1, 'alice': 1}
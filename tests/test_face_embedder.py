@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import face_embedder
+from face_embedder import ArcFaceEmbedder
+
+
+class FakeSession:
+    """Returns each face's first normalized pixel (R, G, B) as its embedding."""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, output_names, feeds):
+        (batch,) = feeds.values()
+        self.batches.append(batch.shape)
+        return [batch[:, :, 0, 0].copy()]
+
+
+class FakeRecModel:
+
+    def __init__(self, batch_dim=None):
+        self.input_size = (112, 112)
+        self.input_mean = 127.5
+        self.input_std = 127.5
+        self.input_shape = [batch_dim, 3, 112, 112]
+        self.output_shape = [batch_dim, 512]
+        self.input_name = 'data'
+        self.output_names = ['fc1']
+        self.session = FakeSession()
+
+
+@pytest.fixture(autouse=True)
+def no_insightface(monkeypatch):
+    # The identity transform keeps the top-left 112x112 of each image
+    monkeypatch.setattr(face_embedder, '_INSIGHT_AVAILABLE', True)
+    monkeypatch.setattr(face_embedder, 'estimate_norm',
+                        lambda kps, size: np.array([[1, 0, 0], [0, 1, 0]], dtype=np.float32), raising=False)
+
+
+def _faces(*colors):
+    """One (bgr_image, kps) pair per BGR color."""
+    kps = np.zeros((5, 2), dtype=np.float32)
+    return [(np.full((120, 120, 3), color, dtype=np.uint8), kps) for color in colors]
+
+
+def _expected(*colors):
+    # BGR in, RGB out, normalized to [-1, 1]
+    return (np.array(colors, dtype=np.float32)[:, ::-1] - 127.5) / 127.5
+
+
+def test_embeds_a_batch_in_one_session_call_in_input_order():
+    model = FakeRecModel()
+    embedder = ArcFaceEmbedder(model)
+    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (10, 20, 30), (127, 127, 127)]
+    embeddings = embedder.embed(_faces(*colors))
+    assert model.session.batches == [(5, 3, 112, 112)]
+    assert embeddings.shape == (5, 3) and embeddings.dtype == np.float32
+    np.testing.assert_allclose(embeddings, _expected(*colors), atol=1e-6)
+    assert embedder.dim == 512
+
+
+def test_fixed_batch_models_run_in_padded_chunks():
+    model = FakeRecModel(batch_dim=2)
+    embedder = ArcFaceEmbedder(model)
+    colors = [(0, 0, 0), (50, 50, 50), (100, 100, 100), (150, 150, 150), (200, 200, 200)]
+    embeddings = embedder.embed(_faces(*colors))
+    assert model.session.batches == [(2, 3, 112, 112)] * 3
+    np.testing.assert_allclose(embeddings, _expected(*colors), atol=1e-6)
+
+
+def test_buffers_are_reused_between_batches():
+    embedder = ArcFaceEmbedder(FakeRecModel())
+    embedder.embed(_faces((1, 2, 3), (4, 5, 6)))
+    aligned, blob = embedder._buffers(2)
+    first = embedder.embed(_faces((7, 8, 9)))
+    assert embedder._buffers(1)[0] is aligned and embedder._buffers(1)[1] is blob
+    np.testing.assert_allclose(first, _expected((7, 8, 9)), atol=1e-6)
+    # Growing past the capacity allocates once for the larger batch
+    embedder.embed(_faces(*[(i, i, i) for i in range(20)]))
+    assert embedder._buffers(20)[0].shape[0] == 32
+
+
+def test_empty_batch():
+    model = FakeRecModel()
+    assert ArcFaceEmbedder(model).embed([]).shape == (0, 0)
+    assert model.session.batches == []
+
+
+def test_requires_insightface(monkeypatch):
+    monkeypatch.setattr(face_embedder, '_INSIGHT_AVAILABLE', False)
+    with pytest.raises(RuntimeError):
+        ArcFaceEmbedder(FakeRecModel())
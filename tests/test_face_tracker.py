@@ -0,0 +1,171 @@
+import numpy as np
+import pytest
+
+from face_tracker import FaceTracker, TrackedRecognizer, iou_matrix
+
+
+def _box(x, y=0, size=40):
+    return (x, y, x + size, y + size)
+
+
+class FakeRecognizer:
+    """Scripted detections and labels; records every detect/identify call."""
+
+    def __init__(self, boxes=None, labels=None):
+        self.boxes = boxes if boxes is not None else [_box(100, 100)]
+        self.labels = labels or {}
+        self.detections = 0
+        self.identified = []
+
+    def detect(self, frame, camera=None):
+        self.detections += 1
+        return list(self.boxes), [np.zeros((5, 2), dtype=np.float32)] * len(self.boxes)
+
+    def identify_faces(self, faces, cameras=None):
+        self.identified.append(len(faces))
+        return [(self.labels.get(box[0], "Unknown"), 0.9) for _, box, _ in faces]
+
+    @staticmethod
+    def pad_box(box, frame_shape, padding=0):
+        return box
+
+
+FRAME = np.zeros((480, 640, 3), dtype=np.uint8)
+
+
+def test_iou_matrix():
+    ious = iou_matrix(np.array([_box(0), _box(0)]), np.array([_box(0), _box(20), _box(100)]))
+    np.testing.assert_allclose(ious[0], [1.0, 20 * 40 / (2 * 1600 - 20 * 40), 0.0])
+    assert ious.shape == (2, 3)
+
+
+def test_detections_are_associated_by_iou():
+    tracker = FaceTracker(iou_threshold=0.3)
+    first = tracker.update(np.array([_box(0), _box(200)]))
+    ids = [track.track_id for track, _ in first]
+    tracker.predict()
+    # Both faces moved a little, listed in the other order, plus a new face far away
+    second = tracker.update(np.array([_box(205), _box(4), _box(400)]))
+    assert [d for _, d in second] == [0, 1, 2]
+    assert second[0][0].track_id == ids[1]
+    assert second[1][0].track_id == ids[0]
+    assert second[2][0].track_id not in ids
+
+
+def test_kalman_predicts_constant_motion():
+    tracker = FaceTracker()
+    for step in range(8):
+        tracker.predict()
+        tracker.update(np.array([_box(100 + 10 * step)]))
+    predicted = tracker.predict()[0]
+    # Next position: x1 = 180, within a couple of pixels once the velocity has converged
+    assert abs(predicted[0] - 180) < 3
+    assert abs((predicted[2] - predicted[0]) - 40) < 2
+
+
+def test_kalman_update_pulls_towards_the_detection():
+    tracker = FaceTracker()
+    tracker.update(np.array([_box(100)]))
+    tracker.predict()
+    tracker.update(np.array([_box(110)]))
+    x1 = tracker.boxes()[0][0]
+    assert 100 < x1 <= 110
+
+
+def test_tracks_expire_after_max_misses():
+    tracker = FaceTracker(max_misses=2)
+    tracker.update(np.array([_box(0)]))
+    for _ in range(2):
+        tracker.update(np.zeros((0, 4)))
+    assert len(tracker.tracks) == 1 and tracker.tracks[0].misses == 2
+    tracker.update(np.zeros((0, 4)))
+    assert tracker.tracks == []
+
+
+def test_detection_runs_every_n_frames_and_predicts_in_between():
+    recognizer = FakeRecognizer(labels={100: 'alice'})
+    tracked = TrackedRecognizer(recognizer, detect_every=3)
+    results = [tracked.recognize_face(FRAME) for _ in range(7)]
+    assert recognizer.detections == 3   # frames 1, 4 and 7
+    assert tracked.stats == {'frames': 7, 'detections': 3, 'faces': 3, 'embeddings': 2}
+    track_ids = {r[0]['track_id'] for r in results}
+    assert len(track_ids) == 1
+    assert all(r[0]['label'] == 'alice' for r in results)
+
+
+def test_prediction_frames_skip_tracks_missing_from_the_last_detection():
+    recognizer = FakeRecognizer()
+    tracked = TrackedRecognizer(recognizer, detect_every=2, max_misses=5)
+    tracked.recognize_face(FRAME)
+    recognizer.boxes = []
+    tracked.recognize_face(FRAME)
+    assert tracked.recognize_face(FRAME) == []   # detection: the face is gone
+    assert tracked.recognize_face(FRAME) == []   # prediction: track still alive but missed
+
+
+def test_identity_is_confirmed_then_refreshed():
+    recognizer = FakeRecognizer(labels={100: 'alice'})
+    tracked = TrackedRecognizer(recognizer, detect_every=1, confirm_hits=3, refresh_frames=10)
+    for _ in range(12):
+        tracked.recognize_face(FRAME)
+    # Frames 1-3 confirm the identity, then nothing until the refresh on frame 13
+    assert len(recognizer.identified) == 3
+    tracked.recognize_face(FRAME)
+    assert len(recognizer.identified) == 4
+
+
+def test_changing_label_resets_confirmation():
+    recognizer = FakeRecognizer(labels={100: 'alice'})
+    tracked = TrackedRecognizer(recognizer, detect_every=1, confirm_hits=2, refresh_frames=100)
+    tracked.recognize_face(FRAME)
+    recognizer.labels = {100: 'bob'}
+    tracked.recognize_face(FRAME)
+    track = tracked.tracker.tracks[0]
+    assert track.label == 'bob' and track.confirmations == 1
+    tracked.recognize_face(FRAME)
+    assert track.confirmations == 2
+    tracked.recognize_face(FRAME)
+    assert len(recognizer.identified) == 3
+
+
+def test_unknown_faces_are_retried_with_backoff():
+    recognizer = FakeRecognizer()
+    tracked = TrackedRecognizer(recognizer, detect_every=1, refresh_frames=6)
+    embedded_on = []
+    for frame_index in range(1, 25):
+        before = len(recognizer.identified)
+        tracked.recognize_face(FRAME)
+        if len(recognizer.identified) > before:
+            embedded_on.append(frame_index)
+    # Waits of 1, 2, 4 frames, then capped at refresh_frames
+    assert embedded_on == [1, 2, 4, 8, 14, 20]
+
+
+def test_scheduler_runs_detection_and_identification():
+    class FakeScheduler:
+        def __init__(self, recognizer):
+            self.recognizer = recognizer
+            self.calls = []
+
+        def detect(self, frame, camera=None):
+            self.calls.append(('detect', camera))
+            return self.recognizer.detect(frame)
+
+        def identify_faces(self, faces, camera=None):
+            self.calls.append(('identify', camera))
+            return self.recognizer.identify_faces(faces)
+
+    scheduler = FakeScheduler(FakeRecognizer(labels={100: 'alice'}))
+    tracked = TrackedRecognizer(scheduler.recognizer, scheduler=scheduler, camera='door')
+    assert tracked.recognize_face(FRAME)[0]['label'] == 'alice'
+    assert scheduler.calls == [('detect', 'door'), ('identify', 'door')]
+
+
+@pytest.mark.parametrize('enabled', [False, True])
+def test_create_tracked_recognizer_follows_config(enabled):
+    from face_tracker import create_tracked_recognizer
+    config = {'TRACKING': {'ENABLED': enabled, 'DETECT_EVERY_N_FRAMES': 4}}
+    tracked = create_tracked_recognizer(FakeRecognizer(), config, detect_every=None)
+    assert (tracked is not None) == enabled
+    if enabled:
+        assert tracked.detect_every == 4
@@ -0,0 +1,158 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+import capture
+from capture import FFmpegCapture, create_capture_reader
+
+
+class FakeProcess:
+
+    def __init__(self, command, stdout_bytes=b''):
+        self.command = command
+        self.stdout = io.BytesIO(stdout_bytes)
+        self.terminated = False
+
+    def poll(self):
+        return 0 if self.terminated else None
+
+    def terminate(self):
+        self.terminated = True
+
+    def wait(self, timeout=None):
+        return 0
+
+
+@pytest.fixture
+def spawned(monkeypatch):
+    """Commands passed to Popen; the process writes `spawned.output` to stdout."""
+    processes = []
+
+    def popen(command, **kwargs):
+        process = FakeProcess(command, popen.output)
+        processes.append(process)
+        return process
+
+    popen.output = b''
+    popen.processes = processes
+    monkeypatch.setattr(capture.subprocess, 'Popen', popen)
+    return popen
+
+
+def _option(command, flag):
+    return command[command.index(flag) + 1]
+
+
+def test_command_scales_and_drops_frames_without_duplicates(spawned):
+    FFmpegCapture('rtsp://cam/stream', width=640, height=360, fps=5)
+    command = spawned.processes[0].command
+    assert _option(command, '-rtsp_transport') == 'tcp'
+    assert _option(command, '-i') == 'rtsp://cam/stream'
+    assert _option(command, '-vf') == ("select='isnan(prev_selected_t)+gte(t-prev_selected_t,0.196)',"
+                                       "scale=640:360:flags=fast_bilinear")
+    assert _option(command, '-vsync') == 'passthrough'
+    assert _option(command, '-pix_fmt') == 'bgr24'
+    assert command[-3:] == ['-f', 'rawvideo', 'pipe:1']
+    assert '-skip_frame' not in command
+    assert 'fps=' not in _option(command, '-vf')
+
+
+def test_keyframes_only_skips_in_the_decoder(spawned):
+    FFmpegCapture('video.mp4', width=320, height=240, keyframes_only=True)
+    command = spawned.processes[0].command
+    # An input option: it has to come before -i
+    assert command.index('-skip_frame') < command.index('-i')
+    assert _option(command, '-skip_frame') == 'nokey'
+    # No fps cap, no select filter; files are not treated as live streams
+    assert _option(command, '-vf') == 'scale=320:240:flags=fast_bilinear'
+    assert '-fflags' not in command and '-rtsp_transport' not in command
+
+
+@pytest.mark.parametrize('width, height, expected', [
+    (640, None, (640, 360)),
+    (None, 540, (960, 540)),
+    (3840, None, (1920, 1080)),   # never upscaled
+    (None, None, (1920, 1080)),
+    (500, None, (500, 282)),      # even sizes only
+])
+def test_missing_dimension_keeps_the_aspect_ratio(spawned, monkeypatch, width, height, expected):
+    monkeypatch.setattr(FFmpegCapture, '_probe_size', lambda self: (1920, 1080))
+    cap = FFmpegCapture('video.mp4', width=width, height=height)
+    assert (cap.width, cap.height) == expected
+    assert f"scale={expected[0]}:{expected[1]}" in _option(spawned.processes[0].command, '-vf')
+
+
+def test_failed_probe_does_not_start_ffmpeg(spawned, monkeypatch):
+    monkeypatch.setattr(FFmpegCapture, '_probe_size', lambda self: None)
+    cap = FFmpegCapture('video.mp4', width=640)
+    assert spawned.processes == []
+    assert not cap.isOpened()
+    assert cap.read() == (False, None)
+
+
+def test_read_fills_frames_and_reuses_matching_buffers(spawned):
+    frames = [np.full((4, 6, 3), value, dtype=np.uint8) for value in (1, 2, 3)]
+    spawned.output = b''.join(frame.tobytes() for frame in frames)
+    cap = FFmpegCapture('video.mp4', width=6, height=4)
+    assert cap.isOpened()
+    assert cap.get(cv2.CAP_PROP_FRAME_WIDTH) == 6 and cap.get(cv2.CAP_PROP_FRAME_HEIGHT) == 4
+
+    ret, first = cap.read()
+    assert ret and first.shape == (4, 6, 3)
+    np.testing.assert_array_equal(first, frames[0])
+    ret, second = cap.read(first)
+    assert ret and second is first
+    np.testing.assert_array_equal(second, frames[1])
+    # A buffer of another shape is not written into
+    wrong = np.zeros((2, 2, 3), dtype=np.uint8)
+    ret, third = cap.read(wrong)
+    assert ret and third is not wrong
+    np.testing.assert_array_equal(third, frames[2])
+
+
+def test_short_read_or_eof_fails(spawned):
+    spawned.output = np.ones((4, 6, 3), dtype=np.uint8).tobytes() + b'\x00' * 10
+    cap = FFmpegCapture('video.mp4', width=6, height=4)
+    assert cap.read()[0]
+    # Only part of the second frame arrived before the stream ended
+    assert cap.read() == (False, None)
+    assert cap.read() == (False, None)
+
+
+def test_release_stops_ffmpeg(spawned):
+    cap = FFmpegCapture('video.mp4', width=6, height=4)
+    process = spawned.processes[0]
+    cap.release()
+    assert process.terminated and not cap.isOpened()
+    cap.release()
+
+
+@pytest.fixture
+def not_started(monkeypatch):
+    monkeypatch.setattr(capture.LatestFrameReader, 'start', lambda self: self)
+
+
+def test_create_capture_reader_uses_ffmpeg_with_camera_options(not_started, monkeypatch):
+    monkeypatch.setattr(capture.shutil, 'which', lambda path: '/usr/bin/ffmpeg')
+    config = {'CAPTURE': {'DECODER': 'opencv', 'DECODE_FPS': 10},
+              'CAMERA_SOURCES': [{'name': 'door', 'source': 'rtsp://door', 'decoder': 'ffmpeg',
+                                  'decode_width': 640, 'keyframes_only': True}]}
+    reader = create_capture_reader('rtsp://door', 'door', config)
+    assert reader.reuse_buffers
+    assert reader.open_capture.func is FFmpegCapture
+    assert reader.open_capture.keywords['width'] == 640
+    assert reader.open_capture.keywords['fps'] == 10
+    assert reader.open_capture.keywords['keyframes_only'] is True
+
+
+def test_create_capture_reader_falls_back_to_opencv(not_started, monkeypatch):
+    monkeypatch.setattr(capture.shutil, 'which', lambda path: None)
+    config = {'CAPTURE': {'DECODER': 'ffmpeg', 'FFMPEG_PATH': '/missing/ffmpeg'}}
+    # ffmpeg missing
+    assert not create_capture_reader('rtsp://door', 'door', config).reuse_buffers
+    monkeypatch.setattr(capture.shutil, 'which', lambda path: '/usr/bin/ffmpeg')
+    # Device indexes are OpenCV-only
+    reader = create_capture_reader(0, 'webcam', config)
+    assert not reader.reuse_buffers and reader.open_capture is cv2.VideoCapture
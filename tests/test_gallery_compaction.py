@@ -0,0 +1,33 @@
+import numpy as np
+
+from gallery_compaction import compact_rows, farthest_point_sampling
+
+
+def _normalized(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_fps_stops_at_near_duplicates():
+    vectors = _normalized([[1, 0, 0], [1, 0.01, 0], [1, 0, 0.01], [0, 1, 0]])
+    selected = farthest_point_sampling(vectors, k=4, dedupe_similarity=0.97)
+    # One of the three near-identical rows plus the orthogonal one
+    assert len(selected) == 2
+    assert 3 in selected
+
+
+def test_fps_keeps_distinct_rows_up_to_k():
+    vectors = np.eye(4, dtype=np.float32)
+    assert len(farthest_point_sampling(vectors, k=3)) == 3
+    assert sorted(farthest_point_sampling(vectors, k=10)) == [0, 1, 2, 3]
+
+
+def test_compact_rows_dedupes_per_person():
+    vectors = _normalized([[1, 0, 0], [1, 0.01, 0], [0, 1, 0], [0, 1, 0.01]])
+    vector_ids = np.array([0, 0, 1, 1], dtype=np.int64)
+    settings = {'max_per_person': 10, 'compaction': 'fps', 'dedupe_similarity': 0.97, 'coverage_threshold': 0.5}
+    keep, report = compact_rows(vectors, vector_ids, settings)
+    assert keep.sum() == 2
+    assert sorted(vector_ids[keep]) == [0, 1]
+    assert report['dropped'] == 2
+    assert report['lost'] == 0
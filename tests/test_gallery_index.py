@@ -0,0 +1,111 @@
+import faiss
+import numpy as np
+import pytest
+
+from gallery_index import aggregate_identities, build_index, index_settings, rerank_search, unwrap_index
+
+
+def _clustered(people=20, per_person=10, d=64, noise=0.05, seed=0):
+    # Near-duplicate vectors per person: int8 codes cannot tell them apart reliably
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(people, d)).astype(np.float32)
+    vectors = np.repeat(centers, per_person, axis=0) + rng.normal(scale=noise, size=(people * per_person, d)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    queries = vectors[::per_person] + rng.normal(scale=noise, size=(people, d)).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return vectors, queries
+
+
+def _int8_settings(rerank_k=30):
+    return index_settings({'GALLERY': {'INDEX': {'STORAGE': 'int8', 'RERANK_K': rerank_k, 'RECALL_SAMPLE': 0}}})
+
+
+def test_max_aggregation_picks_best_hit_per_query():
+    similarities = np.array([[0.9, 0.8, 0.7],
+                             [0.6, 0.5, 0.4]], dtype=np.float32)
+    ids = np.array([[2, 1, 2],
+                    [0, 0, 1]], dtype=np.int64)
+    scores, best = aggregate_identities(similarities, ids, top_m=1)
+    np.testing.assert_allclose(scores, [0.9, 0.6])
+    np.testing.assert_array_equal(best, [2, 0])
+
+
+def test_mean_top_m_averages_repeated_ids():
+    # Person 1 has one very close vector, person 2 several good ones
+    similarities = np.array([[0.95, 0.9, 0.88, 0.86, 0.5]], dtype=np.float32)
+    ids = np.array([[1, 2, 2, 2, 1]], dtype=np.int64)
+    scores, best = aggregate_identities(similarities, ids, top_m=3)
+    np.testing.assert_array_equal(best, [2])
+    np.testing.assert_allclose(scores, [(0.9 + 0.88 + 0.86) / 3], rtol=1e-6)
+
+
+def test_mean_top_m_uses_fewer_hits_when_person_has_fewer():
+    similarities = np.array([[0.8, 0.7]], dtype=np.float32)
+    ids = np.array([[4, 3]], dtype=np.int64)
+    scores, best = aggregate_identities(similarities, ids, top_m=3)
+    np.testing.assert_array_equal(best, [4])
+    np.testing.assert_allclose(scores, [0.8])
+
+
+def test_empty_slots_are_ignored():
+    similarities = np.array([[0.7, 0.99, 0.6],
+                             [0.99, 0.99, 0.99]], dtype=np.float32)
+    ids = np.array([[5, -1, 5],
+                    [-1, -1, -1]], dtype=np.int64)
+    scores, best = aggregate_identities(similarities, ids, top_m=2)
+    np.testing.assert_array_equal(best, [5, -1])
+    np.testing.assert_allclose(scores[0], 0.65, rtol=1e-6)
+    assert scores[1] == -np.inf
+
+
+def test_multi_gallery_searches_id_map_by_person():
+    pytest.importorskip('torch')  # gallery imports src/utils.py, which imports torch
+    from gallery import Gallery
+
+    # Two vectors for person 0, one each for persons 1 and 2
+    vectors = np.array([[1, 0, 0], [0.8, 0.6, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32)
+    row_ids = np.array([0, 0, 1, 2], dtype=np.int64)
+    settings = index_settings({})
+    settings['recall_sample'] = 0
+    index, info = build_index(vectors, settings, ids=row_ids)
+    assert info['id_map'] and info['type'] == 'flat'
+
+    gallery = Gallery(index, ['alice', 'bob', 'carol'], version=1, row_ids=unwrap_index(index)[1], top_k=4)
+    queries = np.array([[0.6, 0.8, 0], [0, 0.1, 0.99]], dtype=np.float32)
+    scores, ids = gallery.best_matches(queries)
+    # The first query is closest to alice's second vector, not to bob
+    np.testing.assert_array_equal(ids, [0, 2])
+    np.testing.assert_allclose(scores, [0.96, 0.99], rtol=1e-5)
+    assert len(gallery.person_vectors(0)) == 2
+
+
+def test_rerank_recovers_exact_order_of_int8_index():
+    vectors, queries = _clustered()
+    index, info = build_index(vectors, _int8_settings())
+    assert info['storage'] == 'int8' and info['rerank_k'] == 30
+    exact_scores = queries @ vectors.T
+    exact = np.argsort(-exact_scores, axis=1, kind='stable')[:, :5]
+
+    _, approx = index.search(queries, 5)
+    assert (approx != exact).any()  # quantization alone reorders close neighbours
+    scores, ids = rerank_search(index, vectors, queries, 5, info['rerank_k'])
+    np.testing.assert_array_equal(ids, exact)
+    np.testing.assert_allclose(scores, np.take_along_axis(exact_scores, exact, axis=1), rtol=1e-5)
+
+
+def test_published_int8_gallery_is_reranked(tmp_path):
+    pytest.importorskip('torch')  # gallery imports src/utils.py, which imports torch
+    from gallery import load_gallery
+    from gallery_helpers import gallery_config
+    import precompute_embeddings
+
+    vectors, queries = _clustered()
+    config = gallery_config(tmp_path, mode='mean')
+    config['GALLERY']['INDEX'] = {'STORAGE': 'int8', 'RERANK_K': 30, 'RECALL_SAMPLE': 0}
+    labels = [f"p{i}" for i in range(len(vectors))]
+    precompute_embeddings._publish_gallery(labels, vectors, np.ones(len(vectors), dtype=np.int64), config)
+
+    gallery = load_gallery(config)
+    assert gallery.rerank_k == 30 and gallery.vectors is not None
+    _, ids = gallery.search(queries, 5)
+    np.testing.assert_array_equal(ids, np.argsort(-(queries @ vectors.T), axis=1, kind='stable')[:, :5])
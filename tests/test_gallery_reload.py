@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip('torch')  # src/utils.py imports torch at module level
+
+from gallery import GalleryWatcher, load_gallery
+from gallery_helpers import best_label, publish_multi, unit
+
+
+def test_watcher_swaps_in_a_newly_published_version(three_people):
+    config = three_people
+    watcher = GalleryWatcher(config, load_gallery(config))
+    assert watcher.current.version == 1
+    assert not watcher.check()
+
+    old = watcher.current
+    publish_multi(config, ['alice', 'bob'], unit([1, 0, 0, 0], [0, 1, 0, 0]), [0, 1])
+    assert watcher.check()
+    assert watcher.current.version == 2 and watcher.reloads == 1
+    assert list(watcher.current.labels) == ['alice', 'bob']
+    assert best_label(watcher.current, [0, 0, 1, 0]) != 'carol'
+    # A snapshot taken before the reload keeps working on the old version
+    assert best_label(old, [0, 0, 1, 0]) == 'carol'
+    assert not watcher.check()
+
+
+def test_watcher_keeps_current_gallery_when_pointer_is_unchanged(three_people):
+    config = three_people
+    watcher = GalleryWatcher(config, load_gallery(config))
+    current = watcher.current
+    for _ in range(3):
+        assert not watcher.check()
+    assert watcher.current is current and watcher.reloads == 0
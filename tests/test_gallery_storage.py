@@ -0,0 +1,72 @@
+import os
+import pickle
+import sys
+
+import faiss
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')  # src/utils.py imports torch at module level
+
+from gallery import load_gallery
+from gallery_helpers import best_label, gallery_config, unit
+from utils import current_gallery_dir, load_faiss_data, save_faiss_data
+
+
+def _flat_index(vectors):
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+def _mapped_files():
+    with open('/proc/self/maps') as f:
+        return {line.split()[-1] for line in f if len(line.split()) >= 6}
+
+
+@pytest.fixture
+def mean_config(tmp_path):
+    config = gallery_config(tmp_path, mode='mean')
+    save_faiss_data(_flat_index(unit([1, 0, 0, 0], [0, 1, 0, 0])), ['alice', 'bob'], config)
+    return config
+
+
+def test_labels_are_saved_without_pickle(mean_config):
+    version_dir = current_gallery_dir(mean_config)
+    assert not os.path.exists(os.path.join(version_dir, 'labels.pkl'))
+    labels = np.load(os.path.join(version_dir, 'labels.npy'), allow_pickle=False)
+    assert list(labels) == ['alice', 'bob']
+
+
+def test_mmap_load_maps_index_and_labels(mean_config):
+    index, labels = load_faiss_data(mean_config, mmap=True)
+    assert isinstance(labels, np.memmap) and list(labels) == ['alice', 'bob']
+    assert index.ntotal == 2
+    if sys.platform.startswith('linux'):
+        index_path = os.path.join(current_gallery_dir(mean_config), 'faiss_index.bin')
+        assert os.path.realpath(index_path) in _mapped_files()
+
+    index, labels = load_faiss_data(mean_config, mmap=False)
+    assert labels == ['alice', 'bob']
+    index.add(unit([0, 0, 1, 0]))  # a copy in RAM can still be modified
+    assert index.ntotal == 3
+
+
+def test_mmap_gallery_matches(mean_config):
+    gallery = load_gallery(mean_config)
+    assert best_label(gallery, [0, 1, 0, 0]) == 'bob'
+
+
+def test_legacy_pickled_labels_still_load(tmp_path):
+    config = gallery_config(tmp_path, mode='mean')
+    embeddings_dir = config['PATHS']['EMBEDDINGS_DIR']
+    os.makedirs(embeddings_dir)
+    faiss.write_index(_flat_index(unit([1, 0, 0, 0], [0, 1, 0, 0])), os.path.join(embeddings_dir, 'faiss_index.bin'))
+    with open(os.path.join(embeddings_dir, 'labels.pkl'), 'wb') as f:
+        pickle.dump(['alice', 'bob'], f)
+
+    index, labels = load_faiss_data(config, mmap=True)
+    assert index.ntotal == 2 and labels == ['alice', 'bob']
+    gallery = load_gallery(config)
+    assert gallery.version.startswith('mtime:')
+    assert best_label(gallery, [1, 0, 0, 0]) == 'alice'
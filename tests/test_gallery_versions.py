@@ -0,0 +1,100 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip('torch')  # src/utils.py imports torch at module level
+
+import precompute_embeddings
+from gallery import GalleryWatcher, load_gallery
+from gallery_helpers import best_label
+import utils
+from utils import (current_gallery_dir, gallery_version, gallery_version_dir, list_gallery_versions,
+                   read_gallery_manifest, rollback_gallery, verify_gallery)
+
+
+def _gallery_root(config):
+    return os.path.join(config['PATHS']['EMBEDDINGS_DIR'], 'gallery')
+
+
+def test_publishing_creates_a_new_version_with_manifest(three_people):
+    config = three_people
+    manifest = read_gallery_manifest(config)
+    assert manifest['version'] == 1 and manifest['mode'] == 'multi'
+    precompute_embeddings.remove_person('bob', config)
+    assert list_gallery_versions(config) == [1, 2]
+    assert read_gallery_manifest(config)['version'] == 2
+
+
+def test_rollback_and_reload(three_people):
+    config = three_people
+    watcher = GalleryWatcher(config, load_gallery(config))
+    precompute_embeddings.remove_person('bob', config)
+    assert watcher.check()
+    assert list(watcher.current.labels) == ['alice', 'carol']
+
+    assert rollback_gallery(config) == 1
+    assert gallery_version(config) == 1
+    assert watcher.check()
+    assert best_label(watcher.current, [0, 1, 0, 0]) == 'bob'
+    assert not watcher.check()
+
+
+def test_rollback_without_older_version_fails(three_people):
+    with pytest.raises(ValueError):
+        rollback_gallery(three_people)
+
+
+def test_damaged_version_is_not_rolled_back_to(three_people):
+    config = three_people
+    precompute_embeddings.remove_person('bob', config)
+    old_dir = gallery_version_dir(config, 1)
+    assert verify_gallery(old_dir) == []
+    with open(os.path.join(old_dir, 'labels.npy'), 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'x')
+
+    assert verify_gallery(old_dir) == ['labels.npy checksum mismatch']
+    with pytest.raises(ValueError, match='damaged'):
+        rollback_gallery(config)
+    assert gallery_version(config) == 2
+    assert list(load_gallery(config).labels) == ['alice', 'carol']
+
+
+def test_old_versions_beyond_keep_versions_are_pruned(three_people):
+    config = three_people
+    config['GALLERY']['KEEP_VERSIONS'] = 1
+    for name in ('bob', 'carol', 'alice'):
+        precompute_embeddings.remove_person(name, config)
+    assert list_gallery_versions(config) == [3, 4]
+    assert not os.path.exists(gallery_version_dir(config, 1))
+    assert not os.path.exists(gallery_version_dir(config, 2))
+
+
+def test_failed_build_is_removed(three_people, monkeypatch):
+    config = three_people
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(utils, '_publish_lock', fail)
+    with pytest.raises(OSError):
+        precompute_embeddings.remove_person('bob', config)
+    assert [e for e in os.listdir(_gallery_root(config)) if e.startswith('.build-')] == []
+    assert gallery_version(config) == 1 and current_gallery_dir(config) == gallery_version_dir(config, 1)
+
+
+def test_build_left_by_crashed_publisher_is_swept(three_people):
+    config = three_people
+    root = _gallery_root(config)
+    crashed, running = os.path.join(root, '.build-1-1'), os.path.join(root, '.build-2-2')
+    for path in (crashed, running):
+        os.makedirs(path)
+        with open(os.path.join(path, 'faiss_index.bin'), 'wb') as f:
+            f.write(b'partial')
+    day_ago = time.time() - 2 * 24 * 3600
+    os.utime(crashed, (day_ago, day_ago))
+
+    precompute_embeddings.remove_person('bob', config)
+    assert not os.path.exists(crashed)
+    assert os.path.exists(running)
@@ -0,0 +1,128 @@
+import logging
+
+import numpy as np
+import pytest
+
+import hot_set
+from hot_set import HotSet
+
+
+class FakeGallery:
+    """Just what HotSet needs: a version, top_m and per-person vectors."""
+
+    def __init__(self, vectors, version=1):
+        self.vectors = {person: np.asarray(rows, dtype=np.float32)[None] for person, rows in vectors.items()}
+        self.version = version
+        self.top_m = 1
+
+    def person_vectors(self, person):
+        return self.vectors.get(person)
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def _record(hot, gallery, camera, person, score=0.9):
+    hot.record(gallery, [camera], np.array([score], dtype=np.float32), np.array([person]), threshold=0.5)
+
+
+def test_least_recently_seen_person_is_evicted_first():
+    gallery = FakeGallery({0: [1, 0, 0], 1: [0, 1, 0], 2: [0, 0, 1]})
+    hot = HotSet(size=2, margin=0.0)
+    _record(hot, gallery, 'cam', 0)
+    _record(hot, gallery, 'cam', 1)
+    _record(hot, gallery, 'cam', 0)   # 0 is now the most recent
+    _record(hot, gallery, 'cam', 2)   # evicts 1
+    _, ids, hit = hot.match(gallery, np.eye(3, dtype=np.float32), ['cam'] * 3, threshold=0.5)
+    np.testing.assert_array_equal(hit, [True, False, True])
+    assert ids[0] == 0 and ids[2] == 2
+    assert hot.get_stats()['cam']['size'] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(hot_set, 'time', clock)
+    gallery = FakeGallery({0: [1, 0], 1: [0, 1]})
+    hot = HotSet(size=8, margin=0.0, ttl_seconds=60)
+    _record(hot, gallery, 'cam', 0)
+    clock.now += 61
+    _record(hot, gallery, 'cam', 1)   # recording prunes expired entries
+    _, _, hit = hot.match(gallery, np.eye(2, dtype=np.float32), ['cam', 'cam'], threshold=0.5)
+    np.testing.assert_array_equal(hit, [False, True])
+
+
+def test_hot_sets_are_per_camera():
+    gallery = FakeGallery({0: [1, 0]})
+    hot = HotSet(margin=0.0)
+    _record(hot, gallery, 'a', 0)
+    query = np.array([[1, 0]], dtype=np.float32)
+    assert hot.match(gallery, query, ['a'], threshold=0.5)[2][0]
+    assert not hot.match(gallery, query, ['b'], threshold=0.5)[2][0]
+
+
+def test_new_gallery_version_clears_every_camera():
+    gallery = FakeGallery({0: [1, 0]}, version=1)
+    hot = HotSet(margin=0.0)
+    _record(hot, gallery, 'a', 0)
+    _record(hot, gallery, 'b', 0)
+    reloaded = FakeGallery({0: [1, 0]}, version=2)
+    _, _, hit = hot.match(reloaded, np.array([[1, 0], [1, 0]], dtype=np.float32), ['a', 'b'], threshold=0.5)
+    assert not hit.any()
+    assert all(stats['size'] == 0 for stats in hot.get_stats().values())
+
+
+def test_margin_sends_borderline_matches_to_the_full_search():
+    gallery = FakeGallery({0: [1, 0]})
+    hot = HotSet(margin=0.2)
+    _record(hot, gallery, 'cam', 0)
+    query = np.array([[0.6, 0.8]], dtype=np.float32)   # similarity 0.6
+    scores, ids, hit = hot.match(gallery, query, ['cam'], threshold=0.5)
+    assert ids[0] == 0 and not hit[0]
+    np.testing.assert_allclose(scores, [0.6], rtol=1e-6)
+
+
+@pytest.fixture
+def ivf_config(tmp_path):
+    pytest.importorskip('torch')  # gallery imports src/utils.py, which imports torch
+    import precompute_embeddings
+    from gallery_helpers import gallery_config
+
+    rng = np.random.default_rng(0)
+    means = rng.normal(size=(200, 16)).astype(np.float32)
+    config = gallery_config(tmp_path, mode='mean')
+    config['GALLERY']['INDEX'] = {'TYPE': 'ivf_flat', 'AUTO_THRESHOLD': 100, 'RECALL_SAMPLE': 0}
+    precompute_embeddings._publish_gallery([f"p{i}" for i in range(len(means))], means,
+                                           np.ones(len(means), dtype=np.int64), config)
+    return config, means / np.linalg.norm(means, axis=1, keepdims=True)
+
+
+def test_hot_set_fills_from_ivf_gallery(ivf_config):
+    from gallery import load_gallery
+
+    config, means = ivf_config
+    config['HOT_SET'] = {'ENABLED': True}
+    gallery = load_gallery(config)
+    assert gallery.vectors is None  # nothing saved next to an uncompressed IVF index
+    np.testing.assert_allclose(gallery.person_vectors(7), means[7:8], rtol=1e-5)
+
+    hot = HotSet(margin=0.0)
+    _record(hot, gallery, 'cam', 7)
+    scores, ids, hit = hot.match(gallery, means[7:8], ['cam'], threshold=0.5)
+    assert hit[0] and ids[0] == 7 and hot.get_stats()['cam']['size'] == 1
+
+
+def test_unreadable_person_vectors_are_logged(ivf_config, caplog):
+    from gallery import load_gallery
+
+    config, _ = ivf_config
+    gallery = load_gallery(config)  # hot set disabled: no direct map
+    with caplog.at_level(logging.WARNING, logger='gallery'):
+        assert gallery.person_vectors(7) is None
+        assert gallery.person_vectors(8) is None
+    assert len([r for r in caplog.records if 'Cannot read vectors' in r.getMessage()]) == 1
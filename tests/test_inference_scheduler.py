@@ -0,0 +1,178 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+
+class FakeRecognizer:
+    """Records every batch; frames are 1x1 images holding their own id."""
+
+    def __init__(self):
+        self.detect_calls = []
+        self.recognize_calls = []
+        self.identify_calls = []
+        self.fail = False
+
+    def detect_batch(self, frames, cameras=None):
+        if self.fail:
+            raise RuntimeError("detector down")
+        self.detect_calls.append(list(cameras))
+        return [([(0, 0, int(frame[0, 0]), 1)], [None]) for frame in frames]
+
+    def recognize_batch(self, frames, cameras=None, detections=None):
+        self.recognize_calls.append(list(cameras))
+        return [[{'label': f"{camera}:{int(frame[0, 0])}", 'box': boxes[0]}]
+                for frame, camera, (boxes, _) in zip(frames, cameras, detections)]
+
+    def identify_faces(self, faces, cameras=None):
+        self.identify_calls.append(list(cameras))
+        return [(f"{camera}:{face}", 1.0) for face, camera in zip(faces, cameras)]
+
+
+def _frame(value):
+    return np.full((1, 1), value, dtype=np.uint8)
+
+
+@pytest.fixture
+def scheduler():
+    recognizer = FakeRecognizer()
+    scheduler = InferenceScheduler(recognizer, max_batch=8, max_latency_ms=200, workers=1).start()
+    yield scheduler
+    scheduler.stop()
+
+
+def test_frames_from_several_cameras_share_one_detection_batch(scheduler):
+    futures = [scheduler.submit(_frame(i), camera=f"cam{i}") for i in range(1, 4)]
+    results = [future.result(timeout=2) for future in futures]
+
+    assert scheduler.recognizer.detect_calls == [['cam1', 'cam2', 'cam3']]
+    assert scheduler.recognizer.recognize_calls == [['cam1', 'cam2', 'cam3']]
+    # Every caller gets the results of its own frame
+    assert [r[0]['label'] for r in results] == ['cam1:1', 'cam2:2', 'cam3:3']
+    assert [r[0]['box'] for r in results] == [(0, 0, 1, 1), (0, 0, 2, 1), (0, 0, 3, 1)]
+
+
+def test_detect_requests_are_batched_with_frames(scheduler):
+    detect = scheduler.submit_detect(_frame(7), camera='tracked')
+    frame = scheduler.submit(_frame(5), camera='plain')
+    faces = scheduler.submit_faces(['a', 'b'], camera='tracked')
+
+    assert detect.result(timeout=2) == ([(0, 0, 7, 1)], [None])
+    assert frame.result(timeout=2)[0]['label'] == 'plain:5'
+    assert faces.result(timeout=2) == [('tracked:a', 1.0), ('tracked:b', 1.0)]
+    recognizer = scheduler.recognizer
+    assert recognizer.detect_calls == [['tracked', 'plain']]
+    # Detect-only frames are not recognized
+    assert recognizer.recognize_calls == [['plain']]
+    assert recognizer.identify_calls == [['tracked', 'tracked']]
+
+
+def test_lone_request_runs_within_the_latency_budget():
+    recognizer = FakeRecognizer()
+    scheduler = InferenceScheduler(recognizer, max_batch=32, max_latency_ms=50, workers=1).start()
+    try:
+        started = time.monotonic()
+        scheduler.recognize_face(_frame(1), camera='cam', timeout=2)
+        # Collection waits up to 100 ms for a first request, then 50 ms for more
+        assert time.monotonic() - started < 0.5
+        assert recognizer.detect_calls == [['cam']]
+    finally:
+        scheduler.stop()
+
+
+def test_batches_are_capped_at_max_batch():
+    recognizer = FakeRecognizer()
+    scheduler = InferenceScheduler(recognizer, max_batch=2, max_latency_ms=200, workers=1).start()
+    try:
+        futures = [scheduler.submit(_frame(i), camera=f"cam{i}") for i in range(5)]
+        for future in futures:
+            future.result(timeout=2)
+        assert [len(call) for call in recognizer.detect_calls] == [2, 2, 1]
+    finally:
+        scheduler.stop()
+
+
+def test_concurrent_cameras_get_their_own_results(scheduler):
+    results = {}
+
+    def camera(i):
+        results[i] = [scheduler.recognize_face(_frame(i * 10 + n), camera=f"cam{i}", timeout=2)[0]['label']
+                      for n in range(3)]
+
+    threads = [threading.Thread(target=camera, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: [f"cam{i}:{i * 10 + n}" for n in range(3)] for i in range(4)}
+    assert max(len(call) for call in scheduler.recognizer.detect_calls) > 1
+
+
+def test_detection_errors_reach_every_caller(scheduler):
+    scheduler.recognizer.fail = True
+    futures = [scheduler.submit(_frame(1), camera='a'), scheduler.submit_detect(_frame(2), camera='b')]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=2)
+
+
+def test_stats_are_reported_per_camera(scheduler):
+    futures = [scheduler.submit(_frame(1), camera='a'), scheduler.submit(_frame(2), camera='a'),
+               scheduler.submit(_frame(3), camera='b')]
+    for future in futures:
+        future.result(timeout=2)
+    stats = scheduler.get_stats()
+    assert stats['batches'] == 1 and stats['jobs'] == 3 and stats['frames'] == 3
+    assert stats['face_jobs'] == 0 and stats['avg_batch'] == 3.0
+    assert stats['cameras']['a']['requests'] == 2
+    assert stats['cameras']['b']['avg_batch'] == 3.0
+    assert 0.0 <= stats['cameras']['b']['avg_wait_ms'] < 1000.0
+
+
+def test_face_jobs_are_not_counted_as_frames(scheduler):
+    futures = [scheduler.submit(_frame(1), camera='a'), scheduler.submit_detect(_frame(2), camera='b'),
+               scheduler.submit_faces(['x', 'y'], camera='c')]
+    for future in futures:
+        future.result(timeout=2)
+    stats = scheduler.get_stats()
+    assert stats['batches'] == 1 and stats['jobs'] == 3
+    assert stats['frames'] == 2 and stats['face_jobs'] == 1
+    assert stats['avg_batch'] == 3.0
+
+
+def test_stopped_scheduler_rejects_requests():
+    scheduler = InferenceScheduler(FakeRecognizer())
+    with pytest.raises(RuntimeError):
+        scheduler.submit(_frame(1)).result(timeout=1)
+
+
+def test_recognizer_detects_whole_frames_in_one_batch_per_backend(monkeypatch):
+    pytest.importorskip('torch')  # recognize_faces imports src/utils.py, which imports torch
+    import recognize_faces
+
+    calls = []
+
+    def fake_batch(images, backend=None, input_size=None):
+        calls.append((len(images), backend))
+        return [([(0, 0, 1, 1)], [None], [0.9]) for _ in images]
+
+    def fake_single(image, device='cpu', **options):
+        calls.append(('rois', options['rois']))
+        return [(2, 2, 3, 3)], [None]
+
+    monkeypatch.setattr(recognize_faces, 'detect_faces_batch', fake_batch)
+    monkeypatch.setattr(recognize_faces, 'detect_faces_with_landmarks', fake_single)
+    recognizer = object.__new__(recognize_faces.FaceRecognizer)
+    recognizer.device = 'cpu'
+    recognizer.default_tiles = None
+    recognizer.camera_options = {}
+    recognizer.set_camera_options('door', rois=[[0, 0, 10, 10]])
+    recognizer.set_camera_options('yard', backend='yunet')
+
+    frames = [np.zeros((4, 4, 3), dtype=np.uint8)] * 4
+    detections = recognizer.detect_batch(frames, ['a', 'door', 'b', 'yard'])
+    assert sorted(calls, key=str) == sorted([(2, None), ('rois', [[0, 0, 10, 10]]), (1, 'yunet')], key=str)
+    assert [boxes for boxes, _ in detections] == [[(0, 0, 1, 1)], [(2, 2, 3, 3)], [(0, 0, 1, 1)], [(0, 0, 1, 1)]]
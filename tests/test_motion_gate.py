@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from motion_gate import MotionGate, create_motion_gate
+
+
+def _still():
+    rng = np.random.default_rng(0)
+    return rng.integers(60, 70, size=(240, 320, 3), dtype=np.uint8)
+
+
+def _with_square(background, x):
+    frame = background.copy()
+    frame[80:160, x:x + 80] = 255
+    return frame
+
+
+def test_diff_gate_skips_a_still_scene():
+    gate = MotionGate(method='diff', keepalive_frames=0)
+    still = _still()
+    assert gate.has_motion(still)   # nothing to compare the first frame with
+    assert not any(gate.has_motion(still) for _ in range(10))
+    stats = gate.get_stats()
+    assert stats['frames'] == 11 and stats['skipped'] == 10
+    assert stats['last_motion_ratio'] == 0.0
+
+
+def test_diff_gate_passes_a_moving_object():
+    gate = MotionGate(method='diff', keepalive_frames=0)
+    background = _still()
+    gate.has_motion(background)
+    assert not gate.has_motion(background)
+    assert gate.has_motion(_with_square(background, 40))
+    assert gate.has_motion(_with_square(background, 120))
+    # The object stopped
+    assert not gate.has_motion(_with_square(background, 120))
+
+
+def test_small_changes_stay_below_the_thresholds():
+    gate = MotionGate(method='diff', keepalive_frames=0, pixel_threshold=25)
+    background = _still()
+    gate.has_motion(background)
+    # Sensor noise: every pixel shifts a little
+    assert not gate.has_motion(np.clip(background.astype(np.int16) + 8, 0, 255).astype(np.uint8))
+    # A tiny object covers less than min_motion_ratio of the frame
+    tiny = background.copy()
+    tiny[0:2, 0:2] = 255
+    gate = MotionGate(method='diff', keepalive_frames=0, min_motion_ratio=0.01)
+    gate.has_motion(background)
+    assert not gate.has_motion(tiny)
+
+
+def test_keepalive_lets_one_frame_through_periodically():
+    gate = MotionGate(method='diff', keepalive_frames=5)
+    still = _still()
+    passed = [gate.has_motion(still) for _ in range(16)]
+    assert [i for i, p in enumerate(passed) if p] == [0, 5, 10, 15]
+    assert gate.get_stats()['skipped'] == 12
+
+
+def test_hit_rate_is_the_skipped_fraction():
+    gate = MotionGate(method='diff', keepalive_frames=0)
+    assert gate.get_stats()['hit_rate'] == 0.0
+    still = _still()
+    for _ in range(4):
+        gate.has_motion(still)
+    assert gate.get_stats()['hit_rate'] == pytest.approx(3 / 4)
+
+
+def test_mog2_gate_learns_the_background():
+    gate = MotionGate(method='mog2', keepalive_frames=0)
+    background = _still()
+    for _ in range(30):
+        gate.has_motion(background)
+    assert not gate.has_motion(background)
+    assert gate.has_motion(_with_square(background, 120))
+
+
+def test_resolution_change_counts_as_motion():
+    gate = MotionGate(method='diff', keepalive_frames=0)
+    gate.has_motion(_still())
+    assert gate.has_motion(np.zeros((480, 320, 3), dtype=np.uint8))
+
+
+@pytest.mark.parametrize('enabled', [False, True])
+def test_create_motion_gate_follows_config(enabled):
+    gate = create_motion_gate({'MOTION_GATE': {'ENABLED': enabled, 'METHOD': 'mog2', 'KEEPALIVE_FRAMES': 7}})
+    assert (gate is not None) == enabled
+    if enabled:
+        assert gate.method == 'mog2' and gate.keepalive_frames == 7
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')  # src/utils.py imports torch at module level
+
+import precompute_embeddings
+from gallery import load_gallery
+from gallery_helpers import gallery_config
+
+
+class FakeArcFace:
+    dim = 4
+    model_file = 'w600k_r50.onnx'
+
+
+@pytest.fixture
+def no_models(monkeypatch):
+    monkeypatch.setattr(precompute_embeddings, '_init_embedders', lambda config: None)
+    monkeypatch.setattr(precompute_embeddings, '_ARCFACE_EMBEDDER', None)
+
+
+def _paths(n):
+    return [f"/data/person/{i}.jpg" for i in range(n)]
+
+
+def _config(workers=2, batch_size=3):
+    return {'PATHS': {'DATASET_DIR': '/data'}, 'TRAINING': {'WORKERS': workers, 'BATCH_SIZE': batch_size}}
+
+
+def test_every_image_is_yielded_once_with_its_own_embedding(no_models, monkeypatch):
+    def slow_decode(path, max_side=0):
+        i = int(path.rsplit('/', 1)[1].split('.')[0])
+        time.sleep(0.001 * (i % 3))   # finish out of order
+        return None if i == 4 else np.full((2, 2, 3), i, dtype=np.uint8)
+
+    monkeypatch.setattr(precompute_embeddings, '_decode_image', slow_decode)
+    monkeypatch.setattr(precompute_embeddings, '_embed_images',
+                        lambda images, embedder: [np.full(4, float(image[0, 0, 0])) for image in images])
+    results = list(precompute_embeddings._iter_embeddings(_paths(10), _config(workers=4, batch_size=3)))
+    # Misses come back in input order
+    assert [i for i, _ in results] == list(range(10))
+    for i, embedding in results:
+        if i == 4:
+            assert embedding is None
+        else:
+            np.testing.assert_array_equal(embedding, np.full(4, float(i)))
+
+
+def test_at_most_two_batches_are_decoded_at_once(no_models, monkeypatch):
+    lock = threading.Lock()
+    live = [0]
+    peak = [0]
+
+    def decode(path, max_side=0):
+        with lock:
+            live[0] += 1
+        return np.zeros((2, 2, 3), dtype=np.uint8)
+
+    def embed(images, embedder):
+        time.sleep(0.02)   # let the next batches finish decoding
+        with lock:
+            peak[0] = max(peak[0], live[0])
+            live[0] -= len(images)
+        return [np.zeros(4, dtype=np.float32)] * len(images)
+
+    monkeypatch.setattr(precompute_embeddings, '_decode_image', decode)
+    monkeypatch.setattr(precompute_embeddings, '_embed_images', embed)
+    results = list(precompute_embeddings._iter_embeddings(_paths(20), _config(workers=4, batch_size=4)))
+    assert len(results) == 20
+    assert peak[0] == 2 * 4
+
+
+def test_worker_count_reaches_the_decode_pool(no_models, monkeypatch):
+    created = []
+    real_pool = precompute_embeddings.ThreadPoolExecutor
+
+    def pool(max_workers, **kwargs):
+        created.append(max_workers)
+        return real_pool(max_workers=max_workers, **kwargs)
+
+    monkeypatch.setattr(precompute_embeddings, 'ThreadPoolExecutor', pool)
+    monkeypatch.setattr(precompute_embeddings, '_decode_image', lambda path, max_side=0: np.zeros((2, 2, 3)))
+    monkeypatch.setattr(precompute_embeddings, '_embed_images', lambda images, embedder: [None] * len(images))
+    list(precompute_embeddings._iter_embeddings(_paths(2), _config(workers=2), workers=5))
+    list(precompute_embeddings._iter_embeddings(_paths(2), _config(workers=2)))
+    assert created == [5, 2]
+
+
+def test_training_options_prefer_arguments_over_config():
+    config = {'TRAINING': {'WORKERS': 3, 'BATCH_SIZE': 8, 'MAX_IMAGE_SIDE': 640}}
+    assert precompute_embeddings._training_options(config) == (3, 8, 640)
+    assert precompute_embeddings._training_options(config, workers=6, batch_size=2) == (6, 2, 640)
+
+
+def test_command_line_flags_are_passed_on(monkeypatch):
+    calls = []
+    monkeypatch.setattr(precompute_embeddings, 'precompute_embeddings',
+                        lambda workers=None, batch_size=None: calls.append((workers, batch_size)))
+    precompute_embeddings.main(['--workers', '6', '--batch-size', '16'])
+    precompute_embeddings.main([])
+    assert calls == [(6, 16), (None, None)]
+
+
+def test_fallback_vectors_of_another_size_are_skipped(tmp_path, monkeypatch):
+    config = gallery_config(tmp_path, mode='multi')
+    dataset = tmp_path / 'dataset'
+    for name in ('alice', 'bob'):
+        (dataset / name).mkdir(parents=True)
+        for n in range(2):
+            (dataset / name / f"{n}.jpg").write_bytes(b'')
+
+    def fake_iter_embeddings(image_paths, config, cache=None, workers=None, batch_size=None):
+        # A DeepFace fallback vector (3-d) arrives before the ArcFace ones (4-d)
+        yield 1, np.ones(3, dtype=np.float32)
+        for i in (3, 0, 2):
+            vector = np.zeros(4, dtype=np.float32)
+            vector[i] = 1.0
+            yield i, vector
+
+    monkeypatch.setattr(precompute_embeddings, 'load_config', lambda: config)
+    monkeypatch.setattr(precompute_embeddings, '_init_embedders', lambda config: None)
+    monkeypatch.setattr(precompute_embeddings, '_ARCFACE_EMBEDDER', FakeArcFace())
+    monkeypatch.setattr(precompute_embeddings, '_iter_embeddings', fake_iter_embeddings)
+    assert precompute_embeddings.precompute_embeddings() == 2
+
+    gallery = load_gallery(config)
+    assert gallery.index.d == 4
+    # Rows are indexed in dataset order, whatever order they were embedded in
+    np.testing.assert_array_equal(gallery.row_ids, [0, 1, 1])
+    np.testing.assert_array_equal(np.argmax(np.asarray(gallery.vectors), axis=1), [0, 2, 3])
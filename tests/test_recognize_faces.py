@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')  # recognize_faces imports src/utils.py, which imports torch
+
+import recognize_faces
+from recognize_faces import FaceRecognizer
+
+PEOPLE = np.eye(4, dtype=np.float32)[:3]   # alice, bob, carol
+
+
+class FakeEmbedder:
+    """Embeds a face as the gallery row named by its first keypoint's x."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, items):
+        self.calls.append(len(items))
+        return np.stack([PEOPLE[int(kps[0, 0])] for _, kps in items])
+
+
+class FakeSnapshot:
+    labels = ['alice', 'bob', 'carol']
+    version = 'v1'
+
+    def best_matches(self, queries):
+        sims = queries @ PEOPLE.T
+        return sims.max(axis=1), sims.argmax(axis=1)
+
+
+class FakeWatcher:
+    current = FakeSnapshot()
+
+
+class FakeAnalysis:
+    """Stands in for insightface's FaceAnalysis; full-frame analysis must not run."""
+
+    created = []
+
+    def __init__(self, name, allowed_modules=None):
+        self.allowed_modules = allowed_modules
+        self.det_model = object()
+        self.models = {'recognition': object()}
+        FakeAnalysis.created.append(self)
+
+    def prepare(self, ctx_id):
+        self.ctx_id = ctx_id
+
+    def get(self, frame):
+        raise AssertionError("single pass must not run FaceAnalysis.get()")
+
+
+class FakeDeepFace:
+
+    def __init__(self, model_name=None):
+        self.whole_frames = 0
+
+    def warmup(self):
+        pass
+
+    def embed_image(self, frame):
+        self.whole_frames += 1
+        return None
+
+
+def _kps(person):
+    kps = np.zeros((5, 2), dtype=np.float32)
+    kps[0, 0] = person
+    return kps
+
+
+@pytest.fixture
+def recognizer(monkeypatch):
+    config = {
+        'RECOGNITION': {'EMBEDDING_MODEL': 'VGG-Face', 'VERIFICATION_THRESHOLD': 0.5,
+                        'DISTANCE_METRIC': 'cosine', 'PIPELINE': 'single_pass', 'DEEPFACE_WARMUP': False},
+        'CAMERA_SOURCES': [],
+    }
+    shared = []
+    FakeAnalysis.created = []
+    monkeypatch.setattr(recognize_faces, 'load_config', lambda: config)
+    monkeypatch.setattr(recognize_faces, 'get_device', lambda config: 'cpu')
+    monkeypatch.setattr(recognize_faces, 'create_gallery_watcher', lambda config: FakeWatcher())
+    monkeypatch.setattr(recognize_faces, 'create_hot_set', lambda config: None)
+    monkeypatch.setattr(recognize_faces, 'configure_detection', lambda *args, **kwargs: None)
+    monkeypatch.setattr(recognize_faces, '_INSIGHT_AVAILABLE', True)
+    monkeypatch.setattr(recognize_faces, 'FaceAnalysis', FakeAnalysis, raising=False)
+    monkeypatch.setattr(recognize_faces, 'ArcFaceEmbedder', lambda rec_model: FakeEmbedder())
+    monkeypatch.setattr(recognize_faces, 'use_scrfd_model', shared.append)
+    monkeypatch.setattr(recognize_faces, 'DeepFaceEmbedder', FakeDeepFace)
+    recognizer = FaceRecognizer()
+    recognizer.shared_models = shared
+    return recognizer
+
+
+def test_single_pass_loads_only_detection_and_recognition(recognizer):
+    (app,) = FakeAnalysis.created
+    assert app.allowed_modules == ['detection', 'recognition']
+    assert app.ctx_id == -1
+    # buffalo_l's SCRFD is offered to the detector instead of loading a second copy
+    assert recognizer.shared_models == [app.det_model]
+    assert recognizer.pipeline == 'single_pass'
+
+
+def test_detector_keypoints_go_straight_to_one_arcface_batch(recognizer):
+    frames = [np.zeros((100, 100, 3), dtype=np.uint8)] * 2
+    detections = [([(10, 10, 30, 30), (50, 50, 70, 70)], [_kps(1), _kps(0)]),
+                  ([(20, 20, 40, 40)], [_kps(2)])]
+    results = recognizer.recognize_batch(frames, detections=detections)
+    assert recognizer.embedder.calls == [3]
+    assert [[r['label'] for r in frame] for frame in results] == [['bob', 'alice'], ['carol']]
+    # Boxes are padded by 10 px and returned as (x, y, w, h)
+    assert results[0][0]['box'] == (0, 0, 40, 40)
+    assert results[0][0]['score'] == pytest.approx(1.0)
+
+
+def test_frames_are_detected_once(recognizer, monkeypatch):
+    calls = []
+
+    def detect_batch(frames, cameras=None):
+        calls.append(len(frames))
+        return [([(10, 10, 30, 30)], [_kps(2)]) for _ in frames]
+
+    monkeypatch.setattr(recognizer, 'detect_batch', detect_batch)
+    results = recognizer.recognize_face(np.zeros((100, 100, 3), dtype=np.uint8))
+    assert calls == [1]
+    assert [r['label'] for r in results] == ['carol']
+
+
+def test_frame_without_faces_falls_back_to_the_whole_frame(recognizer):
+    results = recognizer.recognize_batch([np.zeros((50, 50, 3), dtype=np.uint8)], detections=[([], [])])
+    assert results == [[]]
+    assert recognizer.deepface.whole_frames == 1
+    assert recognizer.embedder.calls == []
+
+
+def test_all_faces_of_a_batch_share_one_gallery_search(recognizer, monkeypatch):
+    searches = []
+    best_matches = FakeSnapshot.best_matches
+
+    def counting(self, queries):
+        searches.append(len(queries))
+        return best_matches(self, queries)
+
+    monkeypatch.setattr(FakeSnapshot, 'best_matches', counting)
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    faces = [(frame, (0, 0, 20, 20), _kps(person)) for person in (0, 1, 2, 1)]
+    matches = recognizer.identify_faces(faces)
+    assert searches == [4]
+    assert [label for label, _ in matches] == ['alice', 'bob', 'carol', 'bob']
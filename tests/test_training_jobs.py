@@ -0,0 +1,268 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('torch')  # precompute_embeddings imports src/utils.py, which imports torch
+
+import training_jobs
+from training_jobs import TrainingQueue
+
+
+def _create_table(db_path):
+    conn = sqlite3.connect(db_path)
+    # Same columns as init_db() in api_backend.py
+    conn.execute('''CREATE TABLE training_sessions (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        started_at TEXT NOT NULL,
+                        completed_at TEXT,
+                        status TEXT NOT NULL,
+                        total_images INTEGER,
+                        trained_persons INTEGER,
+                        model_path TEXT,
+                        progress REAL,
+                        requests INTEGER,
+                        details TEXT,
+                        error TEXT,
+                        lease_until REAL
+                    )''')
+    conn.commit()
+    conn.close()
+
+
+class FakeTraining:
+    """Stands in for precompute_embeddings; `hold` blocks the worker inside a job."""
+
+    def __init__(self):
+        self.calls = []
+        self.hold = threading.Event()
+        self.hold.set()
+        self.entered = threading.Event()
+        self.enroll_total = None   # images enroll_images reports, e.g. after a full-rebuild fallback
+
+    def _enter(self):
+        self.entered.set()
+        assert self.hold.wait(timeout=5)
+
+    def enroll_images(self, person_name, image_paths, config=None, progress=None):
+        self.calls.append(('enroll', person_name, list(image_paths)))
+        self._enter()
+        total = self.enroll_total or len(image_paths)
+        for current in range(1, total + 1):
+            progress(current, total)
+        return len(image_paths)
+
+    def remove_person(self, person_name, config=None, progress=None):
+        self.calls.append(('remove', person_name))
+        self._enter()
+        return True
+
+    def precompute_embeddings(self, progress=None):
+        self.calls.append(('full',))
+        self._enter()
+        progress(1, 1)
+        return 3
+
+
+@pytest.fixture
+def training(monkeypatch):
+    fake = FakeTraining()
+    for name in ('enroll_images', 'remove_person', 'precompute_embeddings'):
+        monkeypatch.setattr(training_jobs.precompute_embeddings, name, getattr(fake, name))
+    monkeypatch.setattr(training_jobs, 'load_config', lambda: {'PATHS': {'EMBEDDINGS_DIR': 'embeddings'}})
+    monkeypatch.setattr(training_jobs, '_PROGRESS_INTERVAL', 0.0)
+    monkeypatch.setattr(training_jobs, '_CLAIM_POLL', 0.01)
+    return fake
+
+
+@pytest.fixture
+def queue(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    _create_table(db_path)
+    return TrainingQueue(db_path)
+
+
+def _wait(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = queue.get(job_id)
+        if job['status'] in ('completed', 'failed'):
+            return job
+        assert time.monotonic() < deadline, job
+        time.sleep(0.01)
+
+
+def _block_worker(queue, training):
+    """Start a job that holds the worker, so the next requests stay queued."""
+    training.hold.clear()
+    job_id = queue.enroll('blocker', ['b.jpg'])
+    assert training.entered.wait(timeout=5)
+    return job_id
+
+
+def test_requests_merge_into_the_queued_job(queue, training):
+    blocker = _block_worker(queue, training)
+    first = queue.enroll('alice', ['1.jpg'])
+    assert queue.enroll('alice', ['2.jpg']) == first
+    assert queue.enroll('bob', ['1.jpg']) == first
+    assert queue.remove('carol') == first
+    assert first != blocker
+    queued = queue.get(first)
+    assert queued['status'] == 'queued' and queued['requests'] == 4
+    assert queued['details'] == {'full': False, 'enroll': {'alice': 2, 'bob': 1}, 'remove': ['carol']}
+
+    training.hold.set()
+    job = _wait(queue, first)
+    assert job['status'] == 'completed' and job['training_completed']
+    assert job['trained_persons'] == 3
+    # Removals run before enrollments
+    assert training.calls[1:] == [('remove', 'carol'), ('enroll', 'alice', ['1.jpg', '2.jpg']),
+                                  ('enroll', 'bob', ['1.jpg'])]
+
+
+def test_removing_a_person_drops_their_queued_images(queue, training):
+    _block_worker(queue, training)
+    job_id = queue.enroll('alice', ['1.jpg'])
+    queue.remove('alice')
+    assert queue.get(job_id)['details'] == {'full': False, 'enroll': {}, 'remove': ['alice']}
+    training.hold.set()
+    _wait(queue, job_id)
+
+
+def test_queued_full_rebuild_absorbs_later_requests(queue, training):
+    _block_worker(queue, training)
+    job_id = queue.enroll('alice', ['1.jpg'])
+    assert queue.full() == job_id
+    assert queue.enroll('bob', ['1.jpg']) == job_id
+    assert queue.remove('carol') == job_id
+    assert queue.get(job_id)['details'] == {'full': True, 'enroll': {}, 'remove': []}
+
+    training.hold.set()
+    job = _wait(queue, job_id)
+    assert job['status'] == 'completed' and job['trained_persons'] == 3
+    assert training.calls[1:] == [('full',)]
+
+
+def test_new_job_is_created_once_the_queued_one_started(queue, training):
+    first = _block_worker(queue, training)
+    second = queue.enroll('alice', ['1.jpg'])
+    training.hold.set()
+    _wait(queue, first)
+    _wait(queue, second)
+    third = queue.enroll('alice', ['2.jpg'])
+    assert third not in (first, second)
+    _wait(queue, third)
+
+
+def _record_progress(queue, monkeypatch):
+    values = {}
+    update = queue._update
+
+    def recording_update(job_id, **fields):
+        if 'progress' in fields and fields.get('status') is None:
+            values.setdefault(job_id, []).append(fields['progress'])
+        update(job_id, **fields)
+
+    monkeypatch.setattr(queue, '_update', recording_update)
+    return values
+
+
+def test_progress_is_scaled_to_each_persons_share(queue, training, monkeypatch):
+    values = _record_progress(queue, monkeypatch)
+    _block_worker(queue, training)
+    job_id = queue.enroll('alice', ['1.jpg', '2.jpg'])
+    queue.enroll('bob', ['1.jpg', '2.jpg'])
+    training.hold.set()
+    job = _wait(queue, job_id)
+    assert values[job_id] == [0.25, 0.5, 0.75, 1.0]
+    assert job['progress'] == 1.0 and job['total_images'] == 4
+
+
+def test_progress_of_a_full_rebuild_fallback_stays_in_the_persons_share(queue, training, monkeypatch):
+    values = _record_progress(queue, monkeypatch)
+    _block_worker(queue, training)
+    training.enroll_total = 4   # enroll_images rebuilt all 4 dataset images
+    job_id = queue.enroll('alice', ['1.jpg'])
+    queue.enroll('bob', ['1.jpg'])
+    training.hold.set()
+    _wait(queue, job_id)
+    assert values[job_id] == [0.125, 0.25, 0.375, 0.5, 0.625, 0.75, 0.875, 1.0]
+
+
+def test_failed_job_records_the_error(queue, training, monkeypatch):
+    def broken(progress=None):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(training_jobs.precompute_embeddings, 'precompute_embeddings', broken)
+    job = _wait(queue, queue.full())
+    assert job['status'] == 'failed' and job['training_error'] == 'disk full'
+    # The worker survives and runs the next job
+    assert _wait(queue, queue.remove('alice'))['status'] == 'completed'
+
+
+def _insert(queue, status, lease_until):
+    conn = sqlite3.connect(queue.db_path)
+    cur = conn.execute("INSERT INTO training_sessions (started_at, status, lease_until) VALUES ('t', ?, ?)",
+                       (status, lease_until))
+    conn.commit()
+    conn.close()
+    return cur.lastrowid
+
+
+def test_recover_marks_jobs_of_dead_processes_interrupted(queue):
+    now = time.time()
+    expired = [_insert(queue, 'queued', now - 1), _insert(queue, 'running', now - 1), _insert(queue, 'running', None)]
+    live = [_insert(queue, 'queued', now + 60), _insert(queue, 'running', now + 60)]
+    done = [_insert(queue, 'completed', None), _insert(queue, 'failed', now - 1)]
+
+    queue.recover()
+    assert [queue.get(job_id)['status'] for job_id in expired] == ['interrupted'] * 3
+    assert [queue.get(job_id)['status'] for job_id in live] == ['queued', 'running']
+    assert [queue.get(job_id)['status'] for job_id in done] == ['completed', 'failed']
+    assert queue.get(expired[0])['training_error'] == 'interrupted'
+    assert queue.get(expired[0])['completed_at'] is not None
+
+
+def test_queues_sharing_a_database_run_one_job_at_a_time(queue, training):
+    # Another process (e.g. a second WSGI worker) with its own queue
+    other = TrainingQueue(queue.db_path)
+    first = _block_worker(queue, training)
+    second = other.enroll('alice', ['1.jpg'])
+    assert other.enroll('bob', ['1.jpg']) == second
+    time.sleep(0.1)
+    assert queue.get(first)['status'] == 'running'
+    assert other.get(second)['status'] == 'queued'
+    assert len(training.calls) == 1
+
+    # Starting up next to a live process leaves its jobs alone
+    other.recover()
+    assert queue.get(first)['status'] == 'running'
+    assert other.get(second)['status'] == 'queued'
+
+    training.hold.set()
+    assert _wait(queue, first)['status'] == 'completed'
+    assert _wait(other, second)['status'] == 'completed'
+    assert training.calls[1:] == [('enroll', 'alice', ['1.jpg']), ('enroll', 'bob', ['1.jpg'])]
+
+
+def test_running_job_of_a_dead_process_does_not_block(queue, training):
+    stale = _insert(queue, 'running', time.time() - 1)
+    job = _wait(queue, queue.remove('alice'))
+    assert job['status'] == 'completed'
+    assert queue.get(stale)['status'] == 'interrupted'
+
+
+def test_leases_of_live_jobs_are_renewed(queue, training, monkeypatch):
+    monkeypatch.setattr(training_jobs, '_LEASE_SECONDS', 0.3)
+    job_id = _block_worker(queue, training)
+    time.sleep(0.5)
+    queue.recover()
+    assert queue.get(job_id)['status'] == 'running'
+    assert queue.get(job_id)['lease_until'] > time.time()
+    training.hold.set()
+    _wait(queue, job_id)
+
+
+def test_recover_without_table_does_nothing(tmp_path):
+    TrainingQueue(str(tmp_path / 'new.db')).recover()
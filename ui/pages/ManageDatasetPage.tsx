@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { BASE_URL } from '../services/api';
+import { BASE_URL, TrainingJob, waitForTrainingJob } from '../services/api';
 
 interface DatasetPerson {
     name: string;
@@ -20,6 +20,12 @@ const ManageDatasetPage: React.FC = () => {
     const [isTraining, setIsTraining] = useState(false);
     const [trainingProgress, setTrainingProgress] = useState('');
 
+    const showTrainingProgress = (job: TrainingJob) => {
+        setTrainingProgress(job.status === 'queued'
+            ? 'Training queued...'
+            : `Training model... ${Math.round((job.progress || 0) * 100)}%`);
+    };
+
     const fetchPersons = async () => {
         try {
             setLoading(true);
@@ -88,11 +94,13 @@ const ManageDatasetPage: React.FC = () => {
                 throw new Error(result.error || 'Upload failed');
             }
 
-            if (result.training_completed) {
+            const training = result.job_id ? await waitForTrainingJob(result.job_id, showTrainingProgress) : result;
+
+            if (training.training_completed) {
                 setFormSuccess(`Successfully added ${newPersonName} and trained model!`);
                 setTrainingProgress('');
             } else {
-                setFormSuccess(`Added ${newPersonName} but training failed: ${result.training_error}`);
+                setFormSuccess(`Added ${newPersonName} but training failed: ${training.training_error}`);
                 setTrainingProgress('');
             }
             
@@ -136,10 +144,12 @@ const ManageDatasetPage: React.FC = () => {
                 throw new Error(result.error || 'Delete failed');
             }
 
-            if (result.training_completed) {
+            const training = result.job_id ? await waitForTrainingJob(result.job_id, showTrainingProgress) : result;
+
+            if (training.training_completed) {
                 setFormSuccess(`Successfully deleted ${personName} and retrained model!`);
             } else {
-                setFormSuccess(`Deleted ${personName} but retraining failed: ${result.training_error}`);
+                setFormSuccess(`Deleted ${personName} but retraining failed: ${training.training_error}`);
             }
             
             setTrainingProgress('');
@@ -170,6 +180,12 @@ const ManageDatasetPage: React.FC = () => {
                 throw new Error(result.error || 'Training failed');
             }
 
+            const training = result.job_id ? await waitForTrainingJob(result.job_id, showTrainingProgress) : result;
+
+            if (training.training_completed === false) {
+                throw new Error(training.training_error || 'Training failed');
+            }
+
             setFormSuccess('Model retrained successfully');
             setTrainingProgress('');
         } catch (err) {
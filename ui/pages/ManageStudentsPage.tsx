@@ -2,7 +2,7 @@
 import React, { useState, useEffect } from 'react';
 import { getStudents, addStudent } from '../services/api';
 import { Student } from '../types';
-import { BASE_URL } from '../services/api';
+import { BASE_URL, TrainingJob, waitForTrainingJob } from '../services/api';
 
 const ManageStudentsPage: React.FC = () => {
     const [students, setStudents] = useState<Student[]>([]);
@@ -19,6 +19,12 @@ const ManageStudentsPage: React.FC = () => {
     const [isTraining, setIsTraining] = useState(false);
     const [trainingProgress, setTrainingProgress] = useState('');
 
+    const showTrainingProgress = (job: TrainingJob) => {
+        setTrainingProgress(job.status === 'queued'
+            ? 'Training queued...'
+            : `Training model... ${Math.round((job.progress || 0) * 100)}%`);
+    };
+
     const fetchStudents = async () => {
         try {
             setLoading(true);
@@ -79,11 +85,13 @@ const ManageStudentsPage: React.FC = () => {
                     throw new Error(result.error || 'Upload failed');
                 }
 
-                if (result.training_completed) {
+                const training = result.job_id ? await waitForTrainingJob(result.job_id, showTrainingProgress) : result;
+
+                if (training.training_completed) {
                     setTrainingProgress('');
                     setFormSuccess(`Student added and trained successfully!`);
                 } else {
-                    setFormSuccess(`Student added but training failed: ${result.training_error}`);
+                    setFormSuccess(`Student added but training failed: ${training.training_error}`);
                 }
             } else {
                 setFormSuccess('Student added successfully');
@@ -127,10 +135,12 @@ const ManageStudentsPage: React.FC = () => {
                 throw new Error(result.error || 'Training failed');
             }
 
-            if (result.training_completed) {
+            const training = result.job_id ? await waitForTrainingJob(result.job_id, showTrainingProgress) : result;
+
+            if (training.training_completed) {
                 setFormSuccess('Model trained successfully');
             } else {
-                setFormError(`Training failed: ${result.training_error}`);
+                setFormError(`Training failed: ${training.training_error}`);
             }
             setTrainingProgress('');
         } catch (err) {
@@ -77,3 +77,31 @@ export const getAttendance = async (): Promise<AttendanceRecord[]> => {
     });
     return handleResponse(response);
 };
+
+// --- Training jobs ---
+export interface TrainingJob {
+    job_id: number;
+    status: 'queued' | 'running' | 'completed' | 'failed' | 'interrupted';
+    progress: number | null;
+    training_completed: boolean;
+    training_error?: string;
+}
+
+// Poll a background training job until it finishes
+export const waitForTrainingJob = async (
+    jobId: number,
+    onProgress?: (job: TrainingJob) => void,
+    intervalMs = 1000,
+): Promise<TrainingJob> => {
+    while (true) {
+        const response = await fetch(`${BASE_URL}/dataset/train/${jobId}`, {
+            headers: getAuthHeaders(),
+        });
+        const job: TrainingJob = await handleResponse(response);
+        if (job.status !== 'queued' && job.status !== 'running') {
+            return job;
+        }
+        onProgress?.(job);
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+};
@@ -8,10 +8,12 @@ import threading
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.recognize_faces import FaceRecognizer, draw_results
+from src.inference_scheduler import create_scheduler
+from src.face_tracker import create_tracked_recognizer
 from src.utils import load_config, AttendanceManager
 
 # Video stream setup
-def _camera_loop(source, name, recognizer: FaceRecognizer, attendance: AttendanceManager):
+def _camera_loop(source, name, recognizer: FaceRecognizer, attendance: AttendanceManager, scheduler=None, tracked=None):
     print(f"[{name}] Starting camera thread...")
     print(f"[{name}] Source: {source} (type: {type(source).__name__})")
     
@@ -132,13 +134,18 @@ def _camera_loop(source, name, recognizer: FaceRecognizer, attendance: Attendanc
             frame = cv2.flip(frame, 1)
 
         # Recognition (process every frame for accuracy)
-        results = recognizer.recognize_face(frame)
+        if tracked is not None:
+            results = tracked.recognize_face(frame)
+        elif scheduler is not None:
+            results = scheduler.recognize_face(frame, camera=name)
+        else:
+            results = recognizer.recognize_face(frame, camera=name)
 
         # Attendance marking
         for r in results:
             label = r.get('label', 'Unknown')
-            if attendance.should_mark(label):
-                attendance.mark(label, name)
+            if attendance.should_mark(label, track_id=r.get('track_id')):
+                attendance.mark(label, name, track_id=r.get('track_id'))
                 print(f"{label} is present (camera: {name})")
 
         # Draw bounding boxes and labels
@@ -185,6 +192,8 @@ def run_video_stream():
         print("ACTION REQUIRED: Ensure 'dataset' is populated and 'src/precompute_embeddings.py' has been run successfully.")
         return
 
+    # Batch frames from all cameras through a small worker pool when SCHEDULER.ENABLED
+    scheduler = create_scheduler(recognizer, config)
     
     att_cfg = config.get('ATTENDANCE', {}) if config else {}
     attendance = AttendanceManager(
@@ -207,7 +216,9 @@ def run_video_stream():
     for i, cam in enumerate(sources):
         name = str(cam.get('name', cam.get('source', 'camera')))
         src = cam.get('source', 0)
-        t = threading.Thread(target=_camera_loop, args=(src, name, recognizer, attendance), daemon=True)
+        # Per-camera tracker: detect every N frames, embed once per track (TRACKING.ENABLED)
+        tracked = create_tracked_recognizer(recognizer, config, scheduler=scheduler, camera=name)
+        t = threading.Thread(target=_camera_loop, args=(src, name, recognizer, attendance, scheduler, tracked), daemon=True)
         t.start()
         threads.append(t)
         time.sleep(0.3)  # Small delay between starting threads
@@ -217,6 +228,8 @@ def run_video_stream():
         while any(t.is_alive() for t in threads):
             time.sleep(0.2)
     finally:
+        if scheduler is not None:
+            scheduler.stop()
         cv2.destroyAllWindows()
         print("Video streams closed.")
 